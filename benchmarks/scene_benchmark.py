@@ -0,0 +1,189 @@
+"""
+Wall time and peak memory of scene construction, serialization and export across scene sizes.
+
+Run from the repository root with:
+    python benchmarks/scene_benchmark.py --save baseline.json
+    python benchmarks/scene_benchmark.py --compare baseline.json
+
+--compare exits with status 1 if any case is slower or uses more memory than the baseline by more than the
+thresholds, so it can gate upgrades in CI. Baselines are only comparable on the same machine.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import numpy as np  # noqa: E402
+
+from satellite_constellation.GroundStation import GroundStation  # noqa: E402
+from satellite_constellation.SceneCreator import constellation_creator, create_scene, \
+    scene_xml_generator  # noqa: E402
+from satellite_constellation.SceneSerializer import scene_json, scene_columnar_json  # noqa: E402
+from satellite_constellation.SceneWriter import write_scene  # noqa: E402
+
+# (satellites, planes); every shell keeps at most 360 satellites per plane.
+satellite_shells = [(100, 10), (1000, 20), (10000, 100), (100000, 500)]
+station_counts = [1, 10, 100, 1000]
+# Satellites and stations held fixed while the other dimension is swept.
+fixed_stations = 10
+fixed_satellites = 1000
+
+
+class NullStream(object):
+    """
+    Discards what is written to it, so export cases measure rendering rather than buffering
+    """
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+
+
+def build_scene(num_sats, num_planes, num_stations, array_backed=False):
+    latitudes = np.linspace(-60, 60, num_stations).tolist()
+    longitudes = np.linspace(-180, 180, num_stations, endpoint=False).tolist()
+    if num_stations > 1:
+        return create_scene(1, [num_sats], [num_planes], [1], [53], [550], [0], [40], num_stations, latitudes,
+                            longitudes, [0] * num_stations, [20] * num_stations, array_backed=array_backed)
+    # ground_array_creator rejects single element beam width lists, so a lone station is added directly.
+    scene = constellation_creator(1, [num_sats], [num_planes], [1], [53], [550], [0], [40],
+                                  array_backed=array_backed)
+    scene.append(GroundStation("GS0", latitudes[0], longitudes[0], 0, 20))
+    return scene
+
+
+def export_xml(scene):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return scene_xml_generator(scene)
+
+
+# Each operation takes (num_sats, num_planes, num_stations, scene) and the scene is built outside the measurement,
+# except for the construction cases.
+operations = [
+    ("create_scene", lambda sats, planes, stations, scene: build_scene(sats, planes, stations)),
+    ("create_scene_array", lambda sats, planes, stations, scene: build_scene(sats, planes, stations, True)),
+    ("as_dict", lambda sats, planes, stations, scene: [item.as_dict() for item in scene]),
+    ("json_dumps_as_dict", lambda sats, planes, stations, scene: json.dumps([item.as_dict() for item in scene])),
+    ("scene_json", lambda sats, planes, stations, scene: scene_json(scene)),
+    ("scene_columnar_json", lambda sats, planes, stations, scene: scene_columnar_json(scene)),
+    ("scene_xml_generator", lambda sats, planes, stations, scene: export_xml(scene)),
+    ("write_scene", lambda sats, planes, stations, scene: write_scene(scene, NullStream())),
+]
+
+
+def cases(max_satellites):
+    sizes = [(sats, planes, fixed_stations) for sats, planes in satellite_shells if sats <= max_satellites]
+    planes = dict(satellite_shells)[fixed_satellites]
+    sizes += [(fixed_satellites, planes, stations) for stations in station_counts if stations != fixed_stations]
+    for sats, planes, stations in sizes:
+        for name, operation in operations:
+            yield "{0}/sats={1}/stations={2}".format(name, sats, stations), name, sats, planes, stations, operation
+
+
+def measure(operation, args, repeat):
+    """
+    Best wall time over repeat runs, then peak traced allocation over one more run
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        operation(*args)
+        best = min(best, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    operation(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(max_satellites, repeat, only=None):
+    results = {}
+    scenes = {}
+    for case, name, sats, planes, stations, operation in cases(max_satellites):
+        if only and not any(pattern in case for pattern in only):
+            continue
+        if (sats, stations) not in scenes:
+            scenes.clear()
+            scenes[(sats, stations)] = build_scene(sats, planes, stations)
+        seconds, peak = measure(operation, (sats, planes, stations, scenes[(sats, stations)]), repeat)
+        results[case] = {"operation": name, "satellites": sats, "stations": stations, "seconds": seconds,
+                         "peak_bytes": peak}
+        print("{0:<52} {1:12.2f} ms {2:12.2f} MB".format(case, seconds * 1e3, peak / 1e6))
+        sys.stdout.flush()
+    return results
+
+
+def environment():
+    return {"python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "system": platform.system()}
+
+
+def compare(results, baseline, time_threshold, memory_threshold):
+    """
+    Prints each case against the baseline
+    :return: List of regressed case names
+    """
+    regressions = []
+    print("\n{0:<52} {1:>10} {2:>10}".format("case", "time", "memory"))
+    for case, result in sorted(results.items()):
+        if case not in baseline:
+            print("{0:<52} {1:>10} {2:>10}".format(case, "new", "new"))
+            continue
+        time_ratio = result["seconds"] / max(baseline[case]["seconds"], 1e-9)
+        memory_ratio = result["peak_bytes"] / max(baseline[case]["peak_bytes"], 1)
+        regressed = time_ratio > time_threshold or memory_ratio > memory_threshold
+        if regressed:
+            regressions.append(case)
+        print("{0:<52} {1:>9.2f}x {2:>9.2f}x{3}".format(case, time_ratio, memory_ratio,
+                                                        "  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--save", help="Write the results to this JSON baseline")
+    parser.add_argument("--compare", help="Compare the results with this JSON baseline")
+    parser.add_argument("--max-satellites", type=int, default=100000, help="Largest constellation to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the fastest is kept")
+    parser.add_argument("--time-threshold", type=float, default=1.25,
+                        help="Slowdown ratio that counts as a regression")
+    parser.add_argument("--memory-threshold", type=float, default=1.10,
+                        help="Peak memory ratio that counts as a regression")
+    parser.add_argument("--only", nargs="*", help="Run only cases whose name contains one of these strings")
+    args = parser.parse_args()
+
+    results = run(args.max_satellites, args.repeat, args.only)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({"environment": environment(), "results": results}, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["environment"] != environment():
+            print("Warning: baseline was recorded in a different environment {0}".format(baseline["environment"]))
+        regressions = compare(results, baseline["results"], args.time_threshold, args.memory_threshold)
+        if regressions:
+            print("\n{0} regression(s)".format(len(regressions)))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares the closed form Walker generator against the list-based recurrences it replaced.
+
+Run from the repository root with:
+    python benchmarks/walker_benchmark.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from satellite_constellation.Walker import walker_elements  # noqa: E402
+
+
+def legacy_walker_elements(num_sats, num_planes, phasing):
+    """
+    The perigee, RAAN and anomaly recurrences Constellation used before walker_elements. The perigee list is
+    extended once per satellite, so it holds num_sats * sats_per_plane entries.
+    """
+    sats_per_plane = int(num_sats / num_planes)
+    correct_phasing = 360 * phasing / num_sats
+
+    perigees = list(range(0, 360, int(360 / sats_per_plane)))
+    all_perigees = []
+    for i in range(num_sats):
+        all_perigees.extend(perigees)
+
+    raan = [0] * num_sats
+    ta = [0] * num_sats
+    for i in range(sats_per_plane, num_sats):
+        raan[i] = raan[i - sats_per_plane] + 360 / num_planes
+        ta[i] = ta[i - sats_per_plane] + correct_phasing
+    return raan, all_perigees[:num_sats], ta
+
+
+def measure(generator, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    generator(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    # (satellites, planes, phasing); the legacy generator is skipped above legacy_limit satellites.
+    shells = [(1000, 20, 1), (10000, 100, 1), (40000, 200, 1), (100000, 500, 1)]
+    legacy_limit = 40000
+
+    print("{0:>10} {1:>8} {2:>14} {3:>14} {4:>14} {5:>14}".format("sats", "planes", "legacy [ms]", "legacy [MB]",
+                                                                  "walker [ms]", "walker [MB]"))
+    for num_sats, num_planes, phasing in shells:
+        walker_time, walker_peak = measure(walker_elements, num_sats, num_planes, phasing)
+        if num_sats <= legacy_limit:
+            legacy_time, legacy_peak = measure(legacy_walker_elements, num_sats, num_planes, phasing)
+            legacy_time = "{0:14.2f}".format(legacy_time * 1e3)
+            legacy_peak = "{0:14.2f}".format(legacy_peak / 1e6)
+        else:
+            legacy_time = legacy_peak = "{0:>14}".format("skipped")
+        print("{0:>10} {1:>8} {2} {3} {4:14.2f} {5:14.2f}".format(num_sats, num_planes, legacy_time, legacy_peak,
+                                                                  walker_time * 1e3, walker_peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
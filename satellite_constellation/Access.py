@@ -0,0 +1,382 @@
+"""
+Access windows between satellites and ground stations.
+"""
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import timed
+from .GroundStation import GroundStation
+from .Propagator import propagate, OrbitSampler
+from .utils import heavenly_body_mu, heavenly_body_radius, heavenly_body_rotation
+import numpy as np
+
+
+class AccessWindows(object):
+    """
+    Table of visibility windows, one row per pass of a satellite over a ground station. Times are in seconds since
+    the element epoch and elevations in degrees.
+    """
+
+    def __init__(self, satellite, station, start, end, max_elevation, satellite_names, station_names):
+        self.satellite = np.asarray(satellite, dtype=np.int64)
+        self.station = np.asarray(station, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.max_elevation = np.asarray(max_elevation, dtype=np.float64)
+        self.satellite_names = list(satellite_names)
+        self.station_names = list(station_names)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return "AccessWindows({0} windows, {1} satellites, {2} stations)".format(len(self),
+                                                                                 len(self.satellite_names),
+                                                                                 len(self.station_names))
+
+    def select(self, mask):
+        """
+        Returns the windows picked out by a boolean mask or index array
+        """
+        return AccessWindows(self.satellite[mask], self.station[mask], self.start[mask], self.end[mask],
+                             self.max_elevation[mask], self.satellite_names, self.station_names)
+
+    def for_pair(self, satellite, station):
+        """
+        Windows for one satellite and station, given by index or name
+        """
+        if not isinstance(satellite, (int, np.integer)):
+            satellite = self.satellite_names.index(satellite)
+        if not isinstance(station, (int, np.integer)):
+            station = self.station_names.index(station)
+        return self.select((self.satellite == satellite) & (self.station == station))
+
+    def as_dict(self):
+        return [{"Satellite": self.satellite_names[sat],
+                 "Station": self.station_names[station],
+                 "Start": start,
+                 "End": end,
+                 "Max Elevation": elevation}
+                for sat, station, start, end, elevation in zip(self.satellite.tolist(), self.station.tolist(),
+                                                               self.start.tolist(), self.end.tolist(),
+                                                               self.max_elevation.tolist())]
+
+
+def station_positions(stations, focus="earth"):
+    """
+    Body-fixed positions of ground stations on a spherical focus body
+    :param stations: List of GroundStation objects, elevation in metres
+    :param focus: The focus body the stations sit on
+    :return: Array shaped (stations, 3) in km
+    """
+    if focus.lower() == "earth":
+        return np.array([station.ecef for station in stations], dtype=np.float64).reshape(-1, 3)
+    lat = np.radians([station.lat for station in stations])
+    long = np.radians([station.long for station in stations])
+    radius = heavenly_body_radius[focus.lower()] + np.array([station.elevation for station in stations]) / 1000
+    return np.stack([radius * np.cos(lat) * np.cos(long),
+                     radius * np.cos(lat) * np.sin(long),
+                     radius * np.sin(lat)], axis=-1).reshape(-1, 3)
+
+
+def body_to_inertial(body_fixed, times, focus="earth"):
+    """
+    Rotates body-fixed vectors into the inertial frame. The frames are taken to coincide at the element epoch.
+    :param body_fixed: Array shaped (..., 3)
+    :param times: Array of times in seconds since the element epoch, broadcastable against body_fixed[..., 0]
+    :param focus: The focus body whose rotation is applied
+    :return: Array shaped like the broadcast of body_fixed and times, with a trailing axis of 3
+    """
+    angle = heavenly_body_rotation[focus.lower()] * np.asarray(times, dtype=np.float64)
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    x, y, z = body_fixed[..., 0], body_fixed[..., 1], body_fixed[..., 2]
+    return np.stack(np.broadcast_arrays(x * cos_angle - y * sin_angle, x * sin_angle + y * cos_angle, z), axis=-1)
+
+
+def minimum_elevation(stations):
+    """
+    Lowest elevation, in degrees, at which each station can see a satellite. The station beam is a cone about the
+    zenith, so a satellite is visible within half the beam width of straight up.
+    """
+    return 90 - np.array([station.beam for station in stations], dtype=np.float64) / 2
+
+
+def elevation(constellation, stations_fixed, sat_idx, station_idx, times, j2=False):
+    """
+    Elevation in degrees of satellites above stations, evaluated elementwise over paired index and time arrays
+    """
+    sat_idx, station_idx = np.broadcast_arrays(np.asarray(sat_idx), np.asarray(station_idx))
+    return _ElevationFunction(constellation, stations_fixed, sat_idx, station_idx, j2)(times)
+
+
+class _ElevationFunction(object):
+    """
+    Elevation of fixed satellite/station pairs as a function of time, with the pair geometry gathered once
+    """
+
+    def __init__(self, constellation, stations_fixed, sat_idx, station_idx, j2=False, offset=0):
+        self.args = (constellation, stations_fixed, sat_idx, station_idx, j2, offset)
+        self.sampler = OrbitSampler(constellation, sat_idx, j2=j2)
+        self.stations = stations_fixed[station_idx]
+        self.zenith = self.stations / np.linalg.norm(self.stations, axis=-1, keepdims=True)
+        self.focus = constellation.focus
+        self.offset = offset
+
+    def subset(self, mask):
+        constellation, stations_fixed, sat_idx, station_idx, j2, offset = self.args
+        return _ElevationFunction(constellation, stations_fixed, sat_idx[mask], station_idx[mask], j2,
+                                  np.broadcast_to(offset, np.shape(sat_idx))[mask])
+
+    def __call__(self, times):
+        rotation = heavenly_body_rotation[self.focus.lower()] * np.asarray(times, dtype=np.float64)
+        cos_rot, sin_rot = np.cos(rotation), np.sin(rotation)
+        sat_pos = self.sampler.positions(times)
+        # Work in the body-fixed frame: rotate the satellite back instead of rotating the station forward.
+        x = sat_pos[..., 0] * cos_rot + sat_pos[..., 1] * sin_rot - self.stations[..., 0]
+        y = sat_pos[..., 1] * cos_rot - sat_pos[..., 0] * sin_rot - self.stations[..., 1]
+        z = sat_pos[..., 2] - self.stations[..., 2]
+        sin_el = (x * self.zenith[..., 0] + y * self.zenith[..., 1] + z * self.zenith[..., 2]) / \
+            np.sqrt(x * x + y * y + z * z)
+        return np.degrees(np.arcsin(np.clip(sin_el, -1, 1))) - self.offset
+
+
+@timed("access_windows")
+def access_windows(scene, start, stop, step=60., j2=False, tolerance=1e-3, chunk_steps=256):
+    """
+    Finds every window in which a satellite is inside a ground station's beam.
+
+    Satellite/station pairs that can never meet are dropped first by comparing the station's latitude with the
+    orbit's inclination plus the widest ground footprint. The remaining pairs are screened on a coarse time grid
+    with a bound on how fast a satellite's angle from the station can change, so only grid intervals that might
+    contain visibility are refined. Candidate intervals are split wherever the elevation between samples dips below
+    the beam, so each holds one pass. Peaks are located with a golden section search and rise/set times with an
+    Illinois root finder on elevation.
+    :param scene: List of constellations and ground stations, as returned by create_scene
+    :param start: Start of the search, in seconds since the element epoch
+    :param stop: End of the search, in seconds since the element epoch
+    :param step: Coarse screening step in seconds. Screening never drops a pass, and passes are told apart as long as
+                 no two of a pair fall within a single step; smaller steps refine less.
+    :param j2: Propagate with J2 secular drift
+    :param tolerance: Accuracy of the rise and set times, in seconds
+    :param chunk_steps: Number of coarse steps propagated at once
+    :return: AccessWindows table
+    """
+    constellation = ConstellationArray.from_scene(scene)
+    stations = [item for item in scene if isinstance(item, GroundStation)]
+    focus = constellation.focus.lower()
+    stations_fixed = station_positions(stations, focus)
+    min_el = np.radians(minimum_elevation(stations))
+    station_names = [station.name for station in stations]
+    if not len(constellation) or not stations:
+        return AccessWindows([], [], [], [], [], constellation.names, station_names)
+
+    # Widest footprint half-angle each satellite can have over each station, reached at apoapsis.
+    a = constellation.true_alt
+    e = constellation.eccentricity
+    apoapsis = a * (1 + e)
+    station_radius = np.linalg.norm(stations_fixed, axis=-1)
+    reach = np.arccos(np.clip(station_radius[None, :] * np.cos(min_el)[None, :] / apoapsis[:, None], -1, 1)) \
+        - min_el[None, :]
+
+    # A ground track never gets further from the equator than the orbit's inclination.
+    inclination = np.radians(np.minimum(constellation.inclination, 180 - constellation.inclination))
+    station_lat = np.arcsin(stations_fixed[:, 2] / station_radius)
+    feasible = np.abs(station_lat)[None, :] <= inclination[:, None] + reach
+
+    # Fastest rate the angle between a satellite and a station can change: the satellite's angular rate at
+    # periapsis plus the body's rotation.
+    mu = heavenly_body_mu[focus]
+    periapsis = a * (1 - e)
+    angular_rate = np.sqrt(mu * a * (1 - e ** 2)) / periapsis ** 2 + abs(heavenly_body_rotation[focus])
+    # A coarse sample within this angle of a station is near enough that a pass may happen in a neighbouring step.
+    near_cos = np.cos(np.minimum(reach + (angular_rate * step / 2)[:, None], np.pi))
+
+    coarse = np.arange(start, stop + step, step, dtype=np.float64)
+    coarse[-1] = stop
+    station_units = stations_fixed / station_radius[:, None]
+
+    # Pairs that can never meet get a threshold no cosine can reach; the rest allow for single precision rounding.
+    near_cos = np.where(feasible, near_cos - 1e-6, 2).astype(np.float32)
+    # Keep each (steps, satellites, stations) block of cosines to a few million entries.
+    screen_steps = max(1, 2 ** 22 // (len(constellation) * len(stations)))
+
+    near_sat, near_station, near_step = [], [], []
+    for chunk_start in range(0, len(coarse), chunk_steps):
+        chunk = coarse[chunk_start:chunk_start + chunk_steps]
+        sat_units = propagate(constellation, chunk, j2=j2, dtype=np.float32)[0]
+        sat_units = sat_units / np.linalg.norm(sat_units, axis=-1, keepdims=True)
+        station_inertial = body_to_inertial(station_units[None, :, :], chunk[:, None], focus).astype(np.float32)
+        for screen_start in range(0, len(chunk), screen_steps):
+            screen = slice(screen_start, screen_start + screen_steps)
+            cos_angle = np.matmul(sat_units[:, screen].transpose(1, 0, 2),
+                                  station_inertial[screen].transpose(0, 2, 1))
+            step_hit, sat_hit, station_hit = np.nonzero(cos_angle >= near_cos)
+            near_sat.append(sat_hit)
+            near_station.append(station_hit)
+            near_step.append(step_hit + chunk_start + screen_start)
+
+    near_sat = np.concatenate(near_sat)
+    near_station = np.concatenate(near_station)
+    near_step = np.concatenate(near_step)
+    if not len(near_step):
+        return AccessWindows([], [], [], [], [], constellation.names, station_names)
+
+    # Near samples of the same pair form one candidate run spanning a step either side of them. Runs whose spans would
+    # overlap or touch are merged, so no stretch of time is searched twice for the same pair.
+    order = np.lexsort((near_step, near_station, near_sat))
+    near_sat, near_station, near_step = near_sat[order], near_station[order], near_step[order]
+    breaks = np.ones(len(near_step), dtype=bool)
+    breaks[1:] = (near_sat[1:] != near_sat[:-1]) | (near_station[1:] != near_station[:-1]) | \
+                 (near_step[1:] > near_step[:-1] + 2)
+    first = np.flatnonzero(breaks)
+    last = np.append(first[1:], len(near_step)) - 1
+    run_sat = near_sat[first]
+    run_station = near_station[first]
+    run_first = np.maximum(near_step[first] - 1, 0)
+    run_last = np.minimum(near_step[last] + 1, len(coarse) - 1)
+    threshold = np.degrees(min_el[run_station])
+
+    segment_run, segment_start, segment_end, peak_low, peak_high = _pass_segments(
+        constellation, stations_fixed, run_sat, run_station, threshold, run_first, run_last, coarse, j2, tolerance)
+    run_sat, run_station, threshold = run_sat[segment_run], run_station[segment_run], threshold[segment_run]
+
+    evaluate = _ElevationFunction(constellation, stations_fixed, run_sat, run_station, j2)
+    # Elevation is flat at its peak, so the peak time needs far less precision than rise and set.
+    peak_time, peak_el = _golden_section_max(evaluate, peak_low, peak_high, max(tolerance, 1.0))
+    visible = peak_el >= threshold
+    run_sat, run_station = run_sat[visible], run_station[visible]
+    segment_start, segment_end = segment_start[visible], segment_end[visible]
+    peak_time, peak_el, threshold = peak_time[visible], peak_el[visible], threshold[visible]
+
+    excess = _ElevationFunction(constellation, stations_fixed, run_sat, run_station, j2, offset=threshold)
+    # The ends of a segment are outside the beam unless it is cut off by the start or end of the search.
+    rise = _find_crossing(excess, segment_start, peak_time, tolerance)
+    setting = _find_crossing(excess, peak_time, segment_end, tolerance, setting=True)
+
+    return AccessWindows(run_sat, run_station, rise, setting, peak_el, constellation.names, station_names)
+
+
+def _pass_segments(constellation, stations_fixed, run_sat, run_station, threshold, run_first, run_last, coarse, j2,
+                   tolerance):
+    """
+    Splits candidate runs into segments holding one pass each. A run can hold several passes when the elevation
+    dips below the beam and rises again, so elevation is sampled on the coarse grid across each run and every interior
+    minimum is refined; runs are split at those that fall below the beam.
+    :param run_first: Index into coarse of the first sample of each run
+    :param run_last: Index into coarse of the last sample of each run
+    :return: Tuple of (segment_run, segment_start, segment_end, peak_low, peak_high): the run each segment came
+             from, the segment's span, and a bracket around its highest sample for the peak search
+    """
+    counts = run_last - run_first + 1
+    offsets = np.cumsum(counts) - counts
+    sample_run = np.repeat(np.arange(len(run_first)), counts)
+    sample_step = run_first[sample_run] + np.arange(len(sample_run)) - offsets[sample_run]
+    sample_time = coarse[sample_step]
+    sample_excess = _ElevationFunction(constellation, stations_fixed, run_sat[sample_run], run_station[sample_run], j2,
+                                       offset=threshold[sample_run])(sample_time)
+
+    interior = np.zeros(len(sample_run), dtype=bool)
+    interior[1:-1] = (sample_run[:-2] == sample_run[1:-1]) & (sample_run[2:] == sample_run[1:-1])
+    minimum = np.flatnonzero(interior)
+    minimum = minimum[(sample_excess[minimum] <= sample_excess[minimum - 1]) &
+                      (sample_excess[minimum] < sample_excess[minimum + 1])]
+    deepest = _ElevationFunction(constellation, stations_fixed, run_sat[sample_run[minimum]],
+                                 run_station[sample_run[minimum]], j2, offset=threshold[sample_run[minimum]])
+    dip_time, dip = _golden_section_max(lambda times: -deepest(times), sample_time[minimum - 1],
+                                        sample_time[minimum + 1], max(tolerance, 1.0))
+    dip_time = np.where(-dip < sample_excess[minimum], dip_time, sample_time[minimum])
+    split = np.minimum(-dip, sample_excess[minimum]) < 0
+    split_run, split_time = sample_run[minimum[split]], dip_time[split]
+
+    # Segments run from a run's first sample or a split to the next split or the run's last sample.
+    segment_run = np.concatenate([np.arange(len(run_first)), split_run])
+    segment_start = np.concatenate([coarse[run_first], split_time])
+    order = np.lexsort((segment_start, segment_run))
+    segment_run, segment_start = segment_run[order], segment_start[order]
+    segment_end = np.append(segment_start[1:], 0.)
+    run_ends = np.append(segment_run[1:] != segment_run[:-1], True)
+    segment_end[run_ends] = coarse[run_last[segment_run[run_ends]]]
+
+    # Samples are ordered by run then time, as are segments, so offsetting times by run orders both together.
+    width = coarse[-1] - coarse[0] + 1
+    segment = np.searchsorted(segment_start - coarse[0] + segment_run * width,
+                              sample_time - coarse[0] + sample_run * width, side='right') - 1
+    highest = np.lexsort((sample_excess, segment))
+    highest = highest[np.append(segment[highest][1:] != segment[highest][:-1], True)]
+    peak_low, peak_high = segment_start.copy(), segment_end.copy()
+    step_low = coarse[np.maximum(sample_step[highest] - 1, 0)]
+    step_high = coarse[np.minimum(sample_step[highest] + 1, len(coarse) - 1)]
+    peak_low[segment[highest]] = np.maximum(segment_start[segment[highest]], step_low)
+    peak_high[segment[highest]] = np.minimum(segment_end[segment[highest]], step_high)
+    return segment_run, segment_start, segment_end, peak_low, peak_high
+
+
+def _golden_section_max(function, low, high, tolerance):
+    """
+    Vectorised golden section search for the maximum of function on each [low, high] interval
+    """
+    inverse_phi = (np.sqrt(5) - 1) / 2
+    low, high = low.copy(), high.copy()
+    left = high - inverse_phi * (high - low)
+    right = low + inverse_phi * (high - low)
+    f_left, f_right = function(left), function(right)
+    while len(low) and (high - low).max() > tolerance:
+        move_right = f_left < f_right
+        low = np.where(move_right, left, low)
+        high = np.where(move_right, high, right)
+        left, right = np.where(move_right, right, high - inverse_phi * (high - low)), \
+            np.where(move_right, low + inverse_phi * (high - low), left)
+        f_new = function(np.where(move_right, right, left))
+        f_left, f_right = np.where(move_right, f_right, f_new), np.where(move_right, f_new, f_left)
+
+    peak = np.where(f_left > f_right, left, right)
+    return peak, np.maximum(f_left, f_right)
+
+
+def _find_crossing(function, low, high, tolerance, max_iterations=100, setting=False):
+    """
+    Vectorised Illinois (modified regula falsi) search for the zero of function between low and high. Intervals
+    whose ends have the same sign return whichever end is non-negative, which is how windows cut off by the search
+    span keep their boundary; when both are, low is returned, or high if setting. Converged entries are dropped from
+    later evaluations.
+    """
+    f_low, f_high = function(low), function(high)
+    result = np.where(f_high >= 0, high, low) if setting else np.where(f_low >= 0, low, high)
+    active = np.flatnonzero((f_low >= 0) != (f_high >= 0))
+    if not len(active):
+        return result
+
+    function = function.subset(active)
+    low, high, f_low, f_high = low[active], high[active], f_low[active], f_high[active]
+    last_side = np.zeros(len(active), dtype=np.int8)
+    guess = (low + high) / 2
+    for _ in range(max_iterations):
+        previous = guess
+        guess = (low * f_high - high * f_low) / (f_high - f_low)
+        # Fall back to bisection wherever the secant lands outside the bracket.
+        guess = np.where((guess > low) & (guess < high), guess, (low + high) / 2)
+        converged = np.abs(guess - previous) <= tolerance
+        result[active[converged]] = guess[converged]
+        if converged.all():
+            break
+        if converged.any():
+            keep = ~converged
+            active, function = active[keep], function.subset(keep)
+            low, high, f_low, f_high = low[keep], high[keep], f_low[keep], f_high[keep]
+            guess, last_side = guess[keep], last_side[keep]
+
+        f_guess = function(guess)
+        replace_low = (f_guess >= 0) == (f_low >= 0)
+        # Illinois rule: halve the retained end's value when the same end is kept twice running.
+        f_high = np.where(replace_low & (last_side == 1), f_high / 2, f_high)
+        f_low = np.where(~replace_low & (last_side == -1), f_low / 2, f_low)
+        low = np.where(replace_low, guess, low)
+        f_low = np.where(replace_low, f_guess, f_low)
+        high = np.where(replace_low, high, guess)
+        f_high = np.where(replace_low, f_high, f_guess)
+        last_side = np.where(replace_low, 1, -1).astype(np.int8)
+    else:
+        result[active] = guess
+    return result
@@ -0,0 +1,229 @@
+"""
+Content-addressed caching of generated scenes, propagation results and exports. Keys are hashes of a canonical
+encoding of the inputs, so equal parameters hit the same entry whichever objects they arrive in.
+"""
+from .Constellation import Constellation
+from .ConstellationArray import ConstellationArray
+from .GroundStation import GroundStation
+from .Satellite import Satellite
+from .Instrumentation import count
+from collections import OrderedDict
+import hashlib
+import numpy as np
+import os
+import pickle
+import sys
+import tempfile
+
+_default_cache = None
+
+
+def set_default_cache(cache):
+    """
+    Sets the cache consulted by functions called without an explicit cache. None turns default caching off.
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def get_default_cache():
+    return _default_cache
+
+
+def resolve_cache(cache=None):
+    return cache if cache is not None else _default_cache
+
+
+def _encode(obj, hasher):
+    """
+    Feeds a type-tagged canonical encoding of obj to hasher. Integers and floats of equal value encode identically.
+    """
+    if obj is None or isinstance(obj, bool):
+        hasher.update(repr(obj).encode('utf-8'))
+    elif isinstance(obj, (int, float, np.integer, np.floating)):
+        hasher.update(b'n' + repr(float(obj)).encode('utf-8'))
+    elif isinstance(obj, str):
+        hasher.update(b's' + str(len(obj)).encode('utf-8') + b':' + obj.encode('utf-8'))
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b'l' + str(len(obj)).encode('utf-8'))
+        for item in obj:
+            _encode(item, hasher)
+    elif isinstance(obj, dict):
+        hasher.update(b'd' + str(len(obj)).encode('utf-8'))
+        for key in sorted(obj, key=str):
+            _encode(key, hasher)
+            _encode(obj[key], hasher)
+    elif isinstance(obj, np.ndarray):
+        hasher.update(b'a' + obj.dtype.str.encode('utf-8') + repr(obj.shape).encode('utf-8'))
+        hasher.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, ConstellationArray):
+        _encode(("ConstellationArray", obj.focus.lower(), obj.names) +
+                tuple(getattr(obj, column) for column in obj.columns), hasher)
+    elif isinstance(obj, Constellation):
+        # The satellites themselves, not the parameters they were built from, so edits made in place change the key.
+        _encode(obj.as_array(), hasher)
+    elif isinstance(obj, Satellite):
+        _encode(("Satellite", obj.name, obj.altitude, obj.eccentricity) + tuple(obj.element_angles) +
+                (obj.beam, obj._focus.lower()), hasher)
+    elif isinstance(obj, GroundStation):
+        _encode(("GroundStation", obj.name, obj.lat, obj.long, obj.elevation, obj.beam), hasher)
+    else:
+        raise TypeError("Can't build a cache key from {0}".format(type(obj).__name__))
+
+
+def cache_key(*parts):
+    """
+    Hex digest identifying a computation and its inputs
+    :param parts: Name of the computation followed by its arguments
+    """
+    hasher = hashlib.sha256()
+    _encode(parts, hasher)
+    return hasher.hexdigest()
+
+
+def _sizeof(value):
+    """
+    Approximate memory held by a cached value, counting numpy buffers exactly
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value.values())
+    if isinstance(value, ConstellationArray):
+        return sum(getattr(value, column).nbytes for column in value.columns) + _sizeof(value.names)
+    if isinstance(value, Constellation):
+        return sys.getsizeof(value) + 512 * len(value.satellites)
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    """
+    Marks cached numpy arrays read-only, so a caller can't change an entry that other callers share
+    """
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+class ResultCache(object):
+    """
+    Two-tier cache. The memory tier is an LRU bounded by the approximate size of its values; the optional disk tier
+    keeps pickled values in a directory, is shared between processes and survives restarts.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2, directory=None):
+        """
+
+        :param max_bytes: Size budget of the memory tier in bytes
+        :param directory: Directory of the disk tier, created if needed. None keeps the cache in memory only.
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries or (self.directory is not None and os.path.exists(self.__path(key)))
+
+    def __repr__(self):
+        return "ResultCache({0} entries, {1} bytes, directory={2})".format(len(self), self.current_bytes,
+                                                                          self.directory)
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def __remember(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        if key in self.__entries:
+            self.current_bytes -= self.__entries.pop(key)[1]
+        self.__entries[key] = (value, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            evicted, (_, evicted_size) = self.__entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+            count("cache_evictions")
+
+    def get(self, key, default=None):
+        """
+        Looks a key up in memory, then on disk. Disk hits are promoted to the memory tier.
+        """
+        if key in self.__entries:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            count("cache_hits")
+            return self.__entries[key][0]
+        if self.directory is not None:
+            try:
+                with open(self.__path(key), 'rb') as stored:
+                    value = _freeze(pickle.load(stored))
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                pass
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+                count("cache_hits")
+                count("cache_disk_hits")
+                self.__remember(key, value, _sizeof(value))
+                return value
+        self.misses += 1
+        count("cache_misses")
+        return default
+
+    def put(self, key, value):
+        """
+        Stores a value in memory, evicting the least recently used entries beyond max_bytes, and on disk
+        """
+        value = _freeze(value)
+        self.__remember(key, value, _sizeof(value))
+        if self.directory is not None:
+            # Write then rename, so readers in other processes never see a partial file.
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, 'wb') as stored:
+                pickle.dump(value, stored, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.__path(key))
+        return value
+
+    def get_or_compute(self, key, function, *args, **kwargs):
+        """
+        Returns the cached value for key, calling function(*args, **kwargs) and storing its result on a miss
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, function(*args, **kwargs))
+        return value
+
+    def clear(self, disk=False):
+        """
+        Empties the memory tier, and the disk tier too if disk is True. Counters are kept.
+        """
+        self.__entries.clear()
+        self.current_bytes = 0
+        if disk and self.directory is not None:
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, file_name))
+
+    def stats(self):
+        return {"Hits": self.hits,
+                "Disk Hits": self.disk_hits,
+                "Misses": self.misses,
+                "Evictions": self.evictions,
+                "Entries": len(self),
+                "Bytes": self.current_bytes}
@@ -0,0 +1,324 @@
+"""
+Streaming ingestion of two/three-line element sets and CCSDS Orbit Mean-elements Messages into column stores.
+Element sets have their own epochs, so mean anomalies are advanced to one reference epoch as they are read.
+"""
+from .CatalogWriter import _parse_epoch
+from .ConstellationArray import ConstellationArray
+from .ConstellationExceptions import CatalogError
+from .utils import heavenly_body_mu, heavenly_body_radius
+from datetime import datetime, timedelta
+import multiprocessing
+import numpy as np
+import os
+import xml.etree.ElementTree as ElementTree
+
+# OMM keywords read, in ConstellationArray order after the name
+omm_fields = ("MEAN_MOTION", "ECCENTRICITY", "INCLINATION", "RA_OF_ASC_NODE", "ARG_OF_PERICENTER", "MEAN_ANOMALY")
+
+
+class _Batch(object):
+    """
+    Fixed-size buffer of parsed records that is emptied into a ConstellationArray when full
+    """
+
+    def __init__(self, beam_width, epoch):
+        self.beam_width = beam_width
+        self.epoch = epoch
+        self.names = []
+        self.values = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, epoch, mean_motion, eccentricity, inclination, raan, perigee, mean_anomaly):
+        self.names.append(name)
+        self.values.append(((self.epoch - epoch).total_seconds(), mean_motion, eccentricity, inclination, raan,
+                            perigee, mean_anomaly))
+
+    def flush(self):
+        values = np.array(self.values, dtype=np.float64).reshape(-1, 7).T
+        offset, mean_motion, eccentricity, inclination, raan, perigee, mean_anomaly = values
+        # Mean motion is in revolutions per day; the anomaly at the reference epoch is in degrees.
+        mean_anomaly = np.where(offset == 0, mean_anomaly, np.mod(mean_anomaly + mean_motion * offset / 240., 360.))
+        array = ConstellationArray(self.names, mean_motion_altitude(mean_motion), eccentricity, inclination, raan,
+                                   perigee, mean_anomaly, self.beam_width, focus="earth")
+        self.names = []
+        self.values = []
+        return array
+
+
+def mean_motion_altitude(mean_motion):
+    """
+    Altitude above Earth's mean radius in km of an orbit with the given mean motion
+    :param mean_motion: Mean motion in revolutions per day
+    """
+    rate = np.asarray(mean_motion, dtype=np.float64) * 2 * np.pi / 86400
+    return np.cbrt(heavenly_body_mu["earth"] / rate ** 2) - heavenly_body_radius["earth"]
+
+
+def catalog_format(line):
+    """
+    Guesses the format of a catalog from its first non-blank line: 'tle', 'omm-kvn' or 'omm-xml'
+    """
+    line = line.lstrip()
+    if line.startswith("<"):
+        return "omm-xml"
+    if line.startswith("CCSDS_OMM_VERS") or line.startswith("COMMENT") or "=" in line:
+        return "omm-kvn"
+    return "tle"
+
+
+def tle_epoch(line1):
+    """
+    Epoch of a TLE from its first line, as a naive datetime in UTC
+    """
+    year = int(line1[18:20])
+    year += 2000 if year < 57 else 1900
+    return datetime(year, 1, 1) + timedelta(days=float(line1[20:32]) - 1)
+
+
+def omm_epoch(text):
+    """
+    Epoch of an OMM from its EPOCH value, in calendar or day-of-year form, as a naive datetime in UTC
+    """
+    text = text.strip().rstrip("Z")
+    date, _, time = text.partition("T")
+    seconds, _, fraction = time.partition(".")
+    date_format = "%Y-%j" if date.count("-") == 1 else "%Y-%m-%d"
+    epoch = datetime.strptime(date + "T" + (seconds or "00:00:00"), date_format + "T%H:%M:%S")
+    return epoch + timedelta(seconds=float("0." + fraction) if fraction else 0.)
+
+
+def _tle_records(lines):
+    """
+    Yields (name, epoch, mean motion, e, inclination, raan, perigee, mean anomaly) from TLE lines, with or without
+    name lines
+    """
+    name = None
+    line1 = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip()
+        if line.startswith("1 "):
+            line1 = line
+        elif line.startswith("2 ") and line1 is not None:
+            try:
+                yield (name if name else line1[2:7].strip(), tle_epoch(line1), float(line[52:63]),
+                       float("0." + line[26:33].strip()), float(line[8:16]), float(line[17:25]), float(line[34:42]),
+                       float(line[43:51]))
+            except ValueError:
+                raise CatalogError("Malformed element set ending on line {0}".format(number))
+            name = line1 = None
+        elif line.strip():
+            # Three-line sets put the name first, sometimes prefixed with a 0 line number.
+            name = line[2:].strip() if line.startswith("0 ") else line.strip()
+            line1 = None
+
+
+def _omm_kvn_records(lines):
+    """
+    Yields OMM records from keyword = value lines, one message per CCSDS_OMM_VERS keyword
+    """
+    record = {}
+    for line in lines:
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        key = key.strip()
+        if key == "CCSDS_OMM_VERS" and record:
+            yield _omm_record(record)
+            record = {}
+        record[key] = value.strip()
+    if record:
+        yield _omm_record(record)
+
+
+def _omm_xml_records(source):
+    """
+    Yields OMM records from an XML file, clearing each message once it is read
+    """
+    record = {}
+    for event, element in ElementTree.iterparse(source, events=("end",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "omm":
+            yield _omm_record(record)
+            record = {}
+            element.clear()
+        elif tag in ("OBJECT_NAME", "EPOCH") or tag in omm_fields:
+            record[tag] = (element.text or "").strip()
+
+
+def _omm_record(record):
+    # KVN values may be followed by units, e.g. "15.5 [rev/day]".
+    try:
+        return (record.get("OBJECT_NAME", record.get("OBJECT_ID", "")), omm_epoch(record["EPOCH"])) + \
+            tuple(float(record[field].split()[0]) for field in omm_fields)
+    except (KeyError, IndexError, ValueError):
+        raise CatalogError("OMM message for '{0}' is missing mean elements".format(record.get("OBJECT_NAME", "")))
+
+
+def _open_text(source):
+    if isinstance(source, str):
+        return open(source)
+    return source
+
+
+def _records(lines, format_name):
+    if format_name == "tle":
+        return _tle_records(lines)
+    if format_name == "omm-kvn":
+        return _omm_kvn_records(lines)
+    raise CatalogError("'" + str(format_name) + "' is not a supported catalog format")
+
+
+def _peek_format(source):
+    with open(source) as stream:
+        for line in stream:
+            if line.strip():
+                return catalog_format(line)
+    return "tle"
+
+
+def iter_catalog(source, format_name=None, batch_size=10000, beam_width=0, epoch='2017-Jan-18 00:00:00'):
+    """
+    Reads a catalog in batches, so memory stays bounded by batch_size whatever the size of the file
+    :param source: Path or open text stream of a TLE/3LE, OMM KVN or OMM XML file
+    :param format_name: 'tle', 'omm-kvn' or 'omm-xml'; guessed from the first line if not given
+    :param batch_size: Number of objects per yielded batch
+    :param beam_width: Beam width given to every object
+    :param epoch: Reference epoch as a datetime or in the PIGI epoch format. Each mean anomaly is advanced from its
+                  element set's epoch to this one with two-body motion, so propagation times are seconds since epoch
+                  for every object. The other elements are kept, so epochs close to the catalog's are the accurate
+                  ones.
+    :return: Generator of ConstellationArray batches around Earth, with the mean anomaly at epoch as the anomaly
+    """
+    stream = _open_text(source)
+    try:
+        if format_name is None:
+            if isinstance(source, str):
+                format_name = _peek_format(source)
+            elif hasattr(stream, "seekable") and stream.seekable():
+                start = stream.tell()
+                format_name = catalog_format(next((line for line in iter(stream.readline, "") if line.strip()), ""))
+                stream.seek(start)
+            else:
+                raise CatalogError("The format of an unseekable stream must be given")
+        if format_name == "omm-xml":
+            records = _omm_xml_records(source if isinstance(source, str) else stream)
+        else:
+            records = _records(stream, format_name)
+        batch = _Batch(beam_width, _parse_epoch(epoch))
+        for record in records:
+            batch.add(*record)
+            if len(batch) == batch_size:
+                yield batch.flush()
+        if len(batch):
+            yield batch.flush()
+    finally:
+        if isinstance(source, str) and hasattr(stream, "close"):
+            stream.close()
+
+
+def _line_offsets(path, offset, count):
+    """
+    Offsets and contents of up to count whole lines starting at or after offset
+    """
+    lines = []
+    with open(path, 'rb') as stream:
+        stream.seek(offset)
+        if offset:
+            position = offset + len(stream.readline())
+        else:
+            position = 0
+        for _ in range(count):
+            line = stream.readline()
+            if not line:
+                break
+            lines.append((position, line))
+            position += len(line)
+    return lines
+
+
+def _record_boundary(path, offset, format_name, named):
+    """
+    Offset of the first record that starts at or after offset, or None if there is none
+    """
+    lines = _line_offsets(path, offset, 64)
+    for idx, (position, line) in enumerate(lines):
+        if format_name == "omm-kvn":
+            if line.lstrip().startswith(b"CCSDS_OMM_VERS"):
+                return position
+        elif line.startswith(b"1 ") and idx + 1 < len(lines) and lines[idx + 1][1].startswith(b"2 "):
+            if not named:
+                return position
+            if idx > 0:
+                return lines[idx - 1][0]
+    return None
+
+
+def _range_lines(path, start, stop):
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        position = start
+        for line in stream:
+            if position >= stop:
+                break
+            position += len(line)
+            yield line.decode('utf-8', 'replace')
+
+
+def _parse_range(args):
+    path, start, stop, format_name, batch_size, beam_width, epoch = args
+    arrays = []
+    batch = _Batch(beam_width, epoch)
+    for record in _records(_range_lines(path, start, stop), format_name):
+        batch.add(*record)
+        if len(batch) == batch_size:
+            arrays.append(batch.flush())
+    arrays.append(batch.flush())
+    return ConstellationArray.concatenate(arrays)
+
+
+def read_catalog(source, format_name=None, batch_size=10000, beam_width=0, processes=1,
+                 epoch='2017-Jan-18 00:00:00'):
+    """
+    Reads a whole catalog into one column store
+    :param source: Path or open text stream of a TLE/3LE, OMM KVN or OMM XML file
+    :param format_name: 'tle', 'omm-kvn' or 'omm-xml'; guessed from the first line if not given
+    :param batch_size: Number of objects parsed between conversions to arrays when reading serially
+    :param beam_width: Beam width given to every object
+    :param processes: Worker processes for a TLE or OMM KVN file given by path. The file is split into byte ranges
+                      at record boundaries and each worker parses its own range.
+    :param epoch: Reference epoch the mean anomalies are advanced to, see iter_catalog
+    :return: ConstellationArray around Earth, with the mean anomaly at epoch as the anomaly
+    """
+    if processes > 1 and isinstance(source, str):
+        if format_name is None:
+            format_name = _peek_format(source)
+        if format_name in ("tle", "omm-kvn"):
+            return _read_parallel(source, format_name, batch_size, beam_width, processes, _parse_epoch(epoch))
+    return ConstellationArray.concatenate(iter_catalog(source, format_name, batch_size, beam_width, epoch))
+
+
+def _read_parallel(path, format_name, batch_size, beam_width, processes, epoch):
+    size = os.path.getsize(path)
+    named = False
+    if format_name == "tle":
+        first = next((line for position, line in _line_offsets(path, 0, 8) if line.strip()), b"")
+        named = not first.startswith(b"1 ")
+    boundaries = [0]
+    for idx in range(1, processes):
+        boundary = _record_boundary(path, size * idx // processes, format_name, named)
+        if boundary is not None and boundary > boundaries[-1]:
+            boundaries.append(boundary)
+    boundaries.append(size)
+    ranges = [(path, start, stop, format_name, batch_size, beam_width, epoch)
+              for start, stop in zip(boundaries[:-1], boundaries[1:])]
+    if len(ranges) == 1:
+        return _parse_range(ranges[0])
+    pool = multiprocessing.Pool(min(processes, len(ranges)))
+    try:
+        arrays = pool.map(_parse_range, ranges)
+    finally:
+        pool.close()
+        pool.join()
+    return ConstellationArray.concatenate(arrays)
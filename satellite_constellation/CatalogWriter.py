@@ -0,0 +1,213 @@
+"""
+Bulk export of scenes as two/three-line element sets or CCSDS Orbit Mean-elements Messages. Elements are converted
+for a whole chunk of satellites at once with numpy and written straight to a stream.
+"""
+from .ConstellationArray import ConstellationArray
+from .ConstellationExceptions import FocusError
+from .utils import heavenly_body_mu
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+import numpy as np
+
+pigi_epoch_format = "%Y-%b-%d %H:%M:%S"
+
+# Both lines are 68 characters before the checksum; first derivative, second derivative and drag terms are zero.
+tle_line1 = "1 %5sU          %02d%012.8f  .00000000  00000-0  00000-0 0  999"
+tle_line2 = "2 %5s %8.4f %8.4f %07d %8.4f %8.4f %11.8f    0"
+tle_width = 68
+
+omm_kvn = "CCSDS_OMM_VERS = 2.0\n" \
+          "CREATION_DATE = %s\n" \
+          "ORIGINATOR = satellite_constellation\n" \
+          "OBJECT_NAME = %s\n" \
+          "OBJECT_ID = %s\n" \
+          "CENTER_NAME = EARTH\n" \
+          "REF_FRAME = TEME\n" \
+          "TIME_SYSTEM = UTC\n" \
+          "MEAN_ELEMENT_THEORY = SGP4\n" \
+          "EPOCH = %s\n" \
+          "MEAN_MOTION = %.10f\n" \
+          "ECCENTRICITY = %.10f\n" \
+          "INCLINATION = %.8f\n" \
+          "RA_OF_ASC_NODE = %.8f\n" \
+          "ARG_OF_PERICENTER = %.8f\n" \
+          "MEAN_ANOMALY = %.8f\n" \
+          "EPHEMERIS_TYPE = 0\n" \
+          "CLASSIFICATION_TYPE = U\n" \
+          "NORAD_CAT_ID = %s\n" \
+          "ELEMENT_SET_NO = 999\n" \
+          "REV_AT_EPOCH = 0\n" \
+          "BSTAR = 0\n" \
+          "MEAN_MOTION_DOT = 0\n" \
+          "MEAN_MOTION_DDOT = 0\n"
+
+omm_xml_start = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                '<ndm xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+
+omm_xml = '<omm id="CCSDS_OMM_VERS" version="2.0"><header><CREATION_DATE>%s</CREATION_DATE>' \
+          '<ORIGINATOR>satellite_constellation</ORIGINATOR></header><body><segment><metadata>' \
+          '<OBJECT_NAME>%s</OBJECT_NAME><OBJECT_ID>%s</OBJECT_ID><CENTER_NAME>EARTH</CENTER_NAME>' \
+          '<REF_FRAME>TEME</REF_FRAME><TIME_SYSTEM>UTC</TIME_SYSTEM><MEAN_ELEMENT_THEORY>SGP4</MEAN_ELEMENT_THEORY>' \
+          '</metadata><data><meanElements><EPOCH>%s</EPOCH><MEAN_MOTION>%.10f</MEAN_MOTION>' \
+          '<ECCENTRICITY>%.10f</ECCENTRICITY><INCLINATION>%.8f</INCLINATION><RA_OF_ASC_NODE>%.8f</RA_OF_ASC_NODE>' \
+          '<ARG_OF_PERICENTER>%.8f</ARG_OF_PERICENTER><MEAN_ANOMALY>%.8f</MEAN_ANOMALY></meanElements>' \
+          '<tleParameters><EPHEMERIS_TYPE>0</EPHEMERIS_TYPE><CLASSIFICATION_TYPE>U</CLASSIFICATION_TYPE>' \
+          '<NORAD_CAT_ID>%s</NORAD_CAT_ID><ELEMENT_SET_NO>999</ELEMENT_SET_NO><REV_AT_EPOCH>0</REV_AT_EPOCH>' \
+          '<BSTAR>0</BSTAR><MEAN_MOTION_DOT>0</MEAN_MOTION_DOT><MEAN_MOTION_DDOT>0</MEAN_MOTION_DDOT>' \
+          '</tleParameters></data></segment></body></omm>\n'
+
+omm_xml_end = '</ndm>\n'
+
+# Alpha-5 catalog numbers replace the leading digit of numbers from 100000 with a letter, skipping I and O.
+alpha5_letters = "ABCDEFGHJKLMNPQRSTUVWXYZ"
+
+
+def _parse_epoch(epoch):
+    """
+    Epoch as a naive datetime in UTC. Timezone-aware datetimes are converted to UTC.
+    """
+    if isinstance(epoch, datetime):
+        if epoch.tzinfo is not None and epoch.utcoffset() is not None:
+            return epoch.astimezone(timezone.utc).replace(tzinfo=None)
+        return epoch
+    return datetime.strptime(epoch, pigi_epoch_format)
+
+
+def catalog_number(number):
+    """
+    Five character TLE catalog number, in Alpha-5 form from 100000 to 339999
+    """
+    if number < 100000:
+        return "%05d" % number
+    if number < 340000:
+        return alpha5_letters[number // 10000 - 10] + "%04d" % (number % 10000)
+    raise ValueError("Catalog number {0} can't be written to a TLE".format(number))
+
+
+def tle_checksums(lines):
+    """
+    Modulo 10 checksums of fixed width TLE lines: digits count their value and minus signs count one
+    :param lines: uint8 array shaped (lines, 68)
+    """
+    digits = (lines >= 48) & (lines <= 57)
+    return (np.where(digits, lines - 48, 0).sum(axis=1) + (lines == 45).sum(axis=1)) % 10
+
+
+def mean_elements(constellation):
+    """
+    TLE-style mean elements of a column store around Earth
+    :return: Tuple of (mean motion in rev/day, eccentricity, inclination, raan, perigee, mean anomaly), angles in
+             degrees normalised to the TLE ranges
+    """
+    if constellation.focus.lower() != "earth":
+        raise FocusError("Element sets can only describe orbits around Earth")
+    mean_motion = np.sqrt(heavenly_body_mu["earth"] / constellation.true_alt ** 3) * 86400 / (2 * np.pi)
+    inclination = constellation.inclination.copy()
+    raan = constellation.right_ascension.copy()
+    perigee = constellation.perigee.copy()
+    # A negative inclination describes the same orbit as its opposite with the node and periapsis turned by 180.
+    flipped = inclination < 0
+    inclination[flipped] = -inclination[flipped]
+    raan[flipped] += 180
+    perigee[flipped] += 180
+    return (mean_motion, constellation.eccentricity, inclination, np.mod(raan, 360), np.mod(perigee, 360),
+            np.mod(constellation.ta, 360))
+
+
+def _scene_array(scene):
+    if isinstance(scene, ConstellationArray):
+        return scene
+    return ConstellationArray.from_scene(scene)
+
+
+def _chunks(constellation, chunk_size):
+    for start in range(0, len(constellation), chunk_size):
+        yield start, constellation[start:start + chunk_size]
+
+
+def iter_tle(scene, epoch='2017-Jan-18 00:00:00', first_catalog_number=1, names=True, chunk_size=10000):
+    """
+    Renders every satellite of a scene as a TLE, in text chunks of chunk_size element sets
+    :param scene: List of constellations and ground stations, as returned by create_scene, or a ConstellationArray
+    :param epoch: Element epoch as a datetime or in the PIGI epoch format
+    :param first_catalog_number: Catalog number of the first satellite; the rest follow in scene order
+    :param names: Write a name line before each element set (3LE)
+    :param chunk_size: Number of satellites converted at once
+    """
+    epoch = _parse_epoch(epoch)
+    year = epoch.year % 100
+    day = (epoch - datetime(epoch.year, 1, 1)).total_seconds() / 86400 + 1
+    constellation = _scene_array(scene)
+    for start, chunk in _chunks(constellation, chunk_size):
+        mean_motion, e, inclination, raan, perigee, anomaly = [column.tolist() for column in mean_elements(chunk)]
+        numbers = [catalog_number(number) for number in range(first_catalog_number + start,
+                                                              first_catalog_number + start + len(chunk))]
+        eccentricity = np.rint(np.asarray(e) * 1e7).astype(int).tolist()
+        body = "".join([tle_line1 % (number, year, day) + tle_line2 % values
+                        for number, values in zip(numbers, zip(numbers, inclination, raan, eccentricity, perigee,
+                                                               anomaly, mean_motion))])
+        lines = np.frombuffer(body.encode('ascii'), dtype=np.uint8).reshape(-1, tle_width)
+        # Append the checksum and newline to every line in one pass.
+        output = np.empty((len(lines), tle_width + 2), dtype=np.uint8)
+        output[:, :tle_width] = lines
+        output[:, tle_width] = 48 + tle_checksums(lines)
+        output[:, tle_width + 1] = 10
+        text = output.tobytes().decode('ascii')
+        if names:
+            record = 2 * (tle_width + 2)
+            text = "".join([name + "\n" + text[idx * record:(idx + 1) * record]
+                            for idx, name in enumerate(chunk.names)])
+        yield text
+
+
+def iter_omm(scene, epoch='2017-Jan-18 00:00:00', first_catalog_number=1, format_name="omm-kvn",
+             chunk_size=10000):
+    """
+    Renders every satellite of a scene as a CCSDS OMM, in text chunks of chunk_size messages
+    :param scene: List of constellations and ground stations, as returned by create_scene, or a ConstellationArray
+    :param epoch: Element epoch as a datetime or in the PIGI epoch format
+    :param first_catalog_number: Catalog number of the first satellite; the rest follow in scene order
+    :param format_name: 'omm-kvn' for keyword = value messages or 'omm-xml' for an XML ndm document
+    :param chunk_size: Number of satellites converted at once
+    """
+    if format_name not in ("omm-kvn", "omm-xml"):
+        raise ValueError("'" + str(format_name) + "' is not an OMM format")
+    epoch = _parse_epoch(epoch).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    created = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    template = omm_kvn if format_name == "omm-kvn" else omm_xml
+    quote = (lambda text: text) if format_name == "omm-kvn" else escape
+    constellation = _scene_array(scene)
+    if format_name == "omm-xml":
+        yield omm_xml_start
+    for start, chunk in _chunks(constellation, chunk_size):
+        columns = [column.tolist() for column in mean_elements(chunk)]
+        numbers = range(first_catalog_number + start, first_catalog_number + start + len(chunk))
+        yield "".join([template % ((created, quote(name), str(number), epoch) + values + (str(number),))
+                       for name, number, values in zip(chunk.names, numbers, zip(*columns))])
+    if format_name == "omm-xml":
+        yield omm_xml_end
+
+
+def _write(chunks, stream):
+    written = 0
+    for chunk in chunks:
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def write_tle(scene, stream, epoch='2017-Jan-18 00:00:00', first_catalog_number=1, names=True, chunk_size=10000):
+    """
+    Writes a scene's satellites as TLEs to a file-like object chunk by chunk. Parameters are as for iter_tle.
+    :return: Number of characters written
+    """
+    return _write(iter_tle(scene, epoch, first_catalog_number, names, chunk_size), stream)
+
+
+def write_omm(scene, stream, epoch='2017-Jan-18 00:00:00', first_catalog_number=1, format_name="omm-kvn",
+              chunk_size=10000):
+    """
+    Writes a scene's satellites as OMMs to a file-like object chunk by chunk. Parameters are as for iter_omm.
+    :return: Number of characters written
+    """
+    return _write(iter_omm(scene, epoch, first_catalog_number, format_name, chunk_size), stream)
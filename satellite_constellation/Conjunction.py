@@ -0,0 +1,290 @@
+"""
+Close approach screening between every pair of satellites in a scene.
+"""
+from .Access import _golden_section_max
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import timed
+from .Propagator import propagate, OrbitSampler
+from .utils import heavenly_body_mu
+import numpy as np
+
+# Cell neighbours (dx, dy, dz) that follow the cell itself in key order; with the cell they cover every adjacent pair
+# of cells once.
+_forward_neighbours = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                       if (dx, dy, dz) > (0, 0, 0)]
+
+
+class Conjunctions(object):
+    """
+    Table of close approaches, one row per encounter of a pair of satellites. Times are in seconds since the element
+    epoch, distances in km and speeds in km/s. The primary is always the satellite with the lower index.
+    """
+
+    def __init__(self, primary, secondary, tca, miss_distance, relative_speed, satellite_names):
+        self.primary = np.asarray(primary, dtype=np.int64)
+        self.secondary = np.asarray(secondary, dtype=np.int64)
+        self.tca = np.asarray(tca, dtype=np.float64)
+        self.miss_distance = np.asarray(miss_distance, dtype=np.float64)
+        self.relative_speed = np.asarray(relative_speed, dtype=np.float64)
+        self.satellite_names = list(satellite_names)
+
+    def __len__(self):
+        return len(self.tca)
+
+    def __repr__(self):
+        return "Conjunctions({0} encounters, {1} satellites)".format(len(self), len(self.satellite_names))
+
+    def select(self, mask):
+        """
+        Returns the encounters picked out by a boolean mask or index array
+        """
+        return Conjunctions(self.primary[mask], self.secondary[mask], self.tca[mask], self.miss_distance[mask],
+                            self.relative_speed[mask], self.satellite_names)
+
+    def for_satellite(self, satellite):
+        """
+        Encounters involving one satellite, given by index or name
+        """
+        if not isinstance(satellite, (int, np.integer)):
+            satellite = self.satellite_names.index(satellite)
+        return self.select((self.primary == satellite) | (self.secondary == satellite))
+
+    def as_dict(self):
+        return [{"Primary": self.satellite_names[primary],
+                 "Secondary": self.satellite_names[secondary],
+                 "TCA": tca,
+                 "Miss Distance": distance,
+                 "Relative Speed": speed}
+                for primary, secondary, tca, distance, speed in zip(self.primary.tolist(), self.secondary.tolist(),
+                                                                    self.tca.tolist(), self.miss_distance.tolist(),
+                                                                    self.relative_speed.tolist())]
+
+
+def radial_overlap(periapsis, apoapsis, threshold):
+    """
+    Objects whose band of radii comes within threshold of some other object's band, found with a sweep over the
+    objects sorted by periapsis. The rest can never come within threshold of anything.
+    """
+    order = np.argsort(periapsis, kind='mergesort')
+    low, high = periapsis[order] - threshold, apoapsis[order]
+    overlaps = np.zeros(len(order), dtype=bool)
+    if len(order) > 1:
+        # Overlap with an earlier band if it reaches this one; with a later band if the next lowest starts in this one.
+        reach = np.maximum.accumulate(high)
+        overlaps[1:] |= low[1:] <= reach[:-1]
+        overlaps[:-1] |= low[1:] <= high[:-1]
+    result = np.empty(len(order), dtype=bool)
+    result[order] = overlaps
+    return result
+
+
+def _pairs_between(start_a, count_a, start_b, count_b):
+    """
+    Every (a, b) combination of members of cell pairs, as flat index arrays into the sorted point order
+    """
+    size = count_a * count_b
+    owner = np.repeat(np.arange(len(size)), size)
+    local = np.arange(owner.size) - (np.cumsum(size) - size)[owner]
+    return start_a[owner] + local // count_b[owner], start_b[owner] + local % count_b[owner]
+
+
+def close_pairs(positions, radius):
+    """
+    Pairs of points no further apart than radius, found with a spatial hash on cells radius wide: only points in the
+    same or adjacent cells are compared. Points are sorted by cell key once, so a batch costs O(N log N) plus the
+    number of pairs compared.
+    :param positions: Array shaped (points, 3)
+    :param radius: Largest distance between the points of a pair, in the units of positions
+    :return: Tuple of (first, second) point index arrays with first < second
+    """
+    cell_size = radius
+    # Coarser cells still contain every close pair; grow them if the keys would overflow.
+    extent = np.ptp(positions, axis=0)
+    while np.prod(extent / cell_size + 3) > 2. ** 62:
+        cell_size *= 2
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind='mergesort')
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    first, second = _pairs_between(starts, counts, starts, counts)
+    same = first < second
+    first, second = [first[same]], [second[same]]
+    for dx, dy, dz in _forward_neighbours:
+        neighbour = cell_keys + (dx * dims[1] + dy) * dims[2] + dz
+        found = np.minimum(np.searchsorted(cell_keys, neighbour), len(cell_keys) - 1)
+        hit = np.flatnonzero(cell_keys[found] == neighbour)
+        a, b = _pairs_between(starts[hit], counts[hit], starts[found[hit]], counts[found[hit]])
+        first.append(a)
+        second.append(b)
+    first, second = order[np.concatenate(first)], order[np.concatenate(second)]
+    close = np.sum((positions[first] - positions[second]) ** 2, axis=-1) <= radius * radius
+    first, second = first[close], second[close]
+    return np.minimum(first, second), np.maximum(first, second)
+
+
+def close_pairs_by_step(positions, radius):
+    """
+    close_pairs at every step of an ephemeris, hashed in a single pass
+    :param positions: Array shaped (points, steps, 3), as returned by propagate
+    :param radius: Largest distance between the points of a pair
+    :return: Tuple of (step, first, second) index arrays with first < second
+    """
+    num_points, num_steps = positions.shape[:2]
+    # Each step's points get their own block of cells, far enough apart that no pair spans two steps.
+    shifted = positions.transpose(1, 0, 2).copy()
+    shifted[..., 0] += (2 * np.abs(positions).max() + 3 * radius) * np.arange(num_steps)[:, None]
+    first, second = close_pairs(shifted.reshape(-1, 3), radius)
+    step, first = np.divmod(first, num_points)
+    return step, first, second % num_points
+
+
+class _Separation(object):
+    """
+    Distance between fixed pairs of satellites as a function of time
+    """
+
+    def __init__(self, constellation, primary, secondary, j2=False):
+        self.primary = OrbitSampler(constellation, primary, j2=j2)
+        self.secondary = OrbitSampler(constellation, secondary, j2=j2)
+
+    def __call__(self, times):
+        return np.linalg.norm(self.primary.positions(times) - self.secondary.positions(times), axis=-1)
+
+    def relative_speed(self, times):
+        return np.linalg.norm(self.primary.state(times)[1] - self.secondary.state(times)[1], axis=-1)
+
+
+@timed("conjunctions")
+def conjunctions(scene, start, stop, step=10., threshold=5., j2=False, tolerance=1e-3, chunk_steps=64):
+    """
+    Finds every close approach closer than threshold between satellites of a scene.
+
+    Objects whose periapsis/apoapsis band overlaps nobody else's are dropped first, and pairs are only kept when
+    their bands come within threshold. Pairs of circular orbits in the same plane and of the same size hold their
+    separation, so it is checked once from their anomalies. The rest are screened at each step with a spatial hash for
+    pairs within threshold plus the distance any pair can close in half a step, so approaches between steps are never
+    missed. Pairs whose straight-line relative motion, allowing for gravity, stays further apart than threshold
+    around the step are dropped, and the remaining runs are refined with a golden section search for the time of
+    closest approach.
+    :param scene: List of constellations (ground stations are ignored), as returned by create_scene, or a
+                  ConstellationArray
+    :param start: Start of the search, in seconds since the element epoch
+    :param stop: End of the search, in seconds since the element epoch
+    :param step: Screening step in seconds. Smaller steps give smaller cells and fewer candidates per step.
+    :param threshold: Largest miss distance reported, in km
+    :param j2: Propagate with J2 secular drift
+    :param tolerance: Accuracy of the time of closest approach, in seconds
+    :param chunk_steps: Number of steps propagated and hashed at once
+    :return: Conjunctions table
+    """
+    if isinstance(scene, ConstellationArray):
+        constellation = scene
+    else:
+        constellation = ConstellationArray.from_scene(scene)
+    names = constellation.names
+    a = constellation.true_alt
+    e = constellation.eccentricity
+    periapsis, apoapsis = a * (1 - e), a * (1 + e)
+    candidates = np.flatnonzero(radial_overlap(periapsis, apoapsis, threshold))
+    if len(candidates) < 2:
+        return Conjunctions([], [], [], [], [], names)
+    screened = constellation if len(candidates) == len(constellation) else _take(constellation, candidates)
+    periapsis, apoapsis = periapsis[candidates], apoapsis[candidates]
+
+    # Fastest each object moves, at periapsis, bounds how fast any pair can close.
+    mu = heavenly_body_mu[constellation.focus.lower()]
+    speed = np.sqrt(mu * (1 + e[candidates]) / periapsis)
+    gravity = mu / periapsis ** 2
+    reach = threshold + speed.max() * step
+    # Circular orbits of the same radius, inclination and node share an orbit; other objects get an orbit of their own.
+    circular = e[candidates] == 0
+    orbit = np.unique(np.stack([a[candidates], screened.inclination, screened.right_ascension], axis=-1), axis=0,
+                      return_inverse=True)[1].ravel()
+    orbit = np.where(circular, orbit, len(candidates) + np.arange(len(candidates)))
+
+    coarse = np.arange(start, stop + step, step, dtype=np.float64)
+    coarse[-1] = stop
+    near_primary, near_secondary, near_step = [], [], []
+    coplanar_primary, coplanar_secondary = [], []
+    for chunk_start in range(0, len(coarse), chunk_steps):
+        chunk = coarse[chunk_start:chunk_start + chunk_steps]
+        positions, velocities = propagate(screened, chunk, j2=j2)
+        chunk_step, primary, secondary = close_pairs_by_step(positions, reach)
+
+        keep = np.maximum(periapsis[primary], periapsis[secondary]) - \
+            np.minimum(apoapsis[primary], apoapsis[secondary]) <= threshold
+        coplanar = keep & (orbit[primary] == orbit[secondary])
+        coplanar_primary.append(primary[coplanar])
+        coplanar_secondary.append(secondary[coplanar])
+        keep &= ~coplanar
+        primary, secondary, chunk_step = primary[keep], secondary[keep], chunk_step[keep]
+        relative = positions[secondary, chunk_step] - positions[primary, chunk_step]
+        velocity = velocities[secondary, chunk_step] - velocities[primary, chunk_step]
+        # The closest approach lies within half a step of some sample. Within that half step the pair departs from
+        # straight-line relative motion by at most half the summed gravitational accelerations times time squared.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = -np.sum(relative * velocity, axis=-1) / np.sum(velocity * velocity, axis=-1)
+        offset = np.clip(np.nan_to_num(offset), -step / 2, step / 2)
+        distance = np.linalg.norm(relative + velocity * offset[:, None], axis=-1)
+        close = distance <= threshold + (gravity[primary] + gravity[secondary]) * step ** 2 / 8
+        near_primary.append(primary[close])
+        near_secondary.append(secondary[close])
+        near_step.append(chunk_step[close] + chunk_start)
+
+    found = [_coplanar_encounters(screened, np.concatenate(coplanar_primary), np.concatenate(coplanar_secondary),
+                                  start, threshold, j2),
+             _refine(screened, np.concatenate(near_primary), np.concatenate(near_secondary), np.concatenate(near_step),
+                     coarse, threshold, j2, tolerance)]
+    primary, secondary, tca, miss_distance, relative_speed = [np.concatenate(column) for column in zip(*found)]
+    primary, secondary = candidates[primary], candidates[secondary]
+    order = np.lexsort((secondary, primary, tca))
+    return Conjunctions(primary[order], secondary[order], tca[order], miss_distance[order], relative_speed[order],
+                        names)
+
+
+def _take(constellation, idx):
+    return ConstellationArray([constellation.names[sat] for sat in idx.tolist()],
+                              *[getattr(constellation, column)[idx] for column in constellation.columns],
+                              focus=constellation.focus)
+
+
+def _coplanar_encounters(constellation, primary, secondary, start, threshold, j2):
+    """
+    Pairs of circular orbits sharing a plane and radius keep a constant separation, reported once at the start
+    """
+    pair = np.unique(primary * len(constellation) + secondary)
+    primary, secondary = np.divmod(pair, len(constellation))
+    separation = _Separation(constellation, primary, secondary, j2)
+    times = np.full(len(pair), float(start))
+    distance = separation(times)
+    close = distance <= threshold
+    return primary[close], secondary[close], times[close], distance[close], \
+        separation.relative_speed(times)[close]
+
+
+def _refine(constellation, primary, secondary, near_step, coarse, threshold, j2, tolerance):
+    """
+    Joins consecutive near steps of a pair into runs and finds each run's closest approach
+    """
+    if not len(near_step):
+        return primary, secondary, coarse[near_step], np.zeros(0), np.zeros(0)
+    order = np.lexsort((near_step, secondary, primary))
+    primary, secondary, near_step = primary[order], secondary[order], near_step[order]
+    breaks = np.ones(len(near_step), dtype=bool)
+    breaks[1:] = (primary[1:] != primary[:-1]) | (secondary[1:] != secondary[:-1]) | \
+                 (near_step[1:] != near_step[:-1] + 1)
+    first = np.flatnonzero(breaks)
+    last = np.append(first[1:], len(near_step)) - 1
+    primary, secondary = primary[first], secondary[first]
+    low = coarse[np.maximum(near_step[first] - 1, 0)]
+    high = coarse[np.minimum(near_step[last] + 1, len(coarse) - 1)]
+
+    separation = _Separation(constellation, primary, secondary, j2)
+    tca, closeness = _golden_section_max(lambda times: -separation(times), low, high, tolerance)
+    close = -closeness <= threshold
+    tca = tca[close]
+    return primary[close], secondary[close], tca, -closeness[close], \
+        _Separation(constellation, primary[close], secondary[close], j2).relative_speed(tca)
@@ -2,16 +2,69 @@
 Class for holding Constellations of Satellites within it.
 """
 from .Satellite import Satellite
+from .ConstellationArray import ConstellationArray
+from .ConstellationExceptions import ConstellationConfigurationError
+from .Walker import walker_elements, walker_planes, walker_slot, walker_spacing
+from .Instrumentation import timed
+from itertools import islice
+import numpy as np
 import warnings
 
+# Constellation.update keyword to attribute name
+updatable_parameters = {
+    "num_sats": "num_sats",
+    "num_planes": "num_planes",
+    "phasing": "phasing",
+    "inclination": "inclination",
+    "altitude": "altitude",
+    "eccentricity": "e",
+    "beam_width": "beam",
+    "pattern": "pattern",
+}
+
+
+class LazySatellites(object):
+    """
+    Read-only sequence of a Constellation's satellites that computes each Satellite from the Walker parameters
+    when it is accessed, so nothing is stored per satellite.
+    """
+
+    def __init__(self, constellation, slots=None):
+        self.__constellation = constellation
+        self.__spacing = walker_spacing(constellation.num_sats, constellation.num_planes, constellation.phasing,
+                                        constellation.pattern)
+        self.__planes = walker_planes(constellation.num_sats, self.__spacing)
+        self.__slots = range(constellation.num_sats) if slots is None else slots
+
+    def __satellite(self, slot):
+        const = self.__constellation
+        raan, perigee, ta = walker_slot(slot, self.__spacing, self.__planes)
+        sat_name = const.constellation_name + " " + str(slot + const.start_num + 1)
+        return Satellite(sat_name, const.altitude, const.e, const.inclination, raan, perigee, ta, const.beam,
+                         focus=const.focus, rads=False)
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LazySatellites(self.__constellation, self.__slots[idx])
+        return self.__satellite(self.__slots[idx])
+
+    def __iter__(self):
+        for slot in self.__slots:
+            yield self.__satellite(slot)
+
 
 class Constellation(object):
     """
     Class for describing and holding a constellation of satellites
     """
 
+    @timed("Constellation.build")
     def __init__(self, num_sats, num_planes, phasing, inclination, altitude,
-                 eccentricity, beam_width, name="Sat", focus="earth", starting_number=0):
+                 eccentricity, beam_width, name="Sat", focus="earth", starting_number=0,
+                 pattern="delta", lazy=False):
         self.num_sats = num_sats
         self.num_planes = num_planes
         self.phasing = phasing
@@ -22,44 +75,148 @@ class Constellation(object):
         self.start_num = starting_number
         self.constellation_name = name
         self.focus = focus
+        self.pattern = pattern
         self.sats_per_plane, self.correct_phasing = self.__corrected_planes()
-        self.perigee_positions = self.__perigee_positions()
-        self.raan = self.__calculate_raan()
-        self.ta = self.__calculate_ta()
-        self.satellites = self.__build_satellites()
+        self.lazy = lazy
+        if lazy:
+            # Elements are computed per satellite on access instead of being stored.
+            self.perigee_positions = self.raan = self.ta = None
+            self.satellites = LazySatellites(self)
+        else:
+            self.perigee_positions, self.raan, self.ta = self.__walker_positions()
+            self.satellites = self.__build_satellites()
+        self.clear_changes()
 
     def __corrected_planes(self):
         sats_per_plane = int(self.num_sats / self.num_planes)
         corrected_phasing = 360 * self.phasing / self.num_sats
         return sats_per_plane, corrected_phasing
 
-    def __perigee_positions(self):
-        perigees = list(range(0, 360, int(360/self.sats_per_plane)))
-        all_perigees = []
-        for i in range(self.num_sats):
-            all_perigees.extend(perigees)
-        return all_perigees
-
-    def __calculate_raan(self):
-        raan = [0] * self.num_sats
-        for i in range(self.sats_per_plane, self.num_sats):
-            raan[i] = raan[i - self.sats_per_plane] + 360 / self.num_planes
-        return raan
-
-    def __calculate_ta(self):
-        ta = [0] * self.num_sats
-        for i in range(self.sats_per_plane, self.num_sats):
-            ta[i] = ta[i - self.sats_per_plane] + self.correct_phasing
-        return ta
+    def __walker_positions(self):
+        return self.__element_lists(*walker_elements(self.num_sats, self.num_planes, self.phasing,
+                                                     pattern=self.pattern))
+
+    def __element_lists(self, raan, perigee, ta):
+        raan, ta = raan.tolist(), ta.tolist()
+        # The first plane's zeros stay integers, as they always have been, so the satellites print as before.
+        first_plane = min(self.sats_per_plane, self.num_sats)
+        raan[:first_plane] = ta[:first_plane] = [0] * first_plane
+        return perigee.tolist(), raan, ta
 
     def __build_satellites(self):
-        satellites = []
-        for i in range(self.num_sats):
-            sat_num = i + self.start_num + 1
-            sat_name = self.constellation_name + " " + str(sat_num)
-            satellites.append(Satellite(sat_name, self.altitude, self.e, self.inclination, self.raan[i],
-                                        self.perigee_positions[i], self.ta[i], self.beam, focus=self.focus))
-        return satellites
+        return [self.__satellite(i) for i in range(self.num_sats)]
+
+    def __satellite(self, i):
+        return Satellite(self.satellite_name(i), self.altitude, self.e, self.inclination, self.raan[i],
+                         self.perigee_positions[i], self.ta[i], self.beam, focus=self.focus, rads=False)
+
+    def satellite_name(self, i):
+        return self.constellation_name + " " + str(i + self.start_num + 1)
+
+    def update(self, **parameters):
+        """
+        Changes parameters in place. Walker elements are recomputed as arrays and only the satellites whose elements
+        differ are rebuilt; the affected slots are recorded until clear_changes is called. The merged parameters are
+        checked with validate_constellations first, so invalid parameters raise before anything changes.
+        :param parameters: Any of num_sats, num_planes, phasing, inclination, altitude, eccentricity, beam_width and
+                           pattern
+        :return: Tuple of (added, removed, modified) slot index arrays for this update
+        """
+        for key in parameters:
+            if key not in updatable_parameters:
+                raise ConstellationConfigurationError("'" + str(key) + "' can't be updated on a constellation")
+        current = {key: getattr(self, attribute) for key, attribute in updatable_parameters.items()}
+        new = dict(current)
+        new.update(parameters)
+        # SceneCreator builds on this module, so its validation is imported here rather than at the top.
+        from .SceneCreator import validate_constellations
+        validate_constellations(1, [new["num_sats"]], [new["num_planes"]], [new["phasing"]], [new["inclination"]],
+                                [new["altitude"]], [new["eccentricity"]], [new["beam_width"]], focus=self.focus,
+                                pattern=new["pattern"])
+
+        old_raan, old_perigee, old_ta = walker_elements(current["num_sats"], current["num_planes"],
+                                                        current["phasing"], pattern=current["pattern"])
+        raan, perigee, ta = walker_elements(new["num_sats"], new["num_planes"], new["phasing"],
+                                            pattern=new["pattern"])
+        for key, attribute in updatable_parameters.items():
+            setattr(self, attribute, new[key])
+        self.sats_per_plane, self.correct_phasing = self.__corrected_planes()
+
+        common = min(current["num_sats"], self.num_sats)
+        if any(new[key] != current[key] for key in ("inclination", "altitude", "eccentricity", "beam_width")):
+            modified = np.arange(common)
+        else:
+            modified = np.flatnonzero((old_raan[:common] != raan[:common]) |
+                                      (old_perigee[:common] != perigee[:common]) | (old_ta[:common] != ta[:common]))
+        added = np.arange(common, self.num_sats)
+        removed = np.arange(common, current["num_sats"])
+
+        if self.lazy:
+            self.satellites = LazySatellites(self)
+        else:
+            self.perigee_positions, self.raan, self.ta = self.__element_lists(raan, perigee, ta)
+            del self.satellites[self.num_sats:]
+            for i in modified.tolist():
+                self.satellites[i] = self.__satellite(i)
+            self.satellites.extend(self.__satellite(i) for i in added.tolist())
+
+        self.__record_changes(added.tolist(), removed.tolist(), modified.tolist())
+        return added, removed, modified
+
+    def renumber(self, starting_number):
+        """
+        Changes the number the satellite names count from, renaming every satellite. Slot changes can't describe a
+        rename, so the recorded changes are cleared; Scene reports a renumbered constellation as replaced.
+        """
+        self.start_num = starting_number
+        if self.lazy:
+            self.satellites = LazySatellites(self)
+        else:
+            self.satellites = self.__build_satellites()
+        self.clear_changes()
+
+    def __record_changes(self, added, removed, modified):
+        for slot in removed:
+            if slot in self.__added:
+                self.__added.discard(slot)
+            else:
+                self.__modified.discard(slot)
+                self.__removed.add(slot)
+        for slot in added:
+            if slot in self.__removed:
+                # Removed and added back: an existing entity with new elements.
+                self.__removed.discard(slot)
+                self.__modified.add(slot)
+            else:
+                self.__added.add(slot)
+        self.__modified.update(slot for slot in modified if slot not in self.__added)
+
+    @property
+    def has_changes(self):
+        return bool(self.__added or self.__removed or self.__modified)
+
+    def changes(self):
+        """
+        Slots added, removed and modified since the last clear_changes
+        """
+        return {"Added": sorted(self.__added), "Removed": sorted(self.__removed), "Modified": sorted(self.__modified)}
+
+    def clear_changes(self):
+        self.__added = set()
+        self.__removed = set()
+        self.__modified = set()
+
+    def diff_dict(self):
+        """
+        The satellites changed since the last clear_changes, in the as_dict format. Only changed satellites are
+        visited, so the cost follows the size of the change rather than of the constellation.
+        """
+        return {"Added": {self.satellites[slot].name: self.satellites[slot].as_dict(rads=False)
+                          for slot in self.__added},
+                "Removed": [self.satellite_name(slot) for slot in sorted(self.__removed)],
+                "Modified": {self.satellites[slot].name: self.satellites[slot].as_dict(rads=False)
+                             for slot in self.__modified},
+                "Type": 'diff'}
 
     def __repr__(self):
         return "{0}, {1}, {2}, {3}, {4}, {5}, {6}, name={7}, starting_number={8}".format(self.num_sats, self.num_planes,
@@ -69,29 +226,50 @@ class Constellation(object):
                                                                                          self.constellation_name,
                                                                                          self.start_num)
 
-    def __str__(self):
-        sat_string = ""
-        for sat in self.satellites:
-            sat_string += sat.__str__() + '\n'
+    def __len__(self):
+        return len(self.satellites)
+
+    def __getitem__(self, idx):
+        return self.satellites[idx]
 
-        return sat_string.rstrip()
+    def __iter__(self):
+        return iter(self.satellites)
 
+    def __str__(self):
+        return "\n".join(sat.__str__() for sat in self.satellites).rstrip()
+
+    @timed("Constellation.as_dict")
     def as_dict(self):
         constellation = {}
         for sat in self.satellites:
             if sat.name not in constellation:
-                constellation[sat.name] = sat.as_dict()
+                constellation[sat.name] = sat.as_dict(rads=False)
         constellation['Type'] = 'constellation'
         return constellation
 
+    def as_array(self):
+        if self.lazy:
+            return ConstellationArray.from_walker(self.num_sats, self.num_planes, self.phasing, self.inclination,
+                                                  self.altitude, self.e, self.beam, name=self.constellation_name,
+                                                  focus=self.focus, starting_number=self.start_num,
+                                                  pattern=self.pattern)
+        return ConstellationArray.from_satellites(self.satellites, focus=self.focus)
+
     def as_xml(self):
         warnings.warn("XML support is depreciated and not supported from PIGI 0.8.5 onward", DeprecationWarning)
         return self.as_pigi_output()
 
-    def as_pigi_output(self):
-        short_scene = ""
-        for sat in self.satellites:
-            short_scene += sat.as_xml()
+    @timed("Constellation.as_pigi_output")
+    def as_pigi_output(self, epoch_date='2017-Jan-18 00:00:00', fov=1):
+        return "".join(self.iter_pigi_output(epoch_date, fov))
 
-        return short_scene
+    def iter_pigi_output(self, epoch_date='2017-Jan-18 00:00:00', fov=1, chunk_size=256):
+        """
+        Yields the PIGI output of the satellites in chunks of at most chunk_size satellites
+        """
+        satellites = iter(self.satellites)
+        chunk = [sat.pigi_output(epoch_date, fov, rads=False) for sat in islice(satellites, chunk_size)]
+        while chunk:
+            yield "".join(chunk)
+            chunk = [sat.pigi_output(epoch_date, fov, rads=False) for sat in islice(satellites, chunk_size)]
 
@@ -0,0 +1,255 @@
+"""
+Array-backed storage for constellations of satellites.
+"""
+from .Satellite import Satellite, satellite_xml
+from .utils import heavenly_body_radius
+from .Walker import walker_elements, walker_spacing
+from .ConstellationExceptions import FocusError
+from .Instrumentation import timed
+from numbers import Integral
+import numpy as np
+import warnings
+
+
+class ConstellationArray(object):
+    """
+    Struct-of-arrays store for a constellation. Each orbital element is held in a single numpy column (angles in
+    degrees, as produced by Constellation) and Satellite objects are only built when they are indexed. Alongside each
+    column, integral marks the values that were given as integers, so they are written out as Constellation writes
+    them: 30 rather than 30.0.
+    """
+
+    columns = ("altitude", "eccentricity", "inclination", "right_ascension", "perigee", "ta", "beam")
+
+    def __init__(self, names, altitude, eccentricity, inclination, right_ascension, perigee, ta, beam,
+                 focus="earth", integral=None):
+        """
+
+        :param names: Sequence of satellite names, one per satellite
+        :param altitude: Altitudes above the focus body's surface
+        :param eccentricity: Eccentricities
+        :param inclination: Inclinations
+        :param right_ascension: Right ascensions of the ascending node
+        :param perigee: Arguments of periapsis
+        :param ta: Anomalies
+        :param beam: Beam widths
+        :param focus: The focus of the satellites, i.e. Earth, Luna, Mars, in lower case.
+        :param integral: Dict of column name to boolean arrays marking values given as integers. Columns left out are
+                         read from the values: Python ints and integer arrays are integral.
+        """
+        self.names = list(names)
+        num_sats = len(self.names)
+        self.altitude = self.__column(altitude, num_sats)
+        self.eccentricity = self.__column(eccentricity, num_sats)
+        self.inclination = self.__column(inclination, num_sats)
+        self.right_ascension = self.__column(right_ascension, num_sats)
+        self.perigee = self.__column(perigee, num_sats)
+        self.ta = self.__column(ta, num_sats)
+        self.beam = self.__column(beam, num_sats)
+        self.focus = focus
+        integral = integral or {}
+        self.integral = {}
+        for column, values in zip(self.columns, (altitude, eccentricity, inclination, right_ascension, perigee, ta,
+                                                 beam)):
+            if column in integral:
+                self.integral[column] = np.broadcast_to(np.asarray(integral[column], dtype=bool), (num_sats,))
+            else:
+                self.integral[column] = self.__integral(values, num_sats)
+
+    @classmethod
+    @timed("ConstellationArray.from_walker")
+    def from_walker(cls, num_sats, num_planes, phasing, inclination, altitude, eccentricity, beam_width, name="Sat",
+                    focus="earth", starting_number=0, pattern="delta"):
+        """
+        Builds the columns for a Walker constellation directly, with the same element layout as Constellation.
+        """
+        raan, perigee, ta = walker_elements(num_sats, num_planes, phasing, pattern=pattern)
+        names = [name + " " + str(sat_num) for sat_num in range(starting_number + 1, starting_number + num_sats + 1)]
+        # Constellation keeps the first plane's zero RAAN and anomaly as integers.
+        first_plane = np.arange(num_sats) < walker_spacing(num_sats, num_planes, phasing, pattern)[0]
+        return cls(names, altitude, eccentricity, inclination, raan, perigee, ta, beam_width, focus=focus,
+                   integral={"right_ascension": first_plane, "ta": first_plane})
+
+    @classmethod
+    def from_satellites(cls, satellites, focus=None):
+        """
+        Packs existing Satellite objects (e.g. Constellation.satellites) into columns, with angles from
+        Satellite.element_angles.
+        :param satellites: Satellites orbiting the same focus body
+        :param focus: The focus of the satellites, taken from them if None. Earth if there are none.
+        """
+        satellites = list(satellites)
+        foci = set(sat._focus.lower() for sat in satellites)
+        if focus is not None:
+            foci.add(focus.lower())
+        if len(foci) > 1:
+            raise FocusError("Satellites around different celestial bodies can't be combined")
+        focus = foci.pop() if foci else "earth"
+        angles = list(zip(*[sat.element_angles for sat in satellites])) or [()] * 4
+        return cls([sat.name for sat in satellites], [sat.altitude for sat in satellites],
+                   [sat.eccentricity for sat in satellites], angles[0], angles[1], angles[2], angles[3],
+                   [sat.beam for sat in satellites], focus=focus)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        """
+        Joins several column stores around the same focus into one.
+        """
+        arrays = list(arrays)
+        if not arrays:
+            return cls([], [], [], [], [], [], [], [])
+        focus = arrays[0].focus
+        if any(array.focus.lower() != focus.lower() for array in arrays):
+            raise FocusError("Constellations around different celestial bodies can't be combined")
+        names = [name for array in arrays for name in array.names]
+        return cls(names, *[np.concatenate([getattr(array, column) for array in arrays]) for column in cls.columns],
+                   focus=focus, integral={column: np.concatenate([array.integral[column] for array in arrays])
+                                          for column in cls.columns})
+
+    @classmethod
+    def from_scene(cls, scene):
+        """
+        Collects every satellite in a scene (as returned by create_scene) into a single column store. Ground stations
+        and other entities without orbital elements are skipped.
+        """
+        arrays = []
+        loose_satellites = []
+        for item in scene:
+            if isinstance(item, ConstellationArray):
+                arrays.append(item)
+            elif isinstance(item, Satellite):
+                loose_satellites.append(item)
+            elif hasattr(item, 'as_array'):
+                arrays.append(item.as_array())
+        if loose_satellites:
+            arrays.append(cls.from_satellites(loose_satellites))
+        return cls.concatenate(arrays)
+
+    @staticmethod
+    def __column(values, num_sats):
+        column = np.asarray(values, dtype=np.float64)
+        if column.ndim == 0:
+            return np.full(num_sats, column)
+        if column.shape != (num_sats,):
+            raise ValueError("Column length does not match the number of satellites")
+        return column
+
+    @staticmethod
+    def __integral(values, num_sats):
+        if isinstance(values, np.ndarray):
+            return np.full(num_sats, np.issubdtype(values.dtype, np.integer))
+        if np.ndim(values) == 0:
+            return np.full(num_sats, isinstance(values, Integral))
+        return np.array([isinstance(value, Integral) for value in values], dtype=bool).reshape(-1)
+
+    def copy(self):
+        """
+        A ConstellationArray with its own copies of the columns
+        """
+        return ConstellationArray(self.names, *[getattr(self, column).copy() for column in self.columns],
+                                  focus=self.focus, integral={column: self.integral[column].copy()
+                                                              for column in self.columns})
+
+    @property
+    def num_sats(self):
+        return len(self.names)
+
+    @property
+    def true_alt(self):
+        return self.altitude + heavenly_body_radius[self.focus.lower()]
+
+    @property
+    def satellites(self):
+        return [self[idx] for idx in range(len(self))]
+
+    def satellite(self, idx):
+        """
+        Materializes a single Satellite from the columns. The returned object is a copy; edits to it are not written
+        back to the array.
+        """
+        return Satellite(self.names[idx], *[self.values(column, slice(idx, idx + 1 or None))[0]
+                                            for column in self.columns], focus=self.focus, rads=False)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ConstellationArray(self.names[idx], self.altitude[idx], self.eccentricity[idx],
+                                      self.inclination[idx], self.right_ascension[idx], self.perigee[idx],
+                                      self.ta[idx], self.beam[idx], focus=self.focus,
+                                      integral={column: self.integral[column][idx] for column in self.columns})
+        return self.satellite(idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.satellite(idx)
+
+    def __repr__(self):
+        return "ConstellationArray({0} satellites, focus={1})".format(len(self), self.focus)
+
+    def __str__(self):
+        return "\n".join(sat.__str__() for sat in self)
+
+    def values(self, column, idx=slice(None)):
+        """
+        A slice of a column as Python numbers, with integral values as ints the way Constellation holds them
+        """
+        values = getattr(self, column)[idx].tolist()
+        for position in np.flatnonzero(self.integral[column][idx]).tolist():
+            values[position] = int(values[position])
+        return values
+
+    def true_alt_values(self, idx=slice(None)):
+        radius = heavenly_body_radius[self.focus.lower()]
+        return [altitude + radius for altitude in self.values("altitude", idx)]
+
+    @timed("ConstellationArray.as_dict")
+    def as_dict(self):
+        constellation = {}
+        for name, alt, e, inc, raan, perigee, ta, beam in zip(self.names, self.true_alt_values(),
+                                                              self.values("eccentricity"),
+                                                              self.values("inclination"),
+                                                              self.values("right_ascension"),
+                                                              self.values("perigee"), self.values("ta"),
+                                                              self.values("beam")):
+            if name not in constellation:
+                constellation[name] = {"Name": name,
+                                       "Orbital Elements": {
+                                           "Eccentricity": e,
+                                           "Right Ascension": raan,
+                                           "Semi-major Axis": alt,
+                                           "Arg. Periapsis": perigee,
+                                           "Mean Anomaly": ta,
+                                           "Inclination": inc
+                                       },
+                                       "Beam Width": beam,
+                                       "Focus": self.focus,
+                                       "Type": 'satellite'}
+        constellation['Type'] = 'constellation'
+        return constellation
+
+    def as_xml(self):
+        warnings.warn("XML support is depreciated and not supported from PIGI 0.8.5 onward", DeprecationWarning)
+        return self.as_pigi_output()
+
+    @timed("ConstellationArray.as_pigi_output")
+    def as_pigi_output(self, epoch_date='2017-Jan-18 00:00:00', fov=1):
+        return "".join(self.iter_pigi_output(epoch_date, fov))
+
+    def iter_pigi_output(self, epoch_date='2017-Jan-18 00:00:00', fov=1, chunk_size=256):
+        """
+        Yields the PIGI output in chunks of at most chunk_size satellites. Only one chunk of the columns is converted
+        to Python numbers at a time.
+        """
+        for start in range(0, len(self), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            yield "".join(satellite_xml.render(name, beam, e, raan, alt, perigee, ta, inc, epoch_date, fov)
+                          for name, beam, e, raan, alt, perigee, ta, inc in zip(self.names[chunk],
+                                                                                self.values("beam", chunk),
+                                                                                self.values("eccentricity", chunk),
+                                                                                self.values("right_ascension", chunk),
+                                                                                self.true_alt_values(chunk),
+                                                                                self.values("perigee", chunk),
+                                                                                self.values("ta", chunk),
+                                                                                self.values("inclination", chunk)))
@@ -34,3 +34,7 @@ class BeamError(Exception):
 
 class FocusError(Exception):
     pass
+
+
+class CatalogError(Exception):
+    pass
@@ -0,0 +1,288 @@
+"""
+Ground station contact scheduling over access windows. Each station's antenna serves one satellite at a time with a
+setup gap between contacts, and optionally each satellite talks to one station at a time.
+"""
+from .Access import AccessWindows
+from .Instrumentation import timed
+import numpy as np
+
+scheduling_methods = ("priority", "interval")
+
+
+def _shifted(group, values, low, width):
+    """
+    Values offset by group so that one sorted array orders by group, then value
+    """
+    return (values - low) + group * width
+
+
+def conflict_pairs(group, start, end, gap=0.):
+    """
+    Pairs of intervals on the same resource that overlap or are closer together than gap. Intervals are sorted by
+    resource then start once, so this costs O(N log N) plus the number of pairs.
+    :param group: Array of resource indices, one per interval
+    :param start: Array of interval starts
+    :param end: Array of interval ends
+    :param gap: Time a resource needs between the end of one interval and the start of the next
+    :return: Tuple of (first, second) interval index arrays, each pair once
+    """
+    if not len(start):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    low = start.min()
+    width = end.max() - low + gap + 1
+    order = np.lexsort((start, group))
+    sorted_start = _shifted(group[order], start[order], low, width)
+    sorted_limit = _shifted(group[order], end[order] + gap, low, width)
+    # Later-starting intervals on the same resource conflict until one starts gap after this one ends.
+    count = np.maximum(np.searchsorted(sorted_start, sorted_limit, side='left') - np.arange(len(order)) - 1, 0)
+    owner = np.repeat(np.arange(len(order)), count)
+    local = np.arange(owner.size) - (np.cumsum(count) - count)[owner]
+    return order[owner], order[owner + 1 + local]
+
+
+def _components(num, first, second):
+    """
+    Connected component of every node, labelled by the smallest node index in it
+    """
+    label = np.arange(num)
+    while True:
+        previous = label.copy()
+        low = np.minimum(label[first], label[second])
+        np.minimum.at(label, label[first], low)
+        np.minimum.at(label, label[second], low)
+        while True:
+            jumped = label[label]
+            if (jumped == label).all():
+                break
+            label = jumped
+        if (label == previous).all():
+            return label
+
+
+def _greedy(rank, first, second, state):
+    """
+    Accepts nodes in rank order, skipping any that conflict with a node already accepted. Rather than a loop over
+    nodes, each round accepts every undecided node that outranks all its undecided neighbours, which gives the same
+    result as taking them one at a time.
+    :param rank: Array of distinct ranks, lowest first
+    :param state: Array of 1 for accepted, -1 for rejected and 0 for undecided nodes, updated in place
+    """
+    accepted = state == 1
+    state[second[accepted[first] & (state[second] == 0)]] = -1
+    state[first[accepted[second] & (state[first] == 0)]] = -1
+    while (state == 0).any():
+        live = (state[first] == 0) & (state[second] == 0)
+        best = np.full(len(state), len(state))
+        np.minimum.at(best, first[live], rank[second[live]])
+        np.minimum.at(best, second[live], rank[first[live]])
+        accept = (state == 0) & (rank < best)
+        state[accept] = 1
+        state[second[accept[first] & (state[second] == 0)]] = -1
+        state[first[accept[second] & (state[first] == 0)]] = -1
+    return state
+
+
+def _station_optimum(station, start, end, priority, setup_time):
+    """
+    Weighted interval scheduling on each station: the contacts with the largest total priority that keep setup_time
+    between contacts on the same station
+    :return: Boolean array of chosen windows
+    """
+    chosen = np.zeros(len(start), dtype=bool)
+    if not len(start):
+        return chosen
+    low = start.min()
+    width = end.max() - low + setup_time + 1
+    order = np.lexsort((end, station))
+    ready = _shifted(station[order], end[order] + setup_time, low, width)
+    # Last window, in this order, free before each one starts. Earlier stations' windows come first, so totals carry
+    # across stations as a constant.
+    previous = (np.searchsorted(ready, _shifted(station[order], start[order], low, width), side='right') - 1).tolist()
+    weight = priority[order].tolist()
+    best = [0.] * (len(order) + 1)
+    for k in range(len(order)):
+        best[k + 1] = max(best[k], weight[k] + best[previous[k] + 1])
+    k = len(order) - 1
+    while k >= 0:
+        if weight[k] + best[previous[k] + 1] > best[k]:
+            chosen[order[k]] = True
+            k = previous[k]
+        else:
+            k -= 1
+    return chosen
+
+
+class ContactSchedule(object):
+    """
+    Contacts chosen from a set of access windows so that each station's antenna serves one satellite at a time, with
+    setup_time between contacts, and, if satellite_exclusive, each satellite talks to one station at a time.
+
+    Windows conflict in pairs, so the schedule splits into independent groups of windows linked by conflicts. Adding
+    or removing a window only solves its group again, and the result is the same as solving the whole set afresh.
+    Windows keep their index when others are added or removed.
+    """
+
+    def __init__(self, windows, priority=None, setup_time=0., min_duration=0., satellite_exclusive=True,
+                 method="priority"):
+        """
+        :param windows: AccessWindows table
+        :param priority: Array of positive priorities, one per window, defaults to the window durations
+        :param setup_time: Time in seconds a station needs between the end of one contact and the start of the next
+        :param min_duration: Windows shorter than this, in seconds, are never scheduled
+        :param satellite_exclusive: Each satellite talks to at most one station at a time
+        :param method: 'priority' takes windows in order of priority, skipping those that conflict with windows
+                       already taken. 'interval' first picks the contacts with the largest total priority on each
+                       station, which is optimal when satellites are not exclusive, then settles conflicts between
+                       satellites by priority and fills any gaps.
+        """
+        if method not in scheduling_methods:
+            raise ValueError("'" + str(method) + "' is not a supported scheduling method")
+        self.satellite = windows.satellite.copy()
+        self.station = windows.station.copy()
+        self.start = windows.start.copy()
+        self.end = windows.end.copy()
+        self.max_elevation = windows.max_elevation.copy()
+        self.priority = windows.duration if priority is None else np.asarray(priority, dtype=np.float64).copy()
+        self.satellite_names = windows.satellite_names
+        self.station_names = windows.station_names
+        self.setup_time = setup_time
+        self.min_duration = min_duration
+        self.satellite_exclusive = satellite_exclusive
+        self.method = method
+        self.active = np.ones(len(self.start), dtype=bool)
+        self.scheduled = np.zeros(len(self.start), dtype=bool)
+        self.group = np.arange(len(self.start))
+        self._solve(np.flatnonzero(self._eligible()))
+
+    def __len__(self):
+        return int(self.scheduled.sum())
+
+    def __repr__(self):
+        return "ContactSchedule({0} contacts from {1} windows)".format(len(self), int(self.active.sum()))
+
+    @property
+    def total_priority(self):
+        return self.priority[self.scheduled].sum()
+
+    def _eligible(self):
+        return self.active & (self.end - self.start >= self.min_duration)
+
+    def _conflicts(self, idx):
+        """
+        Conflicting pairs among the windows idx, as index arrays into idx
+        """
+        first, second = conflict_pairs(self.station[idx], self.start[idx], self.end[idx], self.setup_time)
+        if self.satellite_exclusive:
+            sat_first, sat_second = conflict_pairs(self.satellite[idx], self.start[idx], self.end[idx])
+            first, second = np.concatenate([first, sat_first]), np.concatenate([second, sat_second])
+        return first, second
+
+    @timed("ContactSchedule.solve")
+    def _solve(self, idx):
+        """
+        Schedules the windows idx, which must be whole groups, from scratch
+        """
+        first, second = self._conflicts(idx)
+        self.group[idx] = idx[_components(len(idx), first, second)]
+        # Highest priority first, then earliest, then lowest index, so ties break the same way in any subset.
+        rank = np.empty(len(idx), dtype=np.int64)
+        rank[np.lexsort((idx, self.start[idx], -self.priority[idx]))] = np.arange(len(idx))
+        state = np.zeros(len(idx), dtype=np.int8)
+        if self.method == "interval":
+            picked = _station_optimum(self.station[idx], self.start[idx], self.end[idx], self.priority[idx],
+                                      self.setup_time)
+            state[~picked] = -1
+            _greedy(rank, first, second, state)
+            state[state == -1] = 0
+        self.scheduled[idx] = _greedy(rank, first, second, state) == 1
+
+    def _index(self, item, names):
+        if not isinstance(item, (int, np.integer)):
+            return names.index(item)
+        return item
+
+    def add_window(self, satellite, station, start, end, max_elevation=np.nan, priority=None):
+        """
+        Adds a window and schedules the group of windows it conflicts with again
+        :param satellite: Satellite index or name
+        :param station: Station index or name
+        :param start: Start of the window in seconds since the element epoch
+        :param end: End of the window in seconds since the element epoch
+        :param max_elevation: Peak elevation in degrees
+        :param priority: Priority of the window, defaults to its duration
+        :return: Index of the new window
+        """
+        satellite = self._index(satellite, self.satellite_names)
+        station = self._index(station, self.station_names)
+        index = len(self.start)
+        self.satellite = np.append(self.satellite, satellite)
+        self.station = np.append(self.station, station)
+        self.start = np.append(self.start, float(start))
+        self.end = np.append(self.end, float(end))
+        self.max_elevation = np.append(self.max_elevation, float(max_elevation))
+        self.priority = np.append(self.priority, float(end - start if priority is None else priority))
+        self.active = np.append(self.active, True)
+        self.scheduled = np.append(self.scheduled, False)
+        self.group = np.append(self.group, index)
+        eligible = self._eligible()
+        if not eligible[index]:
+            return index
+
+        touches = (self.station == station) & (self.start < end + self.setup_time) & \
+            (start < self.end + self.setup_time)
+        if self.satellite_exclusive:
+            touches |= (self.satellite == satellite) & (self.start < end) & (start < self.end)
+        groups = np.unique(self.group[touches & eligible])
+        self._solve(np.flatnonzero(eligible & np.isin(self.group, groups)))
+        return index
+
+    def remove_window(self, index):
+        """
+        Removes a window and schedules what was its group again, which may split in two
+        :param index: Index of the window
+        """
+        if not self.active[index]:
+            raise ValueError("Window {0} has already been removed".format(index))
+        eligible = self._eligible()
+        group = eligible & (self.group == self.group[index])
+        self.active[index] = False
+        self.scheduled[index] = False
+        group[index] = False
+        self._solve(np.flatnonzero(group))
+
+    def windows(self):
+        """
+        The windows that have not been removed, as an AccessWindows table in index order
+        """
+        return AccessWindows(self.satellite[self.active], self.station[self.active], self.start[self.active],
+                             self.end[self.active], self.max_elevation[self.active], self.satellite_names,
+                             self.station_names)
+
+    def contacts(self):
+        """
+        The scheduled contacts as an AccessWindows table, in station then start time order
+        """
+        idx = np.flatnonzero(self.scheduled)
+        idx = idx[np.lexsort((self.start[idx], self.station[idx]))]
+        return AccessWindows(self.satellite[idx], self.station[idx], self.start[idx], self.end[idx],
+                             self.max_elevation[idx], self.satellite_names, self.station_names)
+
+    def station_utilisation(self, span):
+        """
+        Fraction of a (start, stop) span each station spends in contact, one entry per station
+        """
+        contact = np.bincount(self.station[self.scheduled], weights=(self.end - self.start)[self.scheduled],
+                              minlength=len(self.station_names))
+        return contact / (span[1] - span[0])
+
+    def as_dict(self):
+        return self.contacts().as_dict()
+
+
+def schedule_contacts(windows, priority=None, setup_time=0., min_duration=0., satellite_exclusive=True,
+                      method="priority"):
+    """
+    Chooses ground station contacts from access windows, see ContactSchedule
+    :return: ContactSchedule, which takes further windows with add_window and remove_window
+    """
+    return ContactSchedule(windows, priority, setup_time, min_duration, satellite_exclusive, method)
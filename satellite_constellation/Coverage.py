@@ -0,0 +1,213 @@
+"""
+Coverage and revisit statistics of constellations over an equal-area grid of the focus body.
+"""
+from .ConstellationArray import ConstellationArray
+from .GroundTrack import sub_satellite_points
+from .Instrumentation import timed
+from .Propagator import propagate
+from .utils import heavenly_body_radius
+import numpy as np
+
+
+class EqualAreaGrid(object):
+    """
+    Latitude bands of equal height, each split into as many longitude cells as keeps the cells close to square.
+    Cells in the same band are contiguous, so the bands double as buckets for footprint lookups.
+    """
+
+    def __init__(self, resolution=2.0):
+        """
+
+        :param resolution: Approximate cell size in degrees
+        """
+        self.resolution = resolution
+        num_bands = max(1, int(round(180 / resolution)))
+        self.band_edges = np.linspace(-90, 90, num_bands + 1)
+        self.band_lat = (self.band_edges[:-1] + self.band_edges[1:]) / 2
+        self.band_cells = np.maximum(1, np.round(360 * np.cos(np.radians(self.band_lat)) / resolution)).astype(int)
+        self.band_offset = np.concatenate([[0], np.cumsum(self.band_cells)[:-1]])
+        self.num_cells = int(self.band_cells.sum())
+
+        band = np.repeat(np.arange(num_bands), self.band_cells)
+        index_in_band = np.arange(self.num_cells) - self.band_offset[band]
+        self.cell_band = band
+        self.lat = self.band_lat[band]
+        self.long = -180 + (index_in_band + 0.5) * 360 / self.band_cells[band]
+        # Fraction of the sphere's surface in each cell.
+        band_area = (np.sin(np.radians(self.band_edges[1:])) - np.sin(np.radians(self.band_edges[:-1]))) / 2
+        self.area = (band_area / self.band_cells)[band]
+
+    def __len__(self):
+        return self.num_cells
+
+    def __repr__(self):
+        return "EqualAreaGrid({0} cells, resolution={1})".format(self.num_cells, self.resolution)
+
+    def covered_cells(self, lat, long, half_angle):
+        """
+        Cells whose centres lie within each footprint. Only the bands a footprint spans are visited, and within a
+        band only the contiguous run of cells inside the footprint's longitude extent.
+        :param lat: Footprint centre latitudes in degrees
+        :param long: Footprint centre longitudes in degrees
+        :param half_angle: Footprint radii as central angles in degrees
+        :return: Array of cell indices, possibly with repeats
+        """
+        lat, long, half_angle = np.broadcast_arrays(np.asarray(lat, dtype=np.float64),
+                                                    np.asarray(long, dtype=np.float64),
+                                                    np.asarray(half_angle, dtype=np.float64))
+        first_band = np.searchsorted(self.band_lat, lat - half_angle, side='left')
+        last_band = np.searchsorted(self.band_lat, lat + half_angle, side='right')
+        footprint, band = _expand(first_band, last_band - first_band)
+
+        band_lat = np.radians(self.band_lat[band])
+        centre_lat = np.radians(lat[footprint])
+        radius = np.radians(half_angle[footprint])
+        # Longitude half-width of the footprint along the band's centre line, from the spherical law of cosines.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_width = (np.cos(radius) - np.sin(band_lat) * np.sin(centre_lat)) / \
+                (np.cos(band_lat) * np.cos(centre_lat))
+        reaches = ~(cos_width > 1)
+        footprint, band, cos_width = footprint[reaches], band[reaches], cos_width[reaches]
+        width = np.degrees(np.arccos(np.clip(np.nan_to_num(cos_width, nan=-1), -1, 1)))
+
+        cells_in_band = self.band_cells[band]
+        cell_width = 360 / cells_in_band
+        low = np.ceil((long[footprint] - width + 180) / cell_width - 0.5).astype(int)
+        high = np.floor((long[footprint] + width + 180) / cell_width - 0.5).astype(int)
+        count = np.clip(high - low + 1, 0, cells_in_band)
+        pair, step = _expand(np.zeros(len(count), dtype=int), count)
+        return self.band_offset[band[pair]] + (low[pair] + step) % cells_in_band[pair]
+
+
+def _expand(start, count):
+    """
+    Expands ranges [start, start + count) into flat (owner, value) arrays
+    """
+    owner = np.repeat(np.arange(len(count)), count)
+    offsets = np.cumsum(count) - count
+    return owner, start[owner] + np.arange(owner.size) - offsets[owner]
+
+
+class CoverageAccumulator(object):
+    """
+    Streaming per-cell coverage statistics. Each update takes one timestep's covered cells, so the time history is
+    never stored.
+    """
+
+    def __init__(self, grid, start=0.):
+        self.grid = grid
+        self.start = start
+        self.last_time = start
+        self.steps = 0
+        self.covered_steps = np.zeros(len(grid), dtype=np.int64)
+        self.ever_covered = np.zeros(len(grid), dtype=bool)
+        self.covered = np.zeros(len(grid), dtype=bool)
+        self.gap_start = np.full(len(grid), float(start))
+        self.max_gap = np.zeros(len(grid))
+        self.revisit_total = np.zeros(len(grid))
+        self.revisit_count = np.zeros(len(grid), dtype=np.int64)
+
+    def update(self, time, cells):
+        """
+        Adds one timestep
+        :param time: Time of the step in seconds
+        :param cells: Indices of the cells covered at this time, repeats allowed
+        """
+        now = np.zeros(len(self.grid), dtype=bool)
+        now[cells] = True
+
+        opened = self.covered & ~now
+        self.gap_start[opened] = time
+        closed = ~self.covered & now
+        gap = time - self.gap_start[closed]
+        self.max_gap[closed] = np.maximum(self.max_gap[closed], gap)
+        # Only gaps between two coverage periods count as revisits; the wait for the first pass does not.
+        revisit = closed & self.ever_covered
+        self.revisit_total[revisit] += time - self.gap_start[revisit]
+        self.revisit_count[revisit] += 1
+
+        self.covered = now
+        self.ever_covered |= now
+        self.covered_steps += now
+        self.steps += 1
+        self.last_time = time
+
+    def finish(self):
+        """
+        Closes gaps that are still open at the last timestep so they count towards max_gap
+        """
+        open_gap = ~self.covered
+        self.max_gap[open_gap] = np.maximum(self.max_gap[open_gap], self.last_time - self.gap_start[open_gap])
+        return self
+
+    @property
+    def coverage_fraction(self):
+        return self.covered_steps / max(self.steps, 1)
+
+    @property
+    def mean_revisit(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.revisit_count > 0, self.revisit_total / self.revisit_count, np.nan)
+
+    @property
+    def percent_coverage(self):
+        """
+        Area-weighted mean percentage of time each point is covered
+        """
+        return 100 * np.dot(self.grid.area, self.coverage_fraction)
+
+    @property
+    def percent_ever_covered(self):
+        return 100 * self.grid.area[self.ever_covered].sum()
+
+    def as_dict(self):
+        return {"Percent Coverage": float(self.percent_coverage),
+                "Percent Ever Covered": float(self.percent_ever_covered),
+                "Max Gap": float(self.max_gap.max()) if len(self.grid) else 0.,
+                "Mean Revisit": float(np.nanmean(self.mean_revisit)) if self.revisit_count.any() else None}
+
+
+def footprint_half_angle(radius, beam, body_radius):
+    """
+    Central angle, in degrees, covered either side of the sub-satellite point by a nadir pointing beam
+    :param radius: Orbital radius in km
+    :param beam: Full beam width in degrees
+    :param body_radius: Radius of the focus body in km
+    """
+    half_beam = np.radians(beam) / 2
+    ratio = radius * np.sin(half_beam) / body_radius
+    horizon = np.arccos(np.minimum(body_radius / radius, 1))
+    with np.errstate(invalid='ignore'):
+        angle = np.where(ratio < 1, np.arcsin(np.minimum(ratio, 1)) - half_beam, horizon)
+    return np.degrees(np.minimum(angle, horizon))
+
+
+@timed("coverage")
+def coverage(scene, start, stop, step=60., resolution=2.0, j2=False, chunk_steps=64):
+    """
+    Coverage and revisit statistics for every satellite in a scene over an equal-area grid
+    :param scene: List of constellations (ground stations are ignored), as returned by create_scene
+    :param start: Start time in seconds since the element epoch
+    :param stop: End time in seconds since the element epoch
+    :param step: Time step in seconds
+    :param resolution: Approximate grid cell size in degrees
+    :param j2: Propagate with J2 secular drift
+    :param chunk_steps: Number of timesteps propagated at once
+    :return: Finished CoverageAccumulator
+    """
+    constellation = ConstellationArray.from_scene(scene)
+    focus = constellation.focus.lower()
+    body_radius = heavenly_body_radius[focus]
+    grid = EqualAreaGrid(resolution)
+    accumulator = CoverageAccumulator(grid, start)
+
+    times = np.arange(start, stop + step / 2, step, dtype=np.float64)
+    for chunk_start in range(0, len(times), chunk_steps):
+        chunk = times[chunk_start:chunk_start + chunk_steps]
+        positions = propagate(constellation, chunk, j2=j2)[0]
+        lat, long, alt = sub_satellite_points(positions, chunk, focus)
+        half_angle = footprint_half_angle(alt + body_radius, constellation.beam[:, None], body_radius)
+        for idx, time in enumerate(chunk):
+            accumulator.update(time, grid.covered_cells(lat[:, idx], long[:, idx], half_angle[:, idx]))
+
+    return accumulator.finish()
@@ -0,0 +1,300 @@
+"""
+Eclipse intervals and sunlit fractions of every satellite in a scene, with cylindrical or conical shadows.
+"""
+from .Access import _find_crossing, _golden_section_max
+from .CatalogWriter import _parse_epoch
+from .ConstellationArray import ConstellationArray
+from .ConstellationExceptions import FocusError
+from .Instrumentation import timed
+from .Propagator import propagate, OrbitSampler
+from .utils import heavenly_body_mu, heavenly_body_radius
+from datetime import datetime
+import numpy as np
+
+astronomical_unit = 149597870.7
+j2000 = datetime(2000, 1, 1, 12)
+# Fastest the Sun's direction turns as seen from a planet, in rad/s; Mercury's perihelion rate, with margin.
+sun_angular_rate = 1.5e-6
+
+shadow_models = ("cylindrical", "conical")
+
+
+def sun_position(times, epoch='2017-Jan-18 00:00:00'):
+    """
+    Geocentric position of the Sun in Earth's equatorial inertial frame, from the Astronomical Almanac's low precision
+    formulae (about 0.01 degrees between 1950 and 2050)
+    :param times: Array of times in seconds since the element epoch
+    :param epoch: Element epoch as a datetime or in the PIGI epoch format
+    :return: Array shaped times.shape + (3,) in km
+    """
+    days = (_parse_epoch(epoch) - j2000).total_seconds() / 86400 + np.asarray(times, dtype=np.float64) / 86400
+    mean_longitude = np.radians(280.460 + 0.9856474 * days)
+    mean_anomaly = np.radians(357.528 + 0.9856003 * days)
+    longitude = mean_longitude + np.radians(1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly))
+    obliquity = np.radians(23.439 - 4e-7 * days)
+    distance = astronomical_unit * (1.00014 - 0.01671 * np.cos(mean_anomaly) - 0.00014 * np.cos(2 * mean_anomaly))
+    return distance[..., None] * np.stack([np.cos(longitude),
+                                           np.cos(obliquity) * np.sin(longitude),
+                                           np.sin(obliquity) * np.sin(longitude)], axis=-1)
+
+
+def shadow_boundary(positions, sun, body_radius, model="cylindrical", umbra=False):
+    """
+    Signed distance to a shadow boundary, negative inside the shadow
+    :param positions: Satellite positions shaped (..., 3) in km
+    :param sun: Sun positions relative to the focus body, broadcastable against positions, in km
+    :param body_radius: Radius of the focus body in km
+    :param model: 'cylindrical' for a shadow cylinder as wide as the body, or 'conical' for the penumbra and umbra
+                  cones cast by the Sun's disc
+    :param umbra: For the conical model, measure to the umbra instead of the outer edge of the penumbra
+    :return: Distance in km for the cylindrical model; angle in radians for the conical model
+    """
+    radius = np.linalg.norm(positions, axis=-1)
+    if model == "cylindrical":
+        along = np.sum(positions * sun, axis=-1) / np.linalg.norm(sun, axis=-1)
+        across = np.sqrt(np.maximum(radius * radius - along * along, 0))
+        return np.where(along < 0, across, radius) - body_radius
+    to_sun = sun - positions
+    sun_distance = np.linalg.norm(to_sun, axis=-1)
+    separation = np.arccos(np.clip(-np.sum(positions * to_sun, axis=-1) / (radius * sun_distance), -1, 1))
+    body_angle = np.arcsin(np.minimum(body_radius / radius, 1))
+    sun_angle = np.arcsin(heavenly_body_radius["sol"] / sun_distance)
+    if umbra:
+        return separation - body_angle + sun_angle
+    return separation - body_angle - sun_angle
+
+
+class EclipseIntervals(object):
+    """
+    Table of shadow passages, one row per passage of a satellite through the focus body's shadow. start and end
+    bound the whole passage; umbra_start and umbra_end bound its total part, and are NaN when it has none. With the
+    cylindrical model the whole passage is umbra. Times are in seconds since the element epoch.
+    """
+
+    def __init__(self, satellite, start, end, umbra_start, umbra_end, satellite_names, span):
+        self.satellite = np.asarray(satellite, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.umbra_start = np.asarray(umbra_start, dtype=np.float64)
+        self.umbra_end = np.asarray(umbra_end, dtype=np.float64)
+        self.satellite_names = list(satellite_names)
+        self.span = span
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def umbra_duration(self):
+        return np.nan_to_num(self.umbra_end - self.umbra_start)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return "EclipseIntervals({0} passages, {1} satellites)".format(len(self), len(self.satellite_names))
+
+    def select(self, mask):
+        """
+        Returns the passages picked out by a boolean mask or index array
+        """
+        return EclipseIntervals(self.satellite[mask], self.start[mask], self.end[mask], self.umbra_start[mask],
+                                self.umbra_end[mask], self.satellite_names, self.span)
+
+    def for_satellite(self, satellite):
+        """
+        Passages of one satellite, given by index or name
+        """
+        if not isinstance(satellite, (int, np.integer)):
+            satellite = self.satellite_names.index(satellite)
+        return self.select(self.satellite == satellite)
+
+    def sunlit_fraction(self):
+        """
+        Fraction of the searched span each satellite spends outside the shadow, one entry per satellite
+        """
+        shadow = np.bincount(self.satellite, weights=self.duration, minlength=len(self.satellite_names))
+        return 1 - shadow / (self.span[1] - self.span[0]) if self.span[1] > self.span[0] else 1 - shadow
+
+    def umbra_fraction(self):
+        """
+        Fraction of the searched span each satellite spends in total shadow, one entry per satellite
+        """
+        umbra = np.bincount(self.satellite, weights=self.umbra_duration, minlength=len(self.satellite_names))
+        return umbra / (self.span[1] - self.span[0]) if self.span[1] > self.span[0] else umbra
+
+    def as_dict(self):
+        return [{"Satellite": self.satellite_names[sat],
+                 "Start": start,
+                 "End": end,
+                 "Umbra Start": None if umbra_start != umbra_start else umbra_start,
+                 "Umbra End": None if umbra_end != umbra_end else umbra_end}
+                for sat, start, end, umbra_start, umbra_end in zip(self.satellite.tolist(), self.start.tolist(),
+                                                                   self.end.tolist(), self.umbra_start.tolist(),
+                                                                   self.umbra_end.tolist())]
+
+
+class _Boundary(object):
+    """
+    shadow_boundary of chosen satellites as a function of time, evaluated elementwise over paired arrays
+    """
+
+    def __init__(self, constellation, sat_idx, sun, model, umbra, j2):
+        self.args = (constellation, sat_idx, sun, model, umbra, j2)
+        self.sampler = OrbitSampler(constellation, sat_idx, j2=j2)
+        self.sun = sun
+        self.body_radius = heavenly_body_radius[constellation.focus.lower()]
+        self.model = model
+        self.umbra = umbra
+
+    def subset(self, mask):
+        constellation, sat_idx, sun, model, umbra, j2 = self.args
+        return _Boundary(constellation, sat_idx[mask], sun, model, umbra, j2)
+
+    def __call__(self, times):
+        return shadow_boundary(self.sampler.positions(times), self.sun(times), self.body_radius, self.model,
+                               self.umbra)
+
+
+def _boundary_rate(constellation, model):
+    """
+    Fastest each satellite's shadow_boundary can change, used to catch passages that fall between samples
+    """
+    a = constellation.true_alt
+    e = constellation.eccentricity
+    periapsis = a * (1 - e)
+    speed = np.sqrt(heavenly_body_mu[constellation.focus.lower()] * (1 + e) / periapsis)
+    if model == "cylindrical":
+        return speed + a * (1 + e) * sun_angular_rate
+    body_radius = heavenly_body_radius[constellation.focus.lower()]
+    # The separation turns no faster than the satellite's angular rate plus the Sun's; the body's apparent radius
+    # changes with the radial speed.
+    return speed / periapsis * (1 + body_radius / np.sqrt(np.maximum(periapsis ** 2 - body_radius ** 2, 1e-9))) + \
+        2 * sun_angular_rate
+
+
+def _shadow_intervals(constellation, coarse, sun, model, umbra, j2, tolerance, chunk_steps):
+    """
+    (satellite, start, end) of every interval in which shadow_boundary is negative
+    """
+    rate = _boundary_rate(constellation, model)
+    body_radius = heavenly_body_radius[constellation.focus.lower()]
+    crossing_sat, crossing_low, crossing_high, graze_sat, graze_low, graze_high = [], [], [], [], [], []
+    inside_start = previous = None
+    for chunk_start in range(0, len(coarse), chunk_steps):
+        chunk = coarse[max(chunk_start - 1, 0):chunk_start + chunk_steps]
+        values = shadow_boundary(propagate(constellation, chunk, j2=j2)[0], sun(chunk)[None, :, :], body_radius,
+                                 model, umbra)
+        if previous is None:
+            inside_start = np.flatnonzero(values[:, 0] < 0)
+        low, high = values[:, :-1], values[:, 1:]
+        sat, step = np.nonzero((low < 0) != (high < 0))
+        crossing_sat.append(sat)
+        crossing_low.append(chunk[step])
+        crossing_high.append(chunk[step + 1])
+        # Both ends outside, but close enough that the boundary could dip below zero in between.
+        gap = (chunk[1:] - chunk[:-1])[None, :]
+        sat, step = np.nonzero((low >= 0) & (high >= 0) & (low + high < rate[:, None] * gap))
+        graze_sat.append(sat)
+        graze_low.append(chunk[step])
+        graze_high.append(chunk[step + 1])
+        previous = values[:, -1]
+    inside_end = np.flatnonzero(previous < 0)
+
+    crossing_sat, crossing_low, crossing_high, graze_sat, graze_low, graze_high = [
+        np.concatenate(column) for column in (crossing_sat, crossing_low, crossing_high, graze_sat, graze_low,
+                                              graze_high)]
+    if len(graze_sat):
+        graze = _Boundary(constellation, graze_sat, sun, model, umbra, j2)
+        deepest, depth = _golden_section_max(lambda times: -graze(times), graze_low, graze_high, tolerance)
+        dips = depth > 0
+        graze_sat, graze_low, graze_high, deepest = graze_sat[dips], graze_low[dips], graze_high[dips], deepest[dips]
+        crossing_sat = np.concatenate([crossing_sat, graze_sat, graze_sat])
+        crossing_low = np.concatenate([crossing_low, graze_low, deepest])
+        crossing_high = np.concatenate([crossing_high, deepest, graze_high])
+
+    boundary = _Boundary(constellation, crossing_sat, sun, model, umbra, j2)
+    times = _find_crossing(boundary, crossing_low, crossing_high, tolerance)
+    entering = boundary(crossing_low) >= 0
+    # Passages alternate entry and exit, so sorting each kind by satellite then time pairs them up.
+    entry_sat = np.concatenate([inside_start, crossing_sat[entering]])
+    entry_time = np.concatenate([np.full(len(inside_start), coarse[0]), times[entering]])
+    exit_sat = np.concatenate([crossing_sat[~entering], inside_end])
+    exit_time = np.concatenate([times[~entering], np.full(len(inside_end), coarse[-1])])
+    entry = np.lexsort((entry_time, entry_sat))
+    exit_order = np.lexsort((exit_time, exit_sat))
+    return entry_sat[entry], entry_time[entry], exit_time[exit_order]
+
+
+def _umbra_passages(satellite, entry, exit_time, umbra, coarse, tolerance):
+    """
+    Places each umbra interval in the passage through the penumbra that contains it. The umbra lies inside the
+    penumbra, so an interval outside every passage means a root was not found to the tolerance; it is dropped rather
+    than given to a passage it doesn't belong to.
+    :param umbra: (satellite, start, end) of the umbra intervals, as from _shadow_intervals
+    :return: Tuple of (umbra start, umbra end) arrays aligned with the passages, NaN for passages without an umbra
+    """
+    umbra_sat, umbra_entry, umbra_exit = umbra
+    umbra_start = np.full(len(entry), np.nan)
+    umbra_end = np.full(len(entry), np.nan)
+    # Passages are sorted by satellite then time, so a search finds the last one starting before each umbra.
+    key = satellite * (coarse[-1] - coarse[0] + 1) + (entry - coarse[0])
+    umbra_key = umbra_sat * (coarse[-1] - coarse[0] + 1) + (umbra_entry - coarse[0])
+    passage = np.searchsorted(key, umbra_key + tolerance, side='right') - 1
+    found = np.flatnonzero(passage >= 0)
+    inside = found[(satellite[passage[found]] == umbra_sat[found]) &
+                   (umbra_exit[found] <= exit_time[passage[found]] + tolerance)]
+    # An umbra found in pieces is merged across its passage.
+    np.fmin.at(umbra_start, passage[inside], umbra_entry[inside])
+    np.fmax.at(umbra_end, passage[inside], umbra_exit[inside])
+    return umbra_start, umbra_end
+
+
+@timed("eclipses")
+def eclipses(scene, start, stop, step=60., model="cylindrical", epoch='2017-Jan-18 00:00:00', sun=None, j2=False,
+             tolerance=1e-3, chunk_steps=256):
+    """
+    Finds every passage of every satellite through the focus body's shadow. The shadow boundary is evaluated for all
+    satellites on a coarse time grid in array operations; sign changes bracket entries and exits, which are refined
+    with an Illinois root finder. Samples close enough to the boundary that a short passage could fall between them
+    are checked with a golden section search, so no passage is missed.
+    :param scene: List of constellations (ground stations are ignored), as returned by create_scene, or a
+                  ConstellationArray
+    :param start: Start of the search, in seconds since the element epoch
+    :param stop: End of the search, in seconds since the element epoch
+    :param step: Coarse sampling step in seconds. Each step may hold at most one entry or exit, so steps must be
+                 well under half the shortest orbital period.
+    :param model: 'cylindrical' or 'conical', see shadow_boundary
+    :param epoch: Element epoch as a datetime or in the PIGI epoch format, which fixes the Sun's direction
+    :param sun: Function from an array of times to Sun positions relative to the focus body in km, shaped
+                times.shape + (3,). Defaults to sun_position, which only describes the Sun as seen from Earth.
+    :param j2: Propagate with J2 secular drift
+    :param tolerance: Accuracy of the entry and exit times, in seconds
+    :param chunk_steps: Number of coarse steps propagated at once
+    :return: EclipseIntervals table
+    """
+    if model not in shadow_models:
+        raise ValueError("'" + str(model) + "' is not a supported shadow model")
+    if isinstance(scene, ConstellationArray):
+        constellation = scene
+    else:
+        constellation = ConstellationArray.from_scene(scene)
+    if sun is None:
+        if constellation.focus.lower() != "earth":
+            raise FocusError("The Sun's position is only built in for Earth; pass a sun function for other bodies")
+        epoch = _parse_epoch(epoch)
+        sun = lambda times: sun_position(times, epoch)
+    names = constellation.names
+    if not len(constellation):
+        return EclipseIntervals([], [], [], [], [], names, (start, stop))
+
+    coarse = np.arange(start, stop + step, step, dtype=np.float64)
+    coarse[-1] = stop
+    satellite, entry, exit_time = _shadow_intervals(constellation, coarse, sun, model, False, j2, tolerance,
+                                                    chunk_steps)
+    if model == "cylindrical":
+        umbra_start, umbra_end = entry, exit_time
+    else:
+        umbra = _shadow_intervals(constellation, coarse, sun, model, True, j2, tolerance, chunk_steps)
+        umbra_start, umbra_end = _umbra_passages(satellite, entry, exit_time, umbra, coarse, tolerance)
+    return EclipseIntervals(satellite, entry, exit_time, umbra_start, umbra_end, names, (start, stop))
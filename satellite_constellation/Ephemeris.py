@@ -0,0 +1,95 @@
+"""
+Parallel ephemeris generation. The satellite/time cube is split into blocks that worker processes propagate and write
+straight into a shared memory-mapped .npy file, so no states are pickled back to the parent.
+"""
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import timed
+from .Propagator import _propagate_any
+import multiprocessing
+import numpy as np
+import os
+import tempfile
+
+# Per-process state set up by _start_worker: the elements, times and output are sent once per worker, not per block.
+_worker = {}
+
+
+def ephemeris_blocks(num_sats, num_times, satellite_block=1024, time_block=1440):
+    """
+    Splits a (satellites, times) cube into blocks
+    :return: List of (satellite start, satellite stop, time start, time stop) tuples
+    """
+    return [(sat_start, min(sat_start + satellite_block, num_sats), time_start, min(time_start + time_block, num_times))
+            for sat_start in range(0, num_sats, satellite_block)
+            for time_start in range(0, num_times, time_block)]
+
+
+def _start_worker(constellation, times, path, j2, dtype):
+    _worker.clear()
+    _worker.update(constellation=constellation, times=times, cube=np.load(path, mmap_mode='r+'), j2=j2, dtype=dtype)
+
+
+def _fill_block(block):
+    sat_start, sat_stop, time_start, time_stop = block
+    cube = _worker["cube"]
+    # Blocks go straight to the file, so they bypass any ResultCache rather than filling its memory in each worker.
+    positions, velocities = _propagate_any(_worker["constellation"][sat_start:sat_stop],
+                                           _worker["times"][time_start:time_stop], _worker["j2"], _worker["dtype"], 64,
+                                           None)
+    cube[sat_start:sat_stop, time_start:time_stop, :3] = positions
+    cube[sat_start:sat_stop, time_start:time_stop, 3:] = velocities
+    return block
+
+
+@timed("write_ephemeris")
+def write_ephemeris(scene, times, path=None, j2=False, dtype=np.float64, processes=None, satellite_block=1024,
+                    time_block=1440):
+    """
+    Propagates every satellite of a scene into a memory-mapped .npy file, in parallel over satellite and time blocks.
+    Each block is propagated the same way whichever process runs it, so the file is identical for any number of
+    processes given the same block sizes.
+    :param scene: List of constellations, satellites and ground stations, as returned by create_scene, or a
+                  ConstellationArray
+    :param times: Array of times in seconds since the element epoch
+    :param path: .npy file to write, created or overwritten. None writes a temporary file that the caller should
+                 remove once done with it.
+    :param j2: Propagate with J2 secular drift
+    :param dtype: Floating point type of the stored states
+    :param processes: Number of worker processes, defaults to the number of CPUs. 1 propagates in this process.
+    :param satellite_block: Number of satellites in a block
+    :param time_block: Number of time steps in a block
+    :return: Read-only memory map of the states, shaped (satellites, times, 6) as position then velocity in km and
+             km/s, the layout save_scene stores
+    """
+    if isinstance(scene, ConstellationArray):
+        constellation = scene
+    else:
+        constellation = ConstellationArray.from_scene(scene)
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix=".npy")
+        os.close(handle)
+    cube = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(len(constellation), len(times), 6))
+    del cube
+
+    blocks = ephemeris_blocks(len(constellation), len(times), satellite_block, time_block)
+    processes = min(processes or os.cpu_count() or 1, len(blocks))
+    settings = (constellation, times, path, j2, dtype)
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, initializer=_start_worker, initargs=settings)
+        try:
+            for _ in pool.imap_unordered(_fill_block, blocks):
+                pass
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        _start_worker(*settings)
+        try:
+            for block in blocks:
+                _fill_block(block)
+            _worker["cube"].flush()
+        finally:
+            _worker.clear()
+    return np.load(path, mmap_mode='r')
@@ -1,13 +1,60 @@
+from math import cos, radians, sin
+from .utils import heavenly_body_radius, CompiledTemplate
+import numpy as np
 import warnings
 
 
+ground_station_xml_template = '\t\t<Entity Type="GroundStation" Name="{0}">\n' \
+                              '\t\t\t<PropertySection Name="UserProperties">\n' \
+                              '\t\t\t\t<FloatPropertyValue name="Latitude" value="{1}"/>\n' \
+                              '\t\t\t\t<FloatPropertyValue name="Longitude" value="{2}"/>\n' \
+                              '\t\t\t\t<FloatPropertyValue name="Elevation" value="{3}"/>\n' \
+                              '\t\t\t\t<FloatPropertyValue name="BeamWidth" value="{4}"/>\n' \
+                              '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t\t<PropertySection Name="Animation">\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Position" value="[6339.69, -699.193, 0]"/>\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Scale" value="[1, 1, 1]"/>\n' \
+                              '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t\t<PropertySection Name="Time Input">\n' \
+                              '\t\t\t\t<TimestampPropertyValue name="Timepoint" ' \
+                              'value="2016-May-07 08:32:21.059611"/>\n' \
+                              '\t\t\t\t<DurationPropertyValue name="Duration" value="2"/>\n' \
+                              '\t\t\t\t<DurationPropertyValue name="StartOffset" value="-1"/>\n' \
+                              '\t\t\t\t<DurationPropertyValue name="Timestep" value="0.000694444"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t\t<PropertySection Name="Favourite">\n' \
+                              '\t\t\t\t<EnumPropertyValue name="favourite" value="0"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t\t<PropertySection Name="Mesh">\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="Scale" value="[500, 500, 500]"/>\n' \
+                              '\t\t\t\t<StringPropertyValue name="name" value="GroundStation.mesh"/>\n' \
+                              '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
+                              '\t\t\t\t<StringPropertyValue name="group" value="SolarSystem"/>\n' \
+                              '\t\t\t\t<EnumPropertyValue name="visibility" value="0"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t\t<PropertySection Name="Look Angles">\n' \
+                              '\t\t\t\t<ArrayPropertyValue name="LatLon" value="[0, 0]"/>\n' \
+                              '\t\t\t\t<FloatPropertyValue name="Elevation" value="0"/>\n' \
+                              '\t\t\t</PropertySection>\n' \
+                              '\t\t</Entity>\n'
+ground_station_xml = CompiledTemplate(ground_station_xml_template)
+
+
 class GroundStation(object):
+    __slots__ = ('__name', '__lat', '__long', '__elevation', '__beam', '__ecef')
+
     def __init__(self, name, lat, long, elevation, beam_width):
         self.__name = name
         self.__lat = lat
         self.__long = long
         self.__elevation = elevation
         self.__beam = beam_width
+        self.__ecef = None
 
     @property
     def name(self):
@@ -27,6 +74,7 @@ class GroundStation(object):
             return ValueError("Latitude must be between -90 and 90")
         else:
             self.__lat = new_lat
+            self.__ecef = None
 
     @property
     def long(self):
@@ -38,6 +86,7 @@ class GroundStation(object):
             return ValueError("Longitude must be between -180 and 180")
         else:
             self.__long = new_long
+            self.__ecef = None
 
     @property
     def elevation(self):
@@ -51,6 +100,7 @@ class GroundStation(object):
             return ValueError("Elevation must be on the ground")
         else:
             self.__elevation = new_elev
+            self.__ecef = None
 
     @property
     def beam(self):
@@ -62,45 +112,25 @@ class GroundStation(object):
             return ValueError("Beam width must be between 0 and 180 degrees")
         self.__beam = new_beam
 
+    @property
+    def ecef(self):
+        """
+        Earth-fixed position in km on a spherical Earth, with the elevation in metres
+        """
+        if self.__ecef is None:
+            lat, long = radians(self.__lat), radians(self.__long)
+            radius = heavenly_body_radius["earth"] + self.__elevation / 1000
+            ecef = np.array([radius * cos(lat) * cos(long), radius * cos(lat) * sin(long), radius * sin(lat)])
+            ecef.flags.writeable = False
+            self.__ecef = ecef
+        return self.__ecef
+
     def as_xml(self):
         warnings.warn("XML support is depreciated and not supported from PIGI 0.8.5 onward", DeprecationWarning)
-        return '\t\t<Entity Type="GroundStation" Name="{0}">\n' \
-               '\t\t\t<PropertySection Name="UserProperties">\n' \
-               '\t\t\t\t<FloatPropertyValue name="Latitude" value="{1}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Longitude" value="{2}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Elevation" value="{3}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="BeamWidth" value="{4}"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Animation">\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Position" value="[6339.69, -699.193, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Scale" value="[1, 1, 1]"/>\n' \
-               '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Time Input">\n' \
-               '\t\t\t\t<TimestampPropertyValue name="Timepoint" value="2016-May-07 08:32:21.059611"/>\n' \
-               '\t\t\t\t<DurationPropertyValue name="Duration" value="2"/>\n' \
-               '\t\t\t\t<DurationPropertyValue name="StartOffset" value="-1"/>\n' \
-               '\t\t\t\t<DurationPropertyValue name="Timestep" value="0.000694444"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Favourite">\n' \
-               '\t\t\t\t<EnumPropertyValue name="favourite" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Mesh">\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Scale" value="[500, 500, 500]"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="name" value="GroundStation.mesh"/>\n' \
-               '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="group" value="SolarSystem"/>\n' \
-               '\t\t\t\t<EnumPropertyValue name="visibility" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Look Angles">\n' \
-               '\t\t\t\t<ArrayPropertyValue name="LatLon" value="[0, 0]"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Elevation" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t</Entity>\n'.format(self.name, self.lat, self.long, self.elevation, self.beam)
+        return self.pigi_output()
+
+    def pigi_output(self):
+        return ground_station_xml.render(self.name, self.lat, self.long, self.elevation, self.beam)
 
     def __repr__(self):
         return "{0}, {1}, {2}, {3}, {4}".format(self.name, self.lat, self.long, self.elevation, self.beam)
@@ -0,0 +1,139 @@
+"""
+Sub-satellite ground tracks, generated a run of timesteps at a time and split where they cross the antimeridian.
+"""
+from .Access import body_to_inertial
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import span
+from .Propagator import propagate
+from .utils import heavenly_body_radius, heavenly_body_rotation
+import numpy as np
+
+
+def sub_satellite_points(positions, times, focus="earth"):
+    """
+    Latitude, longitude and altitude of the points below satellites on a spherical, rotating focus body
+    :param positions: Inertial positions shaped (satellites, times, 3) in km, as returned by propagate
+    :param times: Array of times in seconds since the element epoch, one per position along the second axis
+    :param focus: The focus body the satellites orbit
+    :return: Tuple of (lat, long, alt) arrays shaped (satellites, times); angles in degrees with longitudes in
+             [-180, 180], altitudes in km above the body's mean radius
+    """
+    body_fixed = body_to_inertial(positions, -np.asarray(times, dtype=np.float64)[None, :], focus)
+    radius = np.linalg.norm(body_fixed, axis=-1)
+    lat = np.degrees(np.arcsin(body_fixed[..., 2] / radius))
+    long = np.degrees(np.arctan2(body_fixed[..., 1], body_fixed[..., 0]))
+    return lat, long, radius - heavenly_body_radius[focus.lower()]
+
+
+class GroundTrackChunk(object):
+    """
+    Ground tracks of every satellite over one run of timesteps. lat, long and alt are shaped (satellites, times).
+    prograde says, per satellite or for all of them, whether the orbit is prograde (inclination up to 90 degrees).
+    """
+
+    def __init__(self, names, times, lat, long, alt, prograde=True, focus="earth"):
+        self.names = names
+        self.times = times
+        self.lat = lat
+        self.long = long
+        self.alt = alt
+        self.prograde = prograde
+        self.focus = focus
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return "GroundTrackChunk({0} satellites, {1} steps)".format(len(self.names), len(self.times))
+
+    def unwrapped_steps(self):
+        """
+        Change in longitude over each step in the direction the satellite actually moved. Right ascension only ever
+        increases along a prograde orbit and decreases along a retrograde one, so it is unwrapped that way and the
+        body's rotation taken off. Near the poles the longitude swings by up to 180 degrees in a step, and the
+        shortest way round is often the wrong way.
+        :return: Array shaped (satellites, times - 1) in degrees
+        """
+        rotation = np.degrees(heavenly_body_rotation[self.focus.lower()]) * np.diff(self.times)
+        right_ascension = np.diff(self.long, axis=1) + rotation
+        right_ascension = np.where(np.broadcast_to(np.asarray(self.prograde)[..., None], right_ascension.shape),
+                                   np.mod(right_ascension, 360), -np.mod(-right_ascension, 360))
+        return right_ascension - rotation
+
+    def crossings(self):
+        """
+        Where tracks cross the antimeridian: the unwrapped longitude passes +-180 degrees between neighbouring steps
+        :return: Tuple of (satellite, step) arrays, the crossing lying between step and step + 1
+        """
+        return np.nonzero(np.abs(self.long[:, :-1] + self.unwrapped_steps()) > 180)
+
+    def lines(self):
+        """
+        Every track as polylines that don't cross the antimeridian, in one flat layout. A crossing ends one line at
+        +-180 degrees and starts the next at the opposite edge, with latitude and altitude interpolated there.
+        :return: Tuple of (lat, long, alt, offsets, satellite). Line k is points offsets[k] to offsets[k + 1] of the
+                 flat coordinate arrays and belongs to satellite[k].
+        """
+        num_sats, num_steps = self.long.shape
+        steps = self.unwrapped_steps()
+        sat, step = np.nonzero(np.abs(self.long[:, :-1] + steps) > 180)
+        before, after = (sat, step), (sat, step + 1)
+        edge = 180 * np.sign(steps[before])
+        # Fraction of the way to the next step at which the unwrapped track reaches the edge.
+        fraction = (edge - self.long[before]) / steps[before]
+        lat = self.lat[before] + fraction * (self.lat[after] - self.lat[before])
+        alt = self.alt[before] + fraction * (self.alt[after] - self.alt[before])
+
+        # Each crossing inserts the end of one line and the start of the next before the step after it.
+        position = np.repeat(sat * num_steps + step + 1, 2)
+        flat_lat = np.insert(self.lat.ravel(), position, np.repeat(lat, 2))
+        flat_long = np.insert(self.long.ravel(), position, np.stack([edge, -edge], axis=1).ravel())
+        flat_alt = np.insert(self.alt.ravel(), position, np.repeat(alt, 2))
+
+        track_start = np.arange(num_sats) * num_steps
+        track_start = track_start + 2 * np.searchsorted(sat, np.arange(num_sats))
+        crossing_start = sat * num_steps + step + 1 + 2 * np.arange(len(sat)) + 1
+        starts = np.concatenate([track_start, crossing_start])
+        owners = np.concatenate([np.arange(num_sats), sat])
+        order = np.argsort(starts, kind='mergesort')
+        offsets = np.append(starts[order], len(flat_long))
+        return flat_lat, flat_long, flat_alt, offsets, owners[order]
+
+    def segments(self):
+        """
+        Yields (satellite index, lat, long, alt) for each polyline of lines(), in satellite then time order
+        """
+        lat, long, alt, offsets, satellite = self.lines()
+        for line, sat in enumerate(satellite.tolist()):
+            points = slice(offsets[line], offsets[line + 1])
+            yield sat, lat[points], long[points], alt[points]
+
+
+def ground_tracks(scene, start, stop, step=60., chunk_steps=128, j2=False):
+    """
+    Generates the ground tracks of every satellite in a scene chunk by chunk, so memory is bounded by the number of
+    satellites times chunk_steps however long the span is. Each chunk is computed only when asked for. Chunks after
+    the first repeat the previous chunk's last step, so their lines join up.
+    :param scene: List of constellations (ground stations are ignored), as returned by create_scene, or a
+                  ConstellationArray
+    :param start: Start time in seconds since the element epoch
+    :param stop: End time in seconds since the element epoch
+    :param step: Time step in seconds. Crossings are found from the unwrapped longitude, so steps must be shorter
+                 than half an orbit.
+    :param chunk_steps: Number of new timesteps per chunk
+    :param j2: Propagate with J2 secular drift
+    :return: Generator of GroundTrackChunk
+    """
+    if isinstance(scene, ConstellationArray):
+        constellation = scene
+    else:
+        constellation = ConstellationArray.from_scene(scene)
+    focus = constellation.focus.lower()
+    prograde = constellation.inclination <= 90
+    times = np.arange(start, stop + step / 2, step, dtype=np.float64)
+    for chunk_start in range(0, len(times), chunk_steps):
+        chunk = times[max(chunk_start - 1, 0):chunk_start + chunk_steps]
+        with span("ground_tracks.chunk"):
+            positions = propagate(constellation, chunk, j2=j2)[0]
+            lat, long, alt = sub_satellite_points(positions, chunk, focus)
+        yield GroundTrackChunk(constellation.names, chunk, lat, long, alt, prograde, focus)
@@ -0,0 +1,162 @@
+"""
+Opt-in timing spans and counters for the scene pipeline. While nothing is listening every instrumented call costs a
+single flag check, so the hooks are left in place in production.
+"""
+from functools import wraps
+import threading
+import time
+
+_local = threading.local()
+_lock = threading.Lock()
+_callbacks = []
+_listeners = 0
+# True while any profile is open or a callback is registered; read unlocked on the hot path.
+_active = False
+
+
+def _update_active():
+    global _active
+    _active = _listeners > 0 or bool(_callbacks)
+
+
+def _profiles():
+    if not hasattr(_local, 'profiles'):
+        _local.profiles = []
+    return _local.profiles
+
+
+def is_active():
+    return _active
+
+
+def register_callback(callback):
+    """
+    Forwards every span and counter to callback(kind, name, value), where kind is 'span' with the duration in seconds
+    or 'counter' with the increment. Callbacks run in the thread that did the work.
+    """
+    with _lock:
+        _callbacks.append(callback)
+        _update_active()
+    return callback
+
+
+def unregister_callback(callback):
+    with _lock:
+        _callbacks.remove(callback)
+        _update_active()
+
+
+def _emit(kind, name, value):
+    for profile in _profiles():
+        profile.record(kind, name, value)
+    for callback in list(_callbacks):
+        callback(kind, name, value)
+
+
+def count(name, value=1):
+    """
+    Adds value to a named counter
+    """
+    if _active:
+        _emit('counter', name, value)
+
+
+class _Span(object):
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _emit('span', self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name):
+    """
+    Context manager timing the enclosed block under name
+    """
+    return _Span(name) if _active else _null_span
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function under name
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profile(object):
+    """
+    Collects the spans and counters emitted by the current thread while it is open
+
+        with Profile() as profile:
+            create_scene(...)
+        print(profile)
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+
+    def __enter__(self):
+        global _listeners
+        _profiles().append(self)
+        with _lock:
+            _listeners += 1
+            _update_active()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _listeners
+        _profiles().remove(self)
+        with _lock:
+            _listeners -= 1
+            _update_active()
+        return False
+
+    def record(self, kind, name, value):
+        if kind == 'span':
+            stats = self.spans.setdefault(name, {"Calls": 0, "Total": 0., "Max": 0.})
+            stats["Calls"] += 1
+            stats["Total"] += value
+            stats["Max"] = max(stats["Max"], value)
+        else:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {"Spans": self.spans, "Counters": self.counters}
+
+    def __repr__(self):
+        return "Profile({0} spans, {1} counters)".format(len(self.spans), len(self.counters))
+
+    def __str__(self):
+        lines = ["{0:<40} {1:>8} {2:>12} {3:>12}".format("span", "calls", "total [ms]", "max [ms]")]
+        for name, stats in sorted(self.spans.items(), key=lambda item: -item[1]["Total"]):
+            lines.append("{0:<40} {1:>8} {2:>12.3f} {3:>12.3f}".format(name, stats["Calls"], stats["Total"] * 1e3,
+                                                                     stats["Max"] * 1e3))
+        for name, value in sorted(self.counters.items()):
+            lines.append("{0:<40} {1:>8}".format(name, value))
+        return "\n".join(lines)
@@ -0,0 +1,137 @@
+"""
+Inter-satellite link topology over time, as sparse adjacency snapshots with the links added and dropped at each step.
+"""
+from .Conjunction import close_pairs
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import span
+from .Propagator import propagate
+from .utils import heavenly_body_radius
+import numpy as np
+
+
+def line_of_sight(first, second, radius):
+    """
+    Whether the straight lines between pairs of points stay further than radius from the centre of the focus body
+    :param first: Array shaped (..., 3) in km
+    :param second: Array shaped like first
+    :param radius: Radius the lines must clear, in km
+    """
+    direction = second - first
+    with np.errstate(invalid='ignore', divide='ignore'):
+        along = -np.sum(first * direction, axis=-1) / np.sum(direction * direction, axis=-1)
+    along = np.clip(np.nan_to_num(along), 0, 1)
+    closest = first + along[..., None] * direction
+    return np.sum(closest * closest, axis=-1) > radius * radius
+
+
+class LinkSnapshot(object):
+    """
+    Feasible links at one time step. The adjacency is held in CSR form: the neighbours of satellite k are
+    indices[indptr[k]:indptr[k + 1]], at the distances in km in the same slots of distance. Links are undirected and
+    appear in both satellites' rows. added and dropped hold the links, as (links, 2) satellite index pairs with the
+    lower index first, that differ from the previous snapshot; the first snapshot adds every link.
+    """
+
+    def __init__(self, time, names, indptr, indices, distance, added, dropped):
+        self.time = time
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.distance = distance
+        self.added = added
+        self.dropped = dropped
+
+    @property
+    def num_links(self):
+        return len(self.indices) // 2
+
+    @property
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def __repr__(self):
+        return "LinkSnapshot(t={0}, {1} links, +{2} -{3})".format(self.time, self.num_links, len(self.added),
+                                                                  len(self.dropped))
+
+    def neighbours(self, satellite):
+        """
+        Indices of the satellites linked to one satellite, given by index or name
+        """
+        if not isinstance(satellite, (int, np.integer)):
+            satellite = self.names.index(satellite)
+        return self.indices[self.indptr[satellite]:self.indptr[satellite + 1]]
+
+    def edges(self):
+        """
+        Every link once, as (first, second) index arrays with first < second
+        """
+        rows = np.repeat(np.arange(len(self.indptr) - 1), self.degree)
+        upper = rows < self.indices
+        return rows[upper], self.indices[upper]
+
+    def as_dict(self):
+        """
+        The changes since the previous snapshot, by satellite name
+        """
+        return {"Time": self.time,
+                "Added": [[self.names[first], self.names[second]] for first, second in self.added.tolist()],
+                "Dropped": [[self.names[first], self.names[second]] for first, second in self.dropped.tolist()]}
+
+
+def _adjacency(first, second, distance, num_sats):
+    rows = np.concatenate([first, second])
+    columns = np.concatenate([second, first])
+    order = np.lexsort((columns, rows))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=num_sats))])
+    return indptr, columns[order], np.concatenate([distance, distance])[order]
+
+
+def _pairs(keys, num_sats):
+    return np.stack(np.divmod(keys, num_sats), axis=-1).reshape(-1, 2)
+
+
+def link_topology(scene, start, stop, step=60., max_range=5000., grazing_altitude=0., j2=False, chunk_steps=64):
+    """
+    Generates the inter-satellite link graph of a scene at each time step. Candidate links are found with a spatial
+    hash of cells max_range wide, so each step costs O(N log N) plus the number of links rather than a check of every
+    pair, and are kept when the line between the satellites clears the focus body.
+    :param scene: List of constellations (ground stations are ignored), as returned by create_scene, or a
+                  ConstellationArray
+    :param start: Start time in seconds since the element epoch
+    :param stop: End time in seconds since the element epoch
+    :param step: Time step in seconds
+    :param max_range: Longest link in km
+    :param grazing_altitude: Height above the focus body's mean radius that a link must clear, in km, e.g. to keep
+                             out of the atmosphere
+    :param j2: Propagate with J2 secular drift
+    :param chunk_steps: Number of steps propagated at once
+    :return: Generator of LinkSnapshot, one per time step
+    """
+    if isinstance(scene, ConstellationArray):
+        constellation = scene
+    else:
+        constellation = ConstellationArray.from_scene(scene)
+    num_sats = len(constellation)
+    clearance = heavenly_body_radius[constellation.focus.lower()] + grazing_altitude
+    times = np.arange(start, stop + step / 2, step, dtype=np.float64)
+    previous = np.zeros(0, dtype=np.int64)
+    for chunk_start in range(0, len(times), chunk_steps):
+        chunk = times[chunk_start:chunk_start + chunk_steps]
+        positions = propagate(constellation, chunk, j2=j2)[0]
+        for idx, time in enumerate(chunk.tolist()):
+            with span("link_topology.step"):
+                step_positions = positions[:, idx]
+                first, second = close_pairs(step_positions, max_range)
+                first_position, second_position = step_positions[first], step_positions[second]
+                visible = line_of_sight(first_position, second_position, clearance)
+                first, second = first[visible], second[visible]
+                distance = np.linalg.norm(first_position[visible] - second_position[visible], axis=-1)
+                keys = first * num_sats + second
+                order = np.argsort(keys, kind='mergesort')
+                keys, first, second, distance = keys[order], first[order], second[order], distance[order]
+                added = np.setdiff1d(keys, previous, assume_unique=True)
+                dropped = np.setdiff1d(previous, keys, assume_unique=True)
+                previous = keys
+                indptr, indices, link_distance = _adjacency(first, second, distance, num_sats)
+            yield LinkSnapshot(time, constellation.names, indptr, indices, link_distance, _pairs(added, num_sats),
+                               _pairs(dropped, num_sats))
@@ -0,0 +1,482 @@
+"""
+Vectorised two-body and J2 secular propagation of every satellite in a scene, with a shortcut for symmetric shells.
+"""
+from .Cache import cache_key, resolve_cache
+from .ConstellationArray import ConstellationArray
+from .Instrumentation import timed
+from .utils import heavenly_body_mu, heavenly_body_radius, heavenly_body_j2
+import numpy as np
+
+
+def solve_kepler(mean_anomaly, eccentricity, tolerance=1e-12, max_iterations=30):
+    """
+    Solves Kepler's equation M = E - e sin(E) for the eccentric anomaly with a batched Newton iteration
+    :param mean_anomaly: Array of mean anomalies in radians
+    :param eccentricity: Array of eccentricities, broadcastable against mean_anomaly
+    :param tolerance: Largest allowed change in E on the final iteration, in radians
+    :param max_iterations: Iteration cap, reached only for near-parabolic orbits
+    :return: Array of eccentric anomalies in radians, shaped like mean_anomaly
+    """
+    mean_anomaly = np.asarray(mean_anomaly, dtype=np.float64)
+    eccentricity = np.broadcast_to(np.asarray(eccentricity, dtype=np.float64), mean_anomaly.shape)
+    eccentric = mean_anomaly.copy()
+
+    # Circular orbits are already solved; only iterate the elliptical entries.
+    elliptical = eccentricity > 0
+    if not elliptical.any():
+        return eccentric
+    if elliptical.all():
+        m, e = mean_anomaly, eccentricity
+    else:
+        m, e = mean_anomaly[elliptical], eccentricity[elliptical]
+
+    estimate = m + e * np.sin(m)
+    for _ in range(max_iterations):
+        step = (estimate - e * np.sin(estimate) - m) / (1 - e * np.cos(estimate))
+        estimate -= step
+        if np.abs(step).max() < tolerance:
+            break
+
+    if elliptical.all():
+        return estimate
+    eccentric[elliptical] = estimate
+    return eccentric
+
+
+def kepler_sin_cos(sin_m, cos_m, eccentricity, tolerance=1e-12, max_iterations=30):
+    """
+    Newton iteration on Kepler's equation that works on the offset E - M and carries sin(E) and cos(E) along with
+    it. Once the steps are small the sines are advanced with a short series rotation instead of fresh
+    transcendental calls.
+    :param sin_m: sin of the mean anomaly
+    :param cos_m: cos of the mean anomaly
+    :param eccentricity: Array of eccentricities, broadcastable against sin_m
+    :param tolerance: Largest allowed error in E, in radians
+    :param max_iterations: Iteration cap, reached only for near-parabolic orbits
+    :return: Tuple of (sin(E), cos(E))
+    """
+    largest_e = np.max(eccentricity)
+    if largest_e == 0:
+        return sin_m, cos_m
+
+    offset = 0
+    sin_e, cos_e = sin_m, cos_m
+    for _ in range(max_iterations):
+        step = (eccentricity * sin_e - offset) / (1 - eccentricity * cos_e)
+        offset = offset + step
+        largest_step = np.abs(step).max()
+        if largest_step < 0.1:
+            sin_e, cos_e = _rotate(sin_e, cos_e, step, largest_step)
+        else:
+            sin_offset, cos_offset = np.sin(offset), np.cos(offset)
+            sin_e, cos_e = sin_m * cos_offset + cos_m * sin_offset, cos_m * cos_offset - sin_m * sin_offset
+        # Newton converges quadratically, so the error left after this step is about e * step ** 2.
+        if largest_e * largest_step ** 2 < tolerance * (1 - largest_e):
+            break
+    return sin_e, cos_e
+
+
+def _rotate(sin_a, cos_a, step, largest_step):
+    """
+    sin and cos of (a + step) for |step| < 0.1 from the angle addition formulae and a truncated Taylor series
+    """
+    step2 = step * step
+    if largest_step < 1e-4:
+        sin_step = step * (1 - step2 / 6)
+        cos_step = 1 - step2 / 2
+    elif largest_step < 1e-2:
+        sin_step = step * (1 - step2 / 6 * (1 - step2 / 20))
+        cos_step = 1 - step2 / 2 * (1 - step2 / 12 * (1 - step2 / 30))
+    else:
+        sin_step = step * (1 - step2 / 6 * (1 - step2 / 20 * (1 - step2 / 42 * (1 - step2 / 72))))
+        cos_step = 1 - step2 / 2 * (1 - step2 / 12 * (1 - step2 / 30 * (1 - step2 / 56)))
+    return sin_a * cos_step + cos_a * sin_step, cos_a * cos_step - sin_a * sin_step
+
+
+def secular_rates(constellation, j2=False):
+    """
+    Rates of change of the mean anomaly, RAAN and argument of periapsis for every satellite
+    :param constellation: ConstellationArray of satellites
+    :param j2: Include the secular drift caused by the focus body's oblateness
+    :return: Tuple of (mean_anomaly_rate, raan_rate, perigee_rate) arrays in rad/s
+    """
+    focus = constellation.focus.lower()
+    a = constellation.true_alt
+    mean_motion = np.sqrt(heavenly_body_mu[focus] / a ** 3)
+    if not j2:
+        zeros = np.zeros_like(mean_motion)
+        return mean_motion, zeros, zeros
+
+    e = constellation.eccentricity
+    inclination = np.radians(constellation.inclination)
+    sin_inc2 = np.sin(inclination) ** 2
+    factor = 1.5 * heavenly_body_j2[focus] * (heavenly_body_radius[focus] / (a * (1 - e ** 2))) ** 2 * mean_motion
+    raan_rate = -factor * np.cos(inclination)
+    perigee_rate = factor * (2 - 2.5 * sin_inc2)
+    mean_anomaly_rate = mean_motion + factor * np.sqrt(1 - e ** 2) * (1 - 1.5 * sin_inc2)
+    return mean_anomaly_rate, raan_rate, perigee_rate
+
+
+class _AngleSeries(object):
+    """
+    sin and cos of (angle + rate * t) over a time grid. Satellites in a shell share their rates, so sin/cos of
+    (rate * t) is tabulated once per rate shared by several satellites and combined with each starting angle through
+    the angle addition formulae, leaving a few multiplies per satellite and time step. Satellites with a rate of their
+    own, as in most catalogs, gain nothing from a table and are evaluated directly a block at a time, so no table
+    grows with the number of satellites.
+    """
+
+    def __init__(self, angle, rate, times):
+        self.angle, self.rate, self.times = angle, rate, times
+        self.sin_start, self.cos_start = np.sin(angle), np.cos(angle)
+        rates, rate_idx, counts = np.unique(rate, return_inverse=True, return_counts=True)
+        self.constant = not rates.any()
+        tabulated = counts > 1
+        self.shared = tabulated[rate_idx]
+        self.row = (np.cumsum(tabulated) - 1)[rate_idx]
+        rate_angle = rates[tabulated][:, None] * times[None, :]
+        self.sin_rate, self.cos_rate = np.sin(rate_angle), np.cos(rate_angle)
+
+    def block(self, block):
+        sin_start, cos_start = self.sin_start[block, None], self.cos_start[block, None]
+        if self.constant:
+            return sin_start, cos_start
+        shared = self.shared[block]
+        if not shared.any():
+            angle = self.angle[block, None] + self.rate[block, None] * self.times[None, :]
+            return np.sin(angle), np.cos(angle)
+        if len(self.sin_rate) == 1:
+            sin_rate, cos_rate = self.sin_rate, self.cos_rate
+        else:
+            sin_rate, cos_rate = self.sin_rate[self.row[block]], self.cos_rate[self.row[block]]
+        sin_angle = sin_start * cos_rate + cos_start * sin_rate
+        cos_angle = cos_start * cos_rate - sin_start * sin_rate
+        if not shared.all():
+            own = ~shared
+            angle = self.angle[block][own, None] + self.rate[block][own, None] * self.times[None, :]
+            sin_angle[own], cos_angle[own] = np.sin(angle), np.cos(angle)
+        return sin_angle, cos_angle
+
+
+@timed("propagate")
+def propagate(constellation, times, j2=False, dtype=np.float64, block_size=64, cache=None, symmetric=None):
+    """
+    Propagates a column store of satellites to a set of times with two-body motion, optionally with J2 secular drift
+    :param constellation: ConstellationArray of satellites, angles in degrees with the anomaly as mean anomaly
+    :param times: Array of times in seconds since the element epoch
+    :param j2: Apply the secular RAAN regression, periapsis rotation and mean motion change caused by J2
+    :param dtype: Floating point type of the returned arrays
+    :param block_size: Number of satellites processed together, sized so temporaries stay in cache
+    :param cache: ResultCache to consult, defaults to the one set with set_default_cache. Cached arrays are read-only.
+    :param symmetric: Derive satellites from shared reference orbits with SymmetricEphemeris. None does so when there
+                      are at most a quarter as many references as satellites, as in Walker shells.
+    :return: Tuple of (positions, velocities) in the focus body's inertial frame, each shaped
+             (satellites, times, 3), in km and km/s
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    cache = resolve_cache(cache)
+    if cache is None:
+        return _propagate_any(constellation, times, j2, dtype, block_size, symmetric)
+    # Names don't affect the result, so only the elements go into the key. The symmetric path rounds differently.
+    key = cache_key("propagate", constellation.focus.lower(),
+                    [getattr(constellation, column) for column in constellation.columns], times, bool(j2),
+                    np.dtype(dtype).name, symmetric if symmetric is None else bool(symmetric))
+    return cache.get_or_compute(key, _propagate_any, constellation, times, j2, dtype, block_size, symmetric)
+
+
+def _propagate_any(constellation, times, j2, dtype, block_size, symmetric):
+    if symmetric is not False and len(constellation):
+        # Grouping is cheap; the reference trajectories are only worth building when they are shared enough.
+        references = orbit_references(constellation, j2)
+        if symmetric or 4 * (int(references[0].max()) + 1) <= len(constellation):
+            return SymmetricEphemeris(constellation, times, j2, references).expand(dtype, block_size)
+    return _propagate(constellation, times, j2, dtype, block_size)
+
+
+def _propagate(constellation, times, j2, dtype, block_size):
+    mu = heavenly_body_mu[constellation.focus.lower()]
+    num_sats = len(constellation)
+
+    a = constellation.true_alt
+    e = constellation.eccentricity
+    mean_anomaly_rate, raan_rate, perigee_rate = secular_rates(constellation, j2)
+    anomaly = _AngleSeries(np.radians(constellation.ta), mean_anomaly_rate, times)
+    drifting = j2 and (raan_rate.any() or perigee_rate.any())
+    if drifting:
+        raan = _AngleSeries(np.radians(constellation.right_ascension), raan_rate, times)
+        perigee = _AngleSeries(np.radians(constellation.perigee), perigee_rate, times)
+        sin_inc = np.sin(np.radians(constellation.inclination))
+        cos_inc = np.cos(np.radians(constellation.inclination))
+    else:
+        p_hat, q_hat = perifocal_axes(constellation)
+        axes = np.stack([p_hat, q_hat], axis=1).astype(dtype)
+
+    positions = np.empty((num_sats, len(times), 3), dtype=dtype)
+    velocities = np.empty((num_sats, len(times), 3), dtype=dtype)
+    planar = np.empty((min(block_size, num_sats), len(times), 2), dtype=dtype)
+    for start in range(0, num_sats, block_size):
+        block = slice(start, start + block_size)
+        size = len(range(*block.indices(num_sats)))
+        sin_m, cos_m = anomaly.block(block)
+        block_e = e[block, None]
+        sin_e, cos_e = kepler_sin_cos(sin_m, cos_m, block_e)
+        planar_position, planar_velocity = perifocal_state(sin_e, cos_e, a[block, None], block_e, mu)
+
+        if drifting:
+            sin_raan, cos_raan = raan.block(block)
+            sin_arg, cos_arg = perigee.block(block)
+            orientation = (sin_raan, cos_raan, sin_arg, cos_arg, sin_inc[block, None], cos_inc[block, None])
+            np.stack(_rotate_to_inertial(planar_position, *orientation), axis=-1, out=positions[block])
+            np.stack(_rotate_to_inertial(planar_velocity, *orientation), axis=-1, out=velocities[block])
+        else:
+            np.stack(planar_position, axis=-1, out=planar[:size])
+            np.matmul(planar[:size], axes[block], out=positions[block])
+            np.stack(planar_velocity, axis=-1, out=planar[:size])
+            np.matmul(planar[:size], axes[block], out=velocities[block])
+    return positions, velocities
+
+
+def _rotate_to_inertial(planar, sin_raan, cos_raan, sin_arg, cos_arg, sin_inc, cos_inc):
+    """
+    Rotates perifocal (x, y) components through the argument of periapsis, inclination and RAAN. Velocities are
+    rotated the same way; the frame's own drift is several orders of magnitude below the orbital speed.
+    """
+    x, y = planar
+    node_x = x * cos_arg - y * sin_arg
+    node_y = x * sin_arg + y * cos_arg
+    plane_y = node_y * cos_inc
+    return node_x * cos_raan - plane_y * sin_raan, node_x * sin_raan + plane_y * cos_raan, node_y * sin_inc
+
+
+def propagate_scene(scene, times, j2=False, dtype=np.float64, cache=None):
+    """
+    Propagates every satellite in a scene, as returned by create_scene, to a set of times
+    :param scene: List of constellations, satellites and ground stations
+    :param times: Array of times in seconds since the element epoch
+    :param j2: Apply J2 secular drift to the elements
+    :param dtype: Floating point type of the returned arrays
+    :param cache: ResultCache to consult, defaults to the one set with set_default_cache
+    :return: Tuple of (names, positions, velocities), the arrays shaped (satellites, times, 3) in km and km/s
+    """
+    constellation = ConstellationArray.from_scene(scene)
+    positions, velocities = propagate(constellation, times, j2=j2, dtype=dtype, cache=cache)
+    return constellation.names, positions, velocities
+
+
+def perifocal_axes(constellation):
+    """
+    Unit vectors towards periapsis (P) and 90 degrees ahead of it in the orbit plane (Q), in the inertial frame
+    :param constellation: ConstellationArray of satellites
+    :return: Tuple of (P, Q), each shaped (satellites, 3)
+    """
+    return rotation_axes(np.radians(constellation.right_ascension), np.radians(constellation.inclination),
+                         np.radians(constellation.perigee))
+
+
+def rotation_axes(raan, inclination, perigee):
+    """
+    Perifocal P and Q axes from angles in radians, broadcasting over any leading shape
+    """
+    cos_raan, sin_raan = np.cos(raan), np.sin(raan)
+    cos_inc, sin_inc = np.cos(inclination), np.sin(inclination)
+    cos_arg, sin_arg = np.cos(perigee), np.sin(perigee)
+    p_hat = np.stack([cos_raan * cos_arg - sin_raan * sin_arg * cos_inc,
+                      sin_raan * cos_arg + cos_raan * sin_arg * cos_inc,
+                      sin_arg * sin_inc], axis=-1)
+    q_hat = np.stack([-cos_raan * sin_arg - sin_raan * cos_arg * cos_inc,
+                      -sin_raan * sin_arg + cos_raan * cos_arg * cos_inc,
+                      cos_arg * sin_inc], axis=-1)
+    return p_hat, q_hat
+
+
+def perifocal_state(sin_e, cos_e, a, e, mu):
+    """
+    Position and velocity in the perifocal frame from the sine and cosine of the eccentric anomaly
+    :return: Tuple of ((x, y), (vx, vy)) in km and km/s
+    """
+    root = np.sqrt(1 - e ** 2)
+    speed = np.sqrt(mu * a) / (a * (1 - e * cos_e))
+    return (a * (cos_e - e), a * root * sin_e), (-speed * sin_e, speed * root * cos_e)
+
+
+class OrbitSampler(object):
+    """
+    Gathers the elements of chosen satellites once so they can be propagated repeatedly to different times, as root
+    finders and other refinement steps do.
+    """
+
+    def __init__(self, constellation, sat_idx, j2=False):
+        """
+
+        :param constellation: ConstellationArray of satellites
+        :param sat_idx: Array of satellite indices into the constellation, repeats allowed
+        :param j2: Apply J2 secular drift to the elements
+        """
+        sat_idx = np.asarray(sat_idx)
+        self.mu = heavenly_body_mu[constellation.focus.lower()]
+        self.j2 = j2
+        rates = secular_rates(constellation, j2)
+        self.mean_anomaly_rate, self.raan_rate, self.perigee_rate = (rate[sat_idx] for rate in rates)
+        self.a = constellation.true_alt[sat_idx]
+        self.e = constellation.eccentricity[sat_idx]
+        self.anomaly = np.radians(constellation.ta[sat_idx])
+        self.raan = np.radians(constellation.right_ascension[sat_idx])
+        self.inclination = np.radians(constellation.inclination[sat_idx])
+        self.perigee = np.radians(constellation.perigee[sat_idx])
+        if not j2:
+            self.p_hat, self.q_hat = rotation_axes(self.raan, self.inclination, self.perigee)
+
+    def state(self, times):
+        """
+        Positions and velocities at times broadcastable against the sampled satellites
+        :param times: Array of times in seconds since the element epoch
+        :return: Tuple of (positions, velocities), each with a trailing axis of 3, in km and km/s
+        """
+        times = np.asarray(times, dtype=np.float64)
+        eccentric = solve_kepler(self.anomaly + self.mean_anomaly_rate * times, self.e)
+        if self.j2:
+            p_hat, q_hat = rotation_axes(self.raan + self.raan_rate * times, self.inclination,
+                                         self.perigee + self.perigee_rate * times)
+        else:
+            p_hat, q_hat = self.p_hat, self.q_hat
+        (x, y), (vx, vy) = perifocal_state(np.sin(eccentric), np.cos(eccentric), self.a, self.e, self.mu)
+        return (x[..., None] * p_hat + y[..., None] * q_hat,
+                vx[..., None] * p_hat + vy[..., None] * q_hat)
+
+    def positions(self, times):
+        return self.state(times)[0]
+
+
+def propagate_pairs(constellation, sat_idx, times, j2=False):
+    """
+    Propagates individual satellites to individual times, pairing sat_idx[k] with times[k]
+    :param constellation: ConstellationArray of satellites
+    :param sat_idx: Array of satellite indices into the constellation
+    :param times: Array of times in seconds since the element epoch, broadcastable against sat_idx
+    :param j2: Apply J2 secular drift to the elements
+    :return: Tuple of (positions, velocities), each shaped sat_idx.shape + (3,), in km and km/s
+    """
+    sat_idx, times = np.broadcast_arrays(np.asarray(sat_idx), np.asarray(times, dtype=np.float64))
+    return OrbitSampler(constellation, sat_idx, j2=j2).state(times)
+
+
+def orbit_references(constellation, j2=False):
+    """
+    Groups satellites that can be derived from a shared reference orbit. Members share the semi-major axis and
+    eccentricity, and the inclination too when J2 drift is applied, since it sets the drift rates. Eccentric members
+    also share the mean anomaly, which fixes where they are along the orbit; in a Walker shell that gives one
+    reference per plane. For circular members the anomaly is an in-plane rotation, i.e. a time shift, so one
+    reference serves the whole shell. Satellites with perturbed elements get references of their own.
+    :param constellation: ConstellationArray of satellites
+    :param j2: Whether the members will be propagated with J2 drift
+    :return: Tuple of (reference, phase): for each satellite the index of its reference orbit, and the anomaly in
+             degrees that is folded into its orientation instead of being propagated
+    """
+    circular = constellation.eccentricity == 0
+    phase = np.where(circular, constellation.ta, 0)
+    keys = [constellation.true_alt, constellation.eccentricity, constellation.ta - phase]
+    if j2:
+        keys.append(constellation.inclination)
+    reference = np.unique(np.stack(keys, axis=-1), axis=0, return_inverse=True)[1].ravel()
+    return reference, phase
+
+
+class SymmetricEphemeris(object):
+    """
+    Positions and velocities of a constellation at a set of times, held as one in-plane trajectory per reference
+    orbit and an orientation per satellite. Memory grows with references times steps plus satellites rather than
+    satellites times steps, and any block of satellites and steps can be expanded on demand.
+    """
+
+    def __init__(self, constellation, times, j2=False, references=None):
+        """
+
+        :param constellation: ConstellationArray of satellites, angles in degrees with the anomaly as mean anomaly
+        :param times: Array of times in seconds since the element epoch
+        :param j2: Apply J2 secular drift to the elements
+        :param references: orbit_references of the constellation if already computed
+        """
+        self.times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        self.reference, phase = orbit_references(constellation, j2) if references is None else references
+        self.num_references = int(self.reference.max()) + 1 if len(self.reference) else 0
+        # The first member of each reference stands in for it.
+        first = np.zeros(self.num_references, dtype=np.int64)
+        first[self.reference[::-1]] = np.arange(len(self.reference))[::-1]
+
+        mean_anomaly_rate, raan_rate, perigee_rate = [rate[first] for rate in secular_rates(constellation, j2)]
+        a = constellation.true_alt[first, None]
+        e = constellation.eccentricity[first, None]
+        mean_anomaly = np.radians(constellation.ta[first] - phase[first])[:, None] + \
+            mean_anomaly_rate[:, None] * self.times[None, :]
+        eccentric = solve_kepler(mean_anomaly, e)
+        (x, y), (vx, vy) = perifocal_state(np.sin(eccentric), np.cos(eccentric), a, e,
+                                           heavenly_body_mu[constellation.focus.lower()])
+        # Periapsis drift is shared by a reference's members, so it is applied to the reference's in-plane motion.
+        if perigee_rate.any():
+            x, y = _turn(x, y, perigee_rate[:, None] * self.times[None, :])
+            vx, vy = _turn(vx, vy, perigee_rate[:, None] * self.times[None, :])
+        self.planar_position = np.stack([x, y], axis=-1)
+        self.planar_velocity = np.stack([vx, vy], axis=-1)
+        if raan_rate.any():
+            node_angle = raan_rate[:, None] * self.times[None, :]
+            self.node_cos, self.node_sin = np.cos(node_angle), np.sin(node_angle)
+        else:
+            self.node_cos = self.node_sin = None
+        self.axes = np.stack(rotation_axes(np.radians(constellation.right_ascension),
+                                           np.radians(constellation.inclination),
+                                           np.radians(constellation.perigee + phase)), axis=1)
+
+    def __len__(self):
+        return len(self.reference)
+
+    def __repr__(self):
+        return "SymmetricEphemeris({0} satellites, {1} references, {2} steps)".format(len(self), self.num_references,
+                                                                                     len(self.times))
+
+    def state(self, satellites=slice(None), steps=slice(None), out=None):
+        """
+        Expands the positions and velocities of some satellites at some steps
+        :param satellites: Slice or index array of satellites
+        :param steps: Slice or index array of time steps
+        :param out: Optional pair of arrays to write the positions and velocities into
+        :return: Tuple of (positions, velocities), each shaped (satellites, steps, 3), in km and km/s
+        """
+        reference = self.reference[satellites]
+        axes = self.axes[satellites]
+        if out is None:
+            out = (None, None)
+        states = []
+        for planar, vector in zip((self.planar_position, self.planar_velocity), out):
+            vector = np.matmul(planar[:, steps][reference], axes, out=vector)
+            if self.node_cos is not None:
+                cos_node, sin_node = self.node_cos[:, steps][reference], self.node_sin[:, steps][reference]
+                x, y = vector[..., 0].copy(), vector[..., 1]
+                vector[..., 0] = x * cos_node - y * sin_node
+                vector[..., 1] = x * sin_node + y * cos_node
+            states.append(vector)
+        return tuple(states)
+
+    def positions(self, satellites=slice(None), steps=slice(None)):
+        return self.state(satellites, steps)[0]
+
+    def velocities(self, satellites=slice(None), steps=slice(None)):
+        return self.state(satellites, steps)[1]
+
+    def expand(self, dtype=np.float64, block_size=64):
+        """
+        Every satellite at every step, in the layout propagate returns
+        """
+        positions = np.empty((len(self), len(self.times), 3), dtype=dtype)
+        velocities = np.empty((len(self), len(self.times), 3), dtype=dtype)
+        for start in range(0, len(self), block_size):
+            block = slice(start, start + block_size)
+            self.state(block, out=(positions[block], velocities[block]))
+        return positions, velocities
+
+
+def _turn(x, y, angle):
+    """
+    Rotates (x, y) components counterclockwise by angle in radians
+    """
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    return x * cos_angle - y * sin_angle, x * sin_angle + y * cos_angle
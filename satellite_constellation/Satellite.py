@@ -2,12 +2,62 @@
 A class for creating a satellite object, describing the characteristics of it.
 """
 
-from math import pi
-from .utils import heavenly_body_radius
+from math import cos, pi, sin, sqrt
+from .utils import heavenly_body_radius, heavenly_body_mu, CompiledTemplate
+import numpy as np
 import warnings
 
 
+satellite_xml_template = '\t\t< Entity Type = "Satellite" Name = "{0}" >\n' \
+                         '\t\t\t<PropertySection Name="UserProperties">\n' \
+                         '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="CatalogName" value="{0}"/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="MeshName" value="SaberBox.mesh"/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="BindingsFile" value=""/>\n' \
+                         '\t\t\t\t<IntPropertyValue name="ManualOrbitalElements" value="0"/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="AssemblyFile" value=""/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="SystemMapSourceId" value=""/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="ResourceGroup" value="Autodetect"/>\n' \
+                         '\t\t\t\t<StringPropertyValue name="MetricSourceIds" value=""/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="BeamWidth" value="{1}"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t\t<PropertySection Name="SGP4 Parameters">\n' \
+                         '\t\t\t\t<FloatPropertyValue name="B Star" value="-1.1606e-005"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="Eccentricity" value="{2}"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="RAAN" value="{3}"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="Semi-major axis" value="{4}"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="Arg. Perigee" value="{5}"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="Mean Anomaly" value="{6}"/>\n' \
+                         '\t\t\t\t<FloatPropertyValue name="Inclination" value="{7}"/>\n' \
+                         '\t\t\t\t<TimestampPropertyValue name="Epoch" value="{8}"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t\t<PropertySection Name="Fov">\n' \
+                         '\t\t\t\t<EnumPropertyValue name="Enabled" value="{9}"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t\t<PropertySection Name="TargetSceneNode">\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Scale" value="[200, 200, 200]"/>\n' \
+                         '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t\t<PropertySection Name="Billboard">\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
+                         '\t\t\t\t<ArrayPropertyValue name="Scale" value="[200, 200, 200]"/>\n' \
+                         '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t\t<PropertySection Name="Favourite">\n' \
+                         '\t\t\t\t<EnumPropertyValue name="favourite" value="0"/>\n' \
+                         '\t\t\t</PropertySection>\n' \
+                         '\t\t</Entity>\n'
+satellite_xml = CompiledTemplate(satellite_xml_template)
+
+
 class Satellite(object):
+    # Angles are stored once, in the unit they were given in, and converted on access. The last two slots cache
+    # derived quantities and are cleared by the setters they depend on.
+    __slots__ = ('_name', '_altitude', '_focus', '_true_alt', '_eccentricity', '_beam', '_rads', '_inclination',
+                 '_right_ascension', '_perigee', '_ta', '_mean_motion', '_rotation')
 
     def __init__(self, name, altitude, eccentricity, inclination, right_ascension, perigee, ta, beam,
                  focus="earth", rads=True):
@@ -17,19 +67,13 @@ class Satellite(object):
         self._true_alt = self.altitude + self.__get_radius()
         self._eccentricity = eccentricity
         self._beam = beam
-
-        if not rads:
-            self.inclination = inclination
-            self.right_ascension = right_ascension
-            self.perigee = perigee
-            self.ta = ta
-            self.inclination_r, self.right_ascension_r, self.perigee_r, self.ta_r = self.__convert_to_rads()
-        else:
-            self.inclination_r = inclination
-            self.right_ascension_r = right_ascension
-            self.perigee_r = perigee
-            self.ta_r = ta
-            self.inclination, self.right_ascension, self.perigee, self.ta = self.__convert_to_degs()
+        self._rads = rads
+        self._inclination = inclination
+        self._right_ascension = right_ascension
+        self._perigee = perigee
+        self._ta = ta
+        self._mean_motion = None
+        self._rotation = None
 
     @property
     def name(self):
@@ -50,6 +94,7 @@ class Satellite(object):
         else:
             self._altitude = new_alt
             self._true_alt = new_alt + self.__get_radius()
+            self._mean_motion = None
 
     @property
     def true_alt(self):
@@ -79,20 +124,129 @@ class Satellite(object):
         else:
             self._beam = new_beam
 
-    def __convert_to_rads(self, value=None):
-        to_rad = pi / 180
-        if value:
-            return value * to_rad
-        else:
-            return self.inclination * to_rad, self.right_ascension * to_rad, self.perigee * to_rad, self.ta * to_rad
+    def __get_angle(self, value, rads):
+        return self.__convert(value, self._rads, rads)
 
-    def __convert_to_degs(self, value=None):
-        to_deg = 180 / pi
-        if value:
-            return value * to_deg
-        else:
-            return self.inclination_r * to_deg, self.right_ascension_r * to_deg, self.perigee_r * to_deg, \
-                   self.ta_r * to_deg
+    def __set_angle(self, value, rads):
+        self._rotation = None
+        return self.__convert(value, rads, self._rads)
+
+    @staticmethod
+    def __convert(value, from_rads, to_rads):
+        if from_rads == to_rads:
+            return value
+        return value * (180 / pi) if from_rads else value * (pi / 180)
+
+    @property
+    def inclination(self):
+        return self.__get_angle(self._inclination, False)
+
+    @inclination.setter
+    def inclination(self, new_inclination):
+        self._inclination = self.__set_angle(new_inclination, False)
+
+    @property
+    def inclination_r(self):
+        return self.__get_angle(self._inclination, True)
+
+    @inclination_r.setter
+    def inclination_r(self, new_inclination):
+        self._inclination = self.__set_angle(new_inclination, True)
+
+    @property
+    def right_ascension(self):
+        return self.__get_angle(self._right_ascension, False)
+
+    @right_ascension.setter
+    def right_ascension(self, new_right_ascension):
+        self._right_ascension = self.__set_angle(new_right_ascension, False)
+
+    @property
+    def right_ascension_r(self):
+        return self.__get_angle(self._right_ascension, True)
+
+    @right_ascension_r.setter
+    def right_ascension_r(self, new_right_ascension):
+        self._right_ascension = self.__set_angle(new_right_ascension, True)
+
+    @property
+    def perigee(self):
+        return self.__get_angle(self._perigee, False)
+
+    @perigee.setter
+    def perigee(self, new_perigee):
+        self._perigee = self.__set_angle(new_perigee, False)
+
+    @property
+    def perigee_r(self):
+        return self.__get_angle(self._perigee, True)
+
+    @perigee_r.setter
+    def perigee_r(self, new_perigee):
+        self._perigee = self.__set_angle(new_perigee, True)
+
+    @property
+    def ta(self):
+        return self.__get_angle(self._ta, False)
+
+    @ta.setter
+    def ta(self, new_ta):
+        self._ta = self.__convert(new_ta, False, self._rads)
+
+    @property
+    def ta_r(self):
+        return self.__get_angle(self._ta, True)
+
+    @ta_r.setter
+    def ta_r(self, new_ta):
+        self._ta = self.__convert(new_ta, True, self._rads)
+
+    @property
+    def element_angles(self):
+        """
+        Inclination, right ascension, argument of periapsis and anomaly in degrees, the unit the propagator and
+        ConstellationArray use
+        """
+        angles = self._inclination, self._right_ascension, self._perigee, self._ta
+        if self._rads:
+            return tuple(np.degrees(angles).tolist())
+        return angles
+
+    @property
+    def mean_motion(self):
+        """
+        Two-body mean motion in radians per second
+        """
+        if self._mean_motion is None:
+            self._mean_motion = sqrt(heavenly_body_mu[self._focus.lower()] / self._true_alt ** 3)
+        return self._mean_motion
+
+    @property
+    def period(self):
+        """
+        Orbital period in seconds
+        """
+        return 2 * pi / self.mean_motion
+
+    @property
+    def rotation(self):
+        """
+        Matrix taking perifocal vectors to the focus body's inertial frame; its columns are the periapsis direction,
+        the in-plane normal to it and the orbit normal. Built from element_angles, so it matches the propagator.
+        """
+        if self._rotation is None:
+            inc, raan, arg = np.radians(self.element_angles[:3])
+            cos_raan, sin_raan = cos(raan), sin(raan)
+            cos_inc, sin_inc = cos(inc), sin(inc)
+            cos_arg, sin_arg = cos(arg), sin(arg)
+            rotation = np.array([[cos_raan * cos_arg - sin_raan * sin_arg * cos_inc,
+                                  -cos_raan * sin_arg - sin_raan * cos_arg * cos_inc, sin_raan * sin_inc],
+                                 [sin_raan * cos_arg + cos_raan * sin_arg * cos_inc,
+                                  -sin_raan * sin_arg + cos_raan * cos_arg * cos_inc, -cos_raan * sin_inc],
+                                 [sin_arg * sin_inc, cos_arg * sin_inc, cos_inc]])
+            rotation.flags.writeable = False
+            self._rotation = rotation
+        return self._rotation
 
     def __get_radius(self):
         return heavenly_body_radius[self._focus.lower()]
@@ -138,47 +292,11 @@ class Satellite(object):
 
     def as_xml(self, epoch_date='2017-Jan-18 00:00:00', fov=1):
         warnings.warn("XML support is depreciated and not supported from PIGI 0.8.5 onward", DeprecationWarning)
-        return '\t\t< Entity Type = "Satellite" Name = "{0}" >\n' \
-               '\t\t\t<PropertySection Name="UserProperties">\n' \
-               '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="CatalogName" value="{0}"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="MeshName" value="SaberBox.mesh"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="BindingsFile" value=""/>\n' \
-               '\t\t\t\t<IntPropertyValue name="ManualOrbitalElements" value="0"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="AssemblyFile" value=""/>\n' \
-               '\t\t\t\t<StringPropertyValue name="SystemMapSourceId" value=""/>\n' \
-               '\t\t\t\t<StringPropertyValue name="ResourceGroup" value="Autodetect"/>\n' \
-               '\t\t\t\t<StringPropertyValue name="MetricSourceIds" value=""/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="BeamWidth" value="{1}"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="SGP4 Parameters">\n' \
-               '\t\t\t\t<FloatPropertyValue name="B Star" value="-1.1606e-005"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Eccentricity" value="{2}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="RAAN" value="{3}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Semi-major axis" value="{4}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Arg. Perigee" value="{5}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Mean Anomaly" value="{6}"/>\n' \
-               '\t\t\t\t<FloatPropertyValue name="Inclination" value="{7}"/>\n' \
-               '\t\t\t\t<TimestampPropertyValue name="Epoch" value="{8}"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Fov">\n' \
-               '\t\t\t\t<EnumPropertyValue name="Enabled" value="{9}"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="TargetSceneNode">\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Scale" value="[200, 200, 200]"/>\n' \
-               '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Billboard">\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Position" value="[0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Orientation" value="[1, 0, 0, 0]"/>\n' \
-               '\t\t\t\t<ArrayPropertyValue name="Scale" value="[200, 200, 200]"/>\n' \
-               '\t\t\t\t<EnumPropertyValue name="Debug" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t\t<PropertySection Name="Favourite">\n' \
-               '\t\t\t\t<EnumPropertyValue name="favourite" value="0"/>\n' \
-               '\t\t\t</PropertySection>\n' \
-               '\t\t</Entity>\n'.format(self.name, self.beam, self.eccentricity, self.right_ascension_r,
-                                        self.true_alt, self.perigee_r, self.ta_r, self.inclination_r,
-                                        epoch_date, fov)
+        return self.pigi_output(epoch_date, fov)
+
+    def pigi_output(self, epoch_date='2017-Jan-18 00:00:00', fov=1, rads=True):
+        if rads:
+            return satellite_xml.render(self.name, self.beam, self.eccentricity, self.right_ascension_r,
+                                        self.true_alt, self.perigee_r, self.ta_r, self.inclination_r, epoch_date, fov)
+        return satellite_xml.render(self.name, self.beam, self.eccentricity, self.right_ascension, self.true_alt,
+                                    self.perigee, self.ta, self.inclination, epoch_date, fov)
@@ -0,0 +1,164 @@
+"""
+Editable scene container that tracks changed entities and exports only the difference since the last commit.
+"""
+from .Constellation import Constellation
+from .ConstellationArray import ConstellationArray
+from .GroundStation import GroundStation
+from .SceneSerializer import dumps
+
+station_parameters = ("lat", "long", "elevation", "beam")
+
+
+def _entity_dicts(entity):
+    """
+    as_dict of every satellite or ground station an entity contributes, keyed by name
+    """
+    if isinstance(entity, (Constellation, ConstellationArray)):
+        entities = entity.as_dict()
+        del entities['Type']
+        return entities
+    return {entity.name: entity.as_dict()}
+
+
+def _committed_names(entity):
+    """
+    Names an entity had at the last commit, i.e. its current names with uncommitted changes undone
+    """
+    if isinstance(entity, Constellation):
+        changes = entity.changes()
+        added = set(changes["Added"])
+        return [sat.name for slot, sat in enumerate(entity.satellites) if slot not in added] + \
+            [entity.satellite_name(slot) for slot in changes["Removed"]]
+    if isinstance(entity, ConstellationArray):
+        return list(entity.names)
+    return [entity.name]
+
+
+class Scene(object):
+    """
+    A list of constellations and ground stations, as returned by create_scene, that records edits. Scene can be
+    passed anywhere a scene list is accepted. diff only visits what changed, so live updates cost in proportion to
+    the edit rather than to the scene.
+    """
+
+    def __init__(self, entities=()):
+        self.entities = list(entities)
+        self.commit()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __getitem__(self, idx):
+        return self.entities[idx]
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __repr__(self):
+        return "Scene({0} entities)".format(len(self.entities))
+
+    def as_dict(self):
+        return [entity.as_dict() for entity in self.entities]
+
+    def append(self, entity):
+        self.entities.append(entity)
+        self.__added.add(id(entity))
+
+    def extend(self, entities):
+        for entity in entities:
+            self.append(entity)
+
+    def remove(self, entity):
+        """
+        Removes an entity; its names are reported as removed unless it was added since the last commit
+        """
+        self.entities.remove(entity)
+        if id(entity) in self.__added:
+            self.__added.discard(id(entity))
+        else:
+            self.__removed.extend(_committed_names(entity))
+        self.__modified.discard(id(entity))
+
+    def update(self, idx, **parameters):
+        """
+        Edits the entity at idx in place. Invalid parameters raise before anything changes.
+        :param idx: Index of the entity in the scene
+        :param parameters: Constellation.update parameters for a Constellation; lat, long, elevation and beam for
+                           a GroundStation. Later constellations with the same name are renumbered if a constellation
+                           grows into their names.
+        """
+        entity = self.entities[idx]
+        if isinstance(entity, Constellation):
+            entity.update(**parameters)
+            self.__make_room(idx)
+        elif isinstance(entity, GroundStation):
+            # The setters return their ValueError instead of raising it, so every value is tried on a copy first and
+            # nothing changes unless all of them are accepted.
+            trial = GroundStation(entity.name, entity.lat, entity.long, entity.elevation, entity.beam)
+            for key, value in parameters.items():
+                if key not in station_parameters:
+                    raise ValueError("'" + str(key) + "' can't be updated on a ground station")
+                error = getattr(GroundStation, key).fset(trial, value)
+                if error is not None:
+                    raise error
+            for key, value in parameters.items():
+                setattr(entity, key, value)
+            self.__modified.add(id(entity))
+        else:
+            raise TypeError("{0} entities can't be updated in place".format(type(entity).__name__))
+
+    def __make_room(self, idx):
+        """
+        Renumbers later constellations sharing a grown constellation's name, so no two satellites share a name. Each
+        renumbered constellation is reported as removed under its old names and added under its new ones.
+        """
+        grown = self.entities[idx]
+        next_free = grown.start_num + grown.num_sats
+        for entity in self.entities[idx + 1:]:
+            if not isinstance(entity, Constellation) or entity.constellation_name != grown.constellation_name or \
+                    entity.start_num < grown.start_num:
+                continue
+            if entity.start_num < next_free:
+                if id(entity) not in self.__added:
+                    self.__removed.extend(_committed_names(entity))
+                    self.__added.add(id(entity))
+                entity.renumber(next_free)
+            next_free = entity.start_num + entity.num_sats
+
+    @property
+    def has_changes(self):
+        return bool(self.__added or self.__removed or self.__modified) or \
+            any(entity.has_changes for entity in self.entities if isinstance(entity, Constellation))
+
+    def diff(self):
+        """
+        Satellites and ground stations added, removed and modified since the last commit, in the as_dict format
+        """
+        added = {}
+        removed = list(self.__removed)
+        modified = {}
+        for entity in self.entities:
+            if id(entity) in self.__added:
+                added.update(_entity_dicts(entity))
+            elif isinstance(entity, Constellation):
+                changes = entity.diff_dict()
+                added.update(changes["Added"])
+                removed.extend(changes["Removed"])
+                modified.update(changes["Modified"])
+            elif id(entity) in self.__modified:
+                modified.update(_entity_dicts(entity))
+        return {"Added": added, "Removed": removed, "Modified": modified, "Type": 'diff'}
+
+    def diff_json(self):
+        return dumps(self.diff())
+
+    def commit(self):
+        """
+        Marks the current state as sent, so the next diff starts from here
+        """
+        self.__added = set()
+        self.__removed = []
+        self.__modified = set()
+        for entity in self.entities:
+            if isinstance(entity, Constellation):
+                entity.clear_changes()
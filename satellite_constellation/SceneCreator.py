@@ -4,109 +4,35 @@ Recreation of the Octave SceneCreator script for use within Flask or other pytho
 """
 
 from .Constellation import Constellation
+from .ConstellationArray import ConstellationArray
 from .GroundStation import GroundStation
 from itertools import zip_longest
+from functools import partial
 import warnings
 from .utils import mod, heavenly_body_radius
+from .Walker import walker_raan_spread
+from .SceneWriter import iter_scene_xml
+from .Cache import cache_key, resolve_cache
+from .Instrumentation import count, timed
 from .ConstellationExceptions import *
 
 
-def scene_xml_generator(scene):
+@timed("scene_xml_generator")
+def scene_xml_generator(scene, cache=None):
     warnings.warn("XML support is depreciated and not supported from PIGI 0.8.5 onward", DeprecationWarning)
-    scene_start = '<Pigi>\n' \
-                  '\t<Entities>\n' \
-                  '\t\t<Entity Type="Planet" Name="Mercury">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Mercury"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="0.1"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="0.244"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Venus">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Venus"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="177"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="0.605"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Earth">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="23.4"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="0.6371"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Mars">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Mars"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="25"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="0.3371"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Jupiter">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Jupiter"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="3"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="6.99"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Saturn">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Saturn"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="27"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="6.033"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Neptune">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Neptune"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="30"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="2.46"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n' \
-                  '\t\t<Entity Type="Planet" Name="Pluto">\n' \
-                  '\t\t\t<PropertySection Name="UserProperties">\n' \
-                  '\t\t\t\t<StringPropertyValue name="PlanetName" value="Pluto"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="obliquity" value="120"/>\n' \
-                  '\t\t\t\t<FloatPropertyValue name="scale" value="0.186"/>\n' \
-                  '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
-                  '\t\t\t</PropertySection>\n' \
-                  '\t\t</Entity>\n'
-
-    scene_end = '\t</Entities>\n' \
-                '</Pigi>'
-
-    scene_xml = ""
-    for item in scene:
-        scene_xml += item.as_xml()
-
-    return "{0} {1} {2}".format(scene_start, scene_xml, scene_end)
+    cache = resolve_cache(cache)
+    if cache is None:
+        return "".join(iter_scene_xml(scene))
+    return cache.get_or_compute(cache_key("scene_xml", list(scene)), "".join, iter_scene_xml(scene))
 
 
-def constellation_creator(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination, altitude,
-                          eccentricity, constellation_beam_width, sat_name="Sat", focus="earth"):
+@timed("validate_constellations")
+def validate_constellations(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination,
+                            altitude, eccentricity, constellation_beam_width, focus="earth", pattern="delta"):
     """
-
-    :param num_constellations: Integer of the number of constellations that are for the scene
-    :param satellite_nums: List of numbers of satellites for each constellation
-    :param satellite_planes: List of number of planes of satellites for each constellation.
-    :param plane_phasing: The planar phases for their respective constellations
-    :param inclination: List of inclinations for constellations
-    :param altitude: List of altitudes for constellations
-    :param eccentricity: List of eccentricities for each constellation
-    :param constellation_beam_width: List of Beam widths for satellites in each constellation
-    :param sat_name: Root name for satellites, defaults to Sat
-    :param focus: The focus of the satellite, i.e. Earth, Luna, Mars, in lower case.
-    :return: Returns a list of constellations that have been formatted
+    Checks constellation parameters without building anything, raising the same errors as constellation_creator.
+    Parameters are as for constellation_creator.
     """
-
     if num_constellations < 1 or (num_constellations % 1):
         raise ConstellationNumberError("Invalid integer number of constellations")
 
@@ -141,16 +67,74 @@ def constellation_creator(num_constellations, satellite_nums, satellite_planes,
     if focus.lower() not in heavenly_body_radius:
         raise FocusError("'" + focus.capitalize() + "' not supported as a celestial body origin.")
 
+    if pattern not in walker_raan_spread:
+        raise ConstellationConfigurationError("'" + str(pattern) + "' is not a supported Walker pattern")
+
+
+@timed("constellation_creator")
+def constellation_creator(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination, altitude,
+                          eccentricity, constellation_beam_width, sat_name="Sat", focus="earth", array_backed=False,
+                          pattern="delta", lazy=False, cache=None):
+    """
+
+    :param num_constellations: Integer of the number of constellations that are for the scene
+    :param satellite_nums: List of numbers of satellites for each constellation
+    :param satellite_planes: List of number of planes of satellites for each constellation.
+    :param plane_phasing: The planar phases for their respective constellations
+    :param inclination: List of inclinations for constellations
+    :param altitude: List of altitudes for constellations
+    :param eccentricity: List of eccentricities for each constellation
+    :param constellation_beam_width: List of Beam widths for satellites in each constellation
+    :param sat_name: Root name for satellites, defaults to Sat
+    :param focus: The focus of the satellite, i.e. Earth, Luna, Mars, in lower case.
+    :param array_backed: Return ConstellationArray column stores instead of Constellation objects
+    :param pattern: Walker pattern for the planes, 'delta' (360 degree RAAN spread) or 'star' (180 degrees)
+    :param lazy: Build Constellations that compute their satellites on access instead of storing them
+    :param cache: ResultCache to consult, defaults to the one set with set_default_cache. Only array backed
+                  constellations are cached, and each caller gets its own copy. Constellation objects are rebuilt on
+                  every call, since they can be changed in place and copying them costs more than building them.
+    :return: Returns a list of constellations that have been formatted
+    """
+
+    validate_constellations(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination,
+                            altitude, eccentricity, constellation_beam_width, focus=focus, pattern=pattern)
+
+    cache = resolve_cache(cache)
+    if cache is not None and array_backed:
+        key = cache_key("constellation_creator", satellite_nums, satellite_planes, plane_phasing, inclination,
+                        altitude, eccentricity, constellation_beam_width, sat_name, focus, pattern)
+        return [array.copy() for array in cache.get_or_compute(key, _build_constellations, num_constellations,
+                                                               satellite_nums, satellite_planes, plane_phasing,
+                                                               inclination, altitude, eccentricity,
+                                                               constellation_beam_width, sat_name, focus, True,
+                                                               pattern, False)]
+    return _build_constellations(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination,
+                                 altitude, eccentricity, constellation_beam_width, sat_name, focus, array_backed,
+                                 pattern, lazy)
+
+
+def _build_constellations(num_constellations, satellite_nums, satellite_planes, plane_phasing, inclination, altitude,
+                          eccentricity, constellation_beam_width, sat_name, focus, array_backed, pattern, lazy):
+    count("satellites_built", sum(satellite_nums))
+    if array_backed:
+        constellation_type = ConstellationArray.from_walker
+    elif lazy:
+        constellation_type = partial(Constellation, lazy=True)
+    else:
+        constellation_type = Constellation
+
     scene = []
     for idx in range(num_constellations):
         start_num = sum(satellite_nums[0:idx])
-        scene.append(Constellation(satellite_nums[idx], satellite_planes[idx], plane_phasing[idx], inclination[idx],
-                                   altitude[idx], eccentricity[idx], constellation_beam_width[idx], name=sat_name,
-                                   starting_number=start_num, focus=focus))
+        scene.append(constellation_type(satellite_nums[idx], satellite_planes[idx], plane_phasing[idx],
+                                        inclination[idx], altitude[idx], eccentricity[idx],
+                                        constellation_beam_width[idx], name=sat_name, starting_number=start_num,
+                                        focus=focus, pattern=pattern))
 
     return scene
 
 
+@timed("ground_array_creator")
 def ground_array_creator(num_ground_stations, latitudes, longitudes, elevations, beam_widths, name="GS"):
     """
 
@@ -189,10 +173,11 @@ def ground_array_creator(num_ground_stations, latitudes, longitudes, elevations,
     return scene
 
 
+@timed("create_scene")
 def create_scene(num_constellations, num_sats, sat_planes, plane_phasing, sat_inclination, sat_alt,
                  sat_eccentricity, const_beam_width,
                  num_ground_stations, latitudes, longitudes, elevations, beam_widths,
-                 sat_name="Sat", gsname="GS"):
+                 sat_name="Sat", gsname="GS", array_backed=False, cache=None):
     """
     Creates the scene list from constellations and ground stations
     :param num_constellations:
@@ -210,11 +195,14 @@ def create_scene(num_constellations, num_sats, sat_planes, plane_phasing, sat_in
     :param beam_widths: List of beam widths for the ground stations
     :param sat_name: Root of satellite names
     :param gsname: Root of ground station names
+    :param array_backed: Build the constellations as ConstellationArray column stores
+    :param cache: ResultCache consulted for the constellations, defaults to the one set with set_default_cache
     :return: List of constellation and ground station objects
     """
 
     scene = constellation_creator(num_constellations, num_sats, sat_planes, plane_phasing, sat_inclination, sat_alt,
-                                  sat_eccentricity, const_beam_width, sat_name=sat_name)
+                                  sat_eccentricity, const_beam_width, sat_name=sat_name,
+                                  array_backed=array_backed, cache=cache)
     scene.extend(ground_array_creator(num_ground_stations, latitudes, longitudes, elevations, beam_widths, name=gsname))
 
     return scene
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+JSON and newline-delimited JSON output of scenes, written straight from the scene objects without building the
+as_dict tree first. orjson is used for the columnar format and for unknown entities when it is installed.
+"""
+from .ConstellationArray import ConstellationArray
+from .Constellation import Constellation
+from .GroundStation import GroundStation
+from .Satellite import Satellite
+from .Cache import cache_key, resolve_cache
+from .Instrumentation import timed
+from json.encoder import encode_basestring_ascii
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+satellite_json = '{"Name":%s,"Orbital Elements":{"Eccentricity":%r,"Right Ascension":%r,"Semi-major Axis":%r,' \
+                 '"Arg. Periapsis":%r,"Mean Anomaly":%r,"Inclination":%r},"Beam Width":%r,"Focus":%s,' \
+                 '"Type":"satellite"}'
+
+ground_station_json = '{"Name":%s,"Latitude":%r,"Longitude":%r,"Elevation":%r,"Beam Width":%r,"Type":"station"}'
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(obj).__name__))
+
+
+def dumps(obj):
+    """
+    Serializes obj to a compact JSON string with the fastest available backend. Numpy arrays are accepted.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), default=_default)
+
+
+def _satellite_json(sat, rads=True):
+    if rads:
+        angles = sat.right_ascension_r, sat.perigee_r, sat.ta_r, sat.inclination_r
+    else:
+        angles = sat.right_ascension, sat.perigee, sat.ta, sat.inclination
+    raan, perigee, ta, inclination = angles
+    return satellite_json % (encode_basestring_ascii(sat.name), float(sat.eccentricity), float(raan),
+                             float(sat.true_alt), float(perigee), float(ta), float(inclination), float(sat.beam),
+                             encode_basestring_ascii(sat._focus))
+
+
+def _ground_station_json(station):
+    return ground_station_json % (encode_basestring_ascii(station.name), float(station.lat), float(station.long),
+                                  float(station.elevation), float(station.beam))
+
+
+def _iter_array_json(array, chunk_size):
+    """
+    Yields (name, satellite JSON) for a column store, converting one chunk of the columns to Python floats at a time
+    """
+    focus = encode_basestring_ascii(array.focus)
+    true_alt = array.true_alt
+    for start in range(0, len(array), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        for name, e, raan, alt, perigee, ta, inc, beam in zip(array.names[chunk], array.eccentricity[chunk].tolist(),
+                                                              array.right_ascension[chunk].tolist(),
+                                                              true_alt[chunk].tolist(), array.perigee[chunk].tolist(),
+                                                              array.ta[chunk].tolist(),
+                                                              array.inclination[chunk].tolist(),
+                                                              array.beam[chunk].tolist()):
+            yield name, satellite_json % (encode_basestring_ascii(name), e, raan, alt, perigee, ta, inc, beam, focus)
+
+
+def _iter_satellite_json(item, chunk_size):
+    if isinstance(item, ConstellationArray):
+        return _iter_array_json(item, chunk_size)
+    # Constellations write their satellites' angles in degrees, as in Constellation.as_dict.
+    return ((sat.name, _satellite_json(sat, rads=False)) for sat in item.satellites)
+
+
+def _iter_constellation_json(item, chunk_size):
+    """
+    Yields chunks of a constellation's as_dict object. Repeated names keep their first satellite, as in as_dict.
+    """
+    yield "{"
+    seen = set()
+    chunk = []
+    for name, sat in _iter_satellite_json(item, chunk_size):
+        if name in seen:
+            continue
+        seen.add(name)
+        chunk.append(encode_basestring_ascii(name) + ":" + sat + ",")
+        if len(chunk) == chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append('"Type":"constellation"}')
+    yield "".join(chunk)
+
+
+def iter_scene_json(scene, chunk_size=256):
+    """
+    Renders a scene as string chunks of a JSON array that parses to [item.as_dict() for item in scene]
+    :param scene: List of constellations, satellites and ground stations, as returned by create_scene
+    :param chunk_size: Maximum number of satellites rendered into each chunk
+    """
+    yield "["
+    for idx, item in enumerate(scene):
+        if idx:
+            yield ","
+        if isinstance(item, (Constellation, ConstellationArray)):
+            for chunk in _iter_constellation_json(item, chunk_size):
+                yield chunk
+        elif isinstance(item, Satellite):
+            yield _satellite_json(item)
+        elif isinstance(item, GroundStation):
+            yield _ground_station_json(item)
+        else:
+            yield dumps(item.as_dict())
+    yield "]"
+
+
+def iter_scene_ndjson(scene, chunk_size=256):
+    """
+    Renders a scene as newline-delimited JSON, one satellite or ground station per line. Each line parses to that
+    entity's as_dict, or for a constellation's satellite to its entry in the constellation's as_dict.
+    :param scene: List of constellations, satellites and ground stations, as returned by create_scene
+    :param chunk_size: Maximum number of lines rendered into each chunk
+    """
+    for item in scene:
+        if isinstance(item, (Constellation, ConstellationArray)):
+            chunk = []
+            for _, sat in _iter_satellite_json(item, chunk_size):
+                chunk.append(sat + "\n")
+                if len(chunk) == chunk_size:
+                    yield "".join(chunk)
+                    chunk = []
+            if chunk:
+                yield "".join(chunk)
+        elif isinstance(item, Satellite):
+            yield _satellite_json(item) + "\n"
+        elif isinstance(item, GroundStation):
+            yield _ground_station_json(item) + "\n"
+        else:
+            yield dumps(item.as_dict()) + "\n"
+
+
+def scene_columns(scene):
+    """
+    Columnar form of a scene, with one list per orbital element rather than one object per satellite
+    :param scene: List of constellations, satellites and ground stations around a single focus
+    :return: Dictionary of numpy columns, ready for dumps
+    """
+    array = ConstellationArray.from_scene(scene)
+    stations = [item for item in scene if isinstance(item, GroundStation)]
+    return {"Type": "scene",
+            "Focus": array.focus,
+            "Satellites": {"Name": array.names,
+                           "Eccentricity": array.eccentricity,
+                           "Right Ascension": array.right_ascension,
+                           "Semi-major Axis": array.true_alt,
+                           "Arg. Periapsis": array.perigee,
+                           "Mean Anomaly": array.ta,
+                           "Inclination": array.inclination,
+                           "Beam Width": array.beam},
+            "Ground Stations": {"Name": [station.name for station in stations],
+                                "Latitude": np.array([station.lat for station in stations], dtype=np.float64),
+                                "Longitude": np.array([station.long for station in stations], dtype=np.float64),
+                                "Elevation": np.array([station.elevation for station in stations], dtype=np.float64),
+                                "Beam Width": np.array([station.beam for station in stations], dtype=np.float64)}}
+
+
+@timed("scene_json")
+def scene_json(scene, cache=None):
+    """
+    :param cache: ResultCache to consult, defaults to the one set with set_default_cache
+    """
+    cache = resolve_cache(cache)
+    if cache is None:
+        return "".join(iter_scene_json(scene))
+    return cache.get_or_compute(cache_key("scene_json", list(scene)), "".join, iter_scene_json(scene))
+
+
+@timed("scene_columnar_json")
+def scene_columnar_json(scene, cache=None):
+    """
+    :param cache: ResultCache to consult, defaults to the one set with set_default_cache
+    """
+    cache = resolve_cache(cache)
+    if cache is None:
+        return dumps(scene_columns(scene))
+    return cache.get_or_compute(cache_key("scene_columnar_json", list(scene)), lambda: dumps(scene_columns(scene)))
+
+
+@timed("write_scene_json")
+def write_scene_json(scene, stream, chunk_size=256):
+    """
+    Writes a scene as a JSON array to a file-like object chunk by chunk
+    :return: Number of characters written
+    """
+    return _write(iter_scene_json(scene, chunk_size), stream)
+
+
+@timed("write_scene_ndjson")
+def write_scene_ndjson(scene, stream, chunk_size=256):
+    """
+    Writes a scene as newline-delimited JSON to a file-like object chunk by chunk
+    :return: Number of characters written
+    """
+    return _write(iter_scene_ndjson(scene, chunk_size), stream)
+
+
+def _write(chunks, stream):
+    written = 0
+    for chunk in chunks:
+        stream.write(chunk)
+        written += len(chunk)
+    return written
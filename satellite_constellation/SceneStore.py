@@ -0,0 +1,194 @@
+"""
+On-disk storage of scenes and their propagated ephemerides. A stored scene is a directory of .npy arrays and a JSON
+header, so the element columns and ephemeris cube can be memory-mapped and shared between processes without copies.
+"""
+from .ConstellationArray import ConstellationArray
+from .GroundStation import GroundStation
+from .Ephemeris import write_ephemeris
+from .Satellite import Satellite
+from .SceneSerializer import dumps
+import json
+import numpy as np
+import os
+
+scene_format = "satellite_constellation.scene"
+scene_format_version = 1
+
+header_file = "scene.json"
+elements_file = "elements.npy"
+stations_file = "stations.npy"
+times_file = "times.npy"
+ephemeris_file = "ephemeris.npy"
+
+station_columns = ("lat", "long", "elevation", "beam")
+
+
+def _scene_arrays(scene):
+    """
+    Column stores for each constellation-like entity of a scene, in scene order, and the scene's ground stations
+    """
+    arrays = []
+    stations = []
+    for item in scene:
+        if isinstance(item, ConstellationArray):
+            arrays.append(item)
+        elif isinstance(item, Satellite):
+            arrays.append(ConstellationArray.from_satellites([item], focus=item._focus))
+        elif isinstance(item, GroundStation):
+            stations.append(item)
+        elif hasattr(item, 'as_array'):
+            arrays.append(item.as_array())
+    return arrays, stations
+
+
+def save_scene(path, scene, times=None, ephemeris=None, j2=False, metadata=None, dtype=np.float64, block_size=1024,
+               processes=1, time_block=None):
+    """
+    Saves a scene, and optionally its ephemeris, to a directory
+    :param path: Directory to write to, created if it does not exist
+    :param scene: List of constellations, satellites and ground stations, as returned by create_scene
+    :param times: Times in seconds since the element epoch at which the ephemeris is stored
+    :param ephemeris: Precomputed states shaped (satellites, times, 6) as position then velocity. If times are given
+                      without an ephemeris, the scene is propagated block by block straight into the file.
+    :param j2: Propagate with J2 secular drift when computing the ephemeris
+    :param metadata: JSON serializable dictionary stored alongside the scene
+    :param dtype: Floating point type of the stored ephemeris
+    :param block_size: Number of satellites propagated and written at once
+    :param processes: Worker processes propagating the ephemeris, see write_ephemeris. None uses every CPU.
+    :param time_block: Number of time steps propagated at once, defaults to all of them
+    :return: Path of the scene directory
+    """
+    arrays, stations = _scene_arrays(scene)
+    constellation = ConstellationArray.concatenate(arrays)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    np.save(os.path.join(path, elements_file),
+            np.array([getattr(constellation, column) for column in ConstellationArray.columns], dtype=np.float64))
+    np.save(os.path.join(path, stations_file),
+            np.array([[getattr(station, column) for station in stations] for column in station_columns],
+                     dtype=np.float64).reshape(len(station_columns), len(stations)))
+
+    header = {"Format": scene_format,
+              "Version": scene_format_version,
+              "Focus": constellation.focus,
+              "Names": constellation.names,
+              "Constellation Sizes": [len(array) for array in arrays],
+              "Ground Stations": [station.name for station in stations],
+              "Ephemeris": None,
+              "Metadata": metadata if metadata is not None else {}}
+
+    if ephemeris is not None and times is None:
+        raise ValueError("An ephemeris can only be stored with its times")
+    if times is not None:
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        shape = (len(constellation), len(times), 6)
+        if ephemeris is not None and np.shape(ephemeris) != shape:
+            raise ValueError("Ephemeris must be shaped (satellites, times, 6)")
+        np.save(os.path.join(path, times_file), times)
+        if ephemeris is None:
+            write_ephemeris(constellation, times, os.path.join(path, ephemeris_file), j2=j2, dtype=dtype,
+                            processes=processes, satellite_block=block_size, time_block=time_block or len(times))
+        else:
+            cube = np.lib.format.open_memmap(os.path.join(path, ephemeris_file), mode='w+', dtype=dtype, shape=shape)
+            for start in range(0, len(constellation), block_size):
+                block = slice(start, start + block_size)
+                cube[block] = ephemeris[block]
+            cube.flush()
+            del cube
+        header["Ephemeris"] = {"J2": bool(j2) if ephemeris is None else None, "Type": np.dtype(dtype).name}
+
+    with open(os.path.join(path, header_file), 'w') as header_stream:
+        header_stream.write(dumps(header))
+    return path
+
+
+def load_scene(path, mmap=True):
+    """
+    Opens a scene saved with save_scene
+    :param path: Scene directory
+    :param mmap: Memory-map the arrays read-only instead of reading them into memory
+    :return: StoredScene
+    """
+    return StoredScene(path, mmap)
+
+
+class StoredScene(object):
+    """
+    A scene opened from disk. With mmap the element columns and ephemeris are read-only views of the files, so pages
+    are only read when they are touched and are shared between every process that opens the same scene.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, header_file)) as header_stream:
+            self.header = json.load(header_stream)
+        if self.header.get("Format") != scene_format:
+            raise ValueError("'" + str(path) + "' is not a stored scene")
+        if self.header.get("Version") != scene_format_version:
+            raise ValueError("Unsupported scene format version {0}".format(self.header.get("Version")))
+
+        mmap_mode = 'r' if mmap else None
+        elements = np.load(os.path.join(path, elements_file), mmap_mode=mmap_mode)
+        self.constellation = ConstellationArray(self.header["Names"], *elements, focus=self.header["Focus"])
+        station_values = np.load(os.path.join(path, stations_file)).tolist()
+        self.stations = [GroundStation(name, *values)
+                         for name, values in zip(self.header["Ground Stations"], zip(*station_values))]
+
+        if self.header["Ephemeris"] is not None:
+            self.times = np.load(os.path.join(path, times_file))
+            self.ephemeris = np.load(os.path.join(path, ephemeris_file), mmap_mode=mmap_mode)
+        else:
+            self.times = None
+            self.ephemeris = None
+
+    def __repr__(self):
+        return "StoredScene({0} satellites, {1} ground stations, {2} ephemeris steps)".format(
+            len(self.constellation), len(self.stations), 0 if self.times is None else len(self.times))
+
+    @property
+    def metadata(self):
+        return self.header["Metadata"]
+
+    @property
+    def constellations(self):
+        """
+        Column stores for each constellation of the original scene, as views of the stored columns
+        """
+        offsets = np.cumsum([0] + self.header["Constellation Sizes"]).tolist()
+        return [self.constellation[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    @property
+    def scene(self):
+        """
+        Scene list in the form returned by create_scene with array_backed=True
+        """
+        return self.constellations + self.stations
+
+    def time_range(self, start, stop):
+        """
+        Index range of the stored times within [start, stop]
+        """
+        if self.times is None:
+            raise ValueError("Scene was stored without an ephemeris")
+        return slice(int(np.searchsorted(self.times, start, side='left')),
+                     int(np.searchsorted(self.times, stop, side='right')))
+
+    def states(self, start, stop, satellites=slice(None)):
+        """
+        View of the stored states between two times. Only the pages holding the requested rows are read.
+        :param start: Start time in seconds since the element epoch
+        :param stop: End time in seconds since the element epoch
+        :param satellites: Index, slice or array of satellite indices
+        :return: Tuple of (times, states) with states shaped (satellites, times, 6)
+        """
+        steps = self.time_range(start, stop)
+        return self.times[steps], self.ephemeris[satellites, steps]
+
+    def positions(self, start, stop, satellites=slice(None)):
+        times, states = self.states(start, stop, satellites)
+        return times, states[..., :3]
+
+    def velocities(self, start, stop, satellites=slice(None)):
+        times, states = self.states(start, stop, satellites)
+        return times, states[..., 3:]
@@ -0,0 +1,116 @@
+"""
+Streaming output of PIGI scenes. Entities are rendered in chunks from generators and written straight to a file-like
+object, so the full document never has to be held in memory.
+"""
+from .ConstellationArray import ConstellationArray
+from .Constellation import Constellation
+from .GroundStation import GroundStation
+from .Instrumentation import timed
+
+pigi_scene_start = '<Pigi>\n' \
+                   '\t<Entities>\n' \
+                   '\t\t<Entity Type="Planet" Name="Mercury">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Mercury"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="0.1"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="0.244"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Venus">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Venus"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="177"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="0.605"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Earth">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Earth"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="23.4"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="0.6371"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Mars">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Mars"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="25"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="0.3371"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="1"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Jupiter">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Jupiter"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="3"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="6.99"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Saturn">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Saturn"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="27"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="6.033"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Neptune">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Neptune"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="30"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="2.46"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n' \
+                   '\t\t<Entity Type="Planet" Name="Pluto">\n' \
+                   '\t\t\t<PropertySection Name="UserProperties">\n' \
+                   '\t\t\t\t<StringPropertyValue name="PlanetName" value="Pluto"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="obliquity" value="120"/>\n' \
+                   '\t\t\t\t<FloatPropertyValue name="scale" value="0.186"/>\n' \
+                   '\t\t\t\t<IntPropertyValue name="Atmosphere" value="0"/>\n' \
+                   '\t\t\t</PropertySection>\n' \
+                   '\t\t</Entity>\n'
+
+pigi_scene_end = '\t</Entities>\n' \
+                 '</Pigi>'
+
+
+def iter_scene_xml(scene, epoch_date='2017-Jan-18 00:00:00', fov=1, chunk_size=256):
+    """
+    Renders a scene as a sequence of string chunks that join to the same document as scene_xml_generator
+    :param scene: List of constellations and ground stations, as returned by create_scene
+    :param epoch_date: Epoch written to every satellite
+    :param fov: Field of view written to every satellite
+    :param chunk_size: Maximum number of satellites rendered into each chunk
+    """
+    yield pigi_scene_start + " "
+    for item in scene:
+        if isinstance(item, (Constellation, ConstellationArray)):
+            for chunk in item.iter_pigi_output(epoch_date, fov, chunk_size):
+                yield chunk
+        elif isinstance(item, GroundStation):
+            yield item.pigi_output()
+        else:
+            yield item.as_xml()
+    yield " " + pigi_scene_end
+
+
+@timed("write_scene")
+def write_scene(scene, stream, epoch_date='2017-Jan-18 00:00:00', fov=1, chunk_size=256):
+    """
+    Writes a scene to a file-like object chunk by chunk
+    :param scene: List of constellations and ground stations, as returned by create_scene
+    :param stream: Any object with a write method accepting str, e.g. an open text file or io.StringIO
+    :param epoch_date: Epoch written to every satellite
+    :param fov: Field of view written to every satellite
+    :param chunk_size: Maximum number of satellites rendered into each chunk
+    :return: Number of characters written
+    """
+    written = 0
+    for chunk in iter_scene_xml(scene, epoch_date, fov, chunk_size):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,175 @@
+"""
+Design-space sweeps over Walker constellations. Designs are validated up front, evaluated for coverage over a process
+pool in chunks, streamed to disk as they complete and reduced to their Pareto front.
+"""
+from .ConstellationArray import ConstellationArray
+from .ConstellationExceptions import *
+from .Coverage import coverage
+from .SceneCreator import validate_constellations
+from .SceneSerializer import dumps
+from .Walker import walker_spacing
+from itertools import product
+import multiprocessing
+import numpy as np
+import os
+
+design_parameters = ("num_sats", "num_planes", "phasing", "inclination", "altitude", "eccentricity", "beam_width")
+
+design_errors = (ConstellationNumberError, ConstellationConfigurationError, ConstellationPlaneMismatchError,
+                 PhaseError, InclinationError, AltitudeError, EccentricityError, BeamError, FocusError,
+                 ZeroDivisionError, ValueError)
+
+
+def design_grid(num_sats, num_planes, phasing, inclination, altitude, eccentricity=(0,), beam_width=(30,)):
+    """
+    Every combination of the given parameter values. Each argument is a single value or any iterable, e.g. a range
+    or numpy array.
+    :return: List of design dictionaries keyed by the Constellation parameter names
+    """
+    values = [np.atleast_1d(value).tolist() if not isinstance(value, range) else list(value)
+              for value in (num_sats, num_planes, phasing, inclination, altitude, eccentricity, beam_width)]
+    return [dict(zip(design_parameters, combination)) for combination in product(*values)]
+
+
+def validate_design(design, focus="earth", pattern="delta"):
+    """
+    Checks a design with the same rules as constellation_creator, without building it
+    :return: None if the design is valid, otherwise the error message
+    """
+    try:
+        validate_constellations(1, [design["num_sats"]], [design["num_planes"]], [design["phasing"]],
+                                [design["inclination"]], [design["altitude"]], [design["eccentricity"]],
+                                [design["beam_width"]], focus=focus, pattern=pattern)
+        walker_spacing(design["num_sats"], design["num_planes"], design["phasing"], pattern)
+    except design_errors as error:
+        return "{0}: {1}".format(type(error).__name__, error)
+    return None
+
+
+def evaluate_design(design, focus="earth", pattern="delta", start=0., stop=86400., step=60., resolution=2.0,
+                    j2=False):
+    """
+    Coverage statistics of a single design
+    :return: Dictionary of the design parameters and its coverage as_dict
+    """
+    constellation = ConstellationArray.from_walker(design["num_sats"], design["num_planes"], design["phasing"],
+                                                   design["inclination"], design["altitude"], design["eccentricity"],
+                                                   design["beam_width"], focus=focus, pattern=pattern)
+    result = dict(design)
+    result.update(coverage([constellation], start, stop, step=step, resolution=resolution, j2=j2).as_dict())
+    return result
+
+
+def _evaluate_chunk(args):
+    designs, settings = args
+    return [evaluate_design(design, **settings) for design in designs]
+
+
+def pareto_front(results, objectives):
+    """
+    Results that no other result dominates, i.e. is no worse on every objective and better on at least one. Results
+    with the same objective values as a result on the front are on the front too.
+    :param results: List of result dictionaries
+    :param objectives: Sequence of (key, sense) pairs, where sense is 'min' or 'max'
+    :return: List of non-dominated results, ordered by the first objective
+    """
+    if not results:
+        return []
+    sign = np.array([1. if sense == 'min' else -1. for key, sense in objectives])
+    values = np.array([[np.nan if result[key] is None else result[key] for key, sense in objectives]
+                       for result in results], dtype=np.float64) * sign
+    values = np.where(np.isnan(values), np.inf, values)
+    order = np.lexsort(values.T[::-1])
+    front = []
+    for idx in order:
+        if front:
+            kept = values[front]
+            if np.any(np.all(kept <= values[idx], axis=1) & np.any(kept < values[idx], axis=1)):
+                continue
+        front.append(idx)
+    return [results[idx] for idx in front]
+
+
+class SweepResults(object):
+    """
+    Outcome of a sweep: evaluated designs, designs rejected by validation, and the Pareto front of the evaluated ones
+    """
+
+    def __init__(self, results, rejected, objectives):
+        self.results = results
+        self.rejected = rejected
+        self.objectives = objectives
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return "SweepResults({0} evaluated, {1} rejected)".format(len(self.results), len(self.rejected))
+
+    @property
+    def front(self):
+        return pareto_front(self.results, self.objectives)
+
+    def as_dict(self):
+        return {"Results": self.results,
+                "Rejected": self.rejected,
+                "Pareto Front": self.front}
+
+
+def sweep(designs, output=None, processes=None, chunk_size=None, focus="earth", pattern="delta", start=0.,
+          stop=86400., step=60., resolution=2.0, j2=False,
+          objectives=(("num_sats", "min"), ("Percent Coverage", "max"))):
+    """
+    Evaluates the coverage of many Walker designs in parallel
+    :param designs: Iterable of design dictionaries, e.g. from design_grid
+    :param output: Path or writable text stream. Each result is written as a line of JSON as soon as its chunk
+                   completes, so finished work survives an interrupted sweep.
+    :param processes: Number of worker processes, defaults to the number of CPUs. 1 evaluates in this process.
+    :param chunk_size: Number of designs sent to a worker at once, defaults to a few chunks per worker
+    :param focus: The focus of the satellites, i.e. Earth, Luna, Mars, in lower case.
+    :param pattern: Walker pattern, 'delta' or 'star'
+    :param start: Start of the coverage analysis in seconds since the element epoch
+    :param stop: End of the coverage analysis in seconds since the element epoch
+    :param step: Coverage time step in seconds
+    :param resolution: Coverage grid cell size in degrees
+    :param j2: Propagate with J2 secular drift
+    :param objectives: (key, sense) pairs of the Pareto front, with sense 'min' or 'max'
+    :return: SweepResults
+    """
+    valid = []
+    rejected = []
+    for design in designs:
+        error = validate_design(design, focus, pattern)
+        if error is None:
+            valid.append(design)
+        else:
+            rejected.append(dict(design, Error=error))
+
+    processes = processes or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, len(valid) // (processes * 4))
+    settings = {"focus": focus, "pattern": pattern, "start": start, "stop": stop, "step": step,
+                "resolution": resolution, "j2": j2}
+    chunks = [(valid[idx:idx + chunk_size], settings) for idx in range(0, len(valid), chunk_size)]
+
+    stream = open(output, 'w') if isinstance(output, str) else output
+    results = []
+    pool = multiprocessing.Pool(processes) if processes > 1 and len(chunks) > 1 else None
+    try:
+        completed = pool.imap_unordered(_evaluate_chunk, chunks) if pool else map(_evaluate_chunk, chunks)
+        for chunk_results in completed:
+            results.extend(chunk_results)
+            if stream is not None:
+                stream.write("".join(dumps(result) + "\n" for result in chunk_results))
+                stream.flush()
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            # Stops outstanding work if a chunk failed; a no-op after close once every chunk has completed.
+            pool.terminate()
+            pool.join()
+        if isinstance(output, str):
+            stream.close()
+
+    return SweepResults(results, rejected, objectives)
@@ -0,0 +1,80 @@
+"""
+Closed form Walker pattern generation for whole constellations at once.
+"""
+from .ConstellationExceptions import ConstellationConfigurationError
+import numpy as np
+
+walker_raan_spread = {
+    "delta": 360,
+    "star": 180,
+}
+
+
+def walker_spacing(num_sats, num_planes, phasing, pattern="delta"):
+    """
+    Spacing constants shared by every slot of a Walker constellation
+    :param num_sats: Total number of satellites in the constellation
+    :param num_planes: Number of orbital planes
+    :param phasing: Walker phasing parameter, in units of 360/num_sats between adjacent planes
+    :param pattern: 'delta' to spread the planes over 360 degrees of RAAN, or 'star' for 180 degrees
+    :return: Tuple of (sats_per_plane, raan_step, perigee_step, perigees_per_cycle, anomaly_step)
+    """
+    if pattern not in walker_raan_spread:
+        raise ConstellationConfigurationError("'" + str(pattern) + "' is not a supported Walker pattern")
+
+    sats_per_plane = int(num_sats / num_planes)
+    perigee_step = int(360 / sats_per_plane)
+    # Matches the repeating per-plane perigee list Constellation has always used, including when 360 is not
+    # a multiple of the number of satellites in a plane.
+    perigees_per_cycle = len(range(0, 360, perigee_step))
+    return (sats_per_plane, walker_raan_spread[pattern] / num_planes, perigee_step, perigees_per_cycle,
+            360 * phasing / num_sats)
+
+
+def walker_planes(num_sats, spacing):
+    """
+    RAAN and anomaly of each plane, accumulated one plane at a time as Constellation always has, so every value
+    rounds exactly as it did before. The first plane's are integer zeros, which print as 0 rather than 0.0.
+    :param num_sats: Total number of satellites in the constellation
+    :param spacing: Spacing constants from walker_spacing
+    :return: Tuple of (raan, anomaly) lists in degrees, one entry per plane including a partly filled last plane
+    """
+    sats_per_plane, raan_step, perigee_step, perigees_per_cycle, anomaly_step = spacing
+    raan, anomaly = [0], [0]
+    for _ in range(1, -(-num_sats // sats_per_plane)):
+        raan.append(raan[-1] + raan_step)
+        anomaly.append(anomaly[-1] + anomaly_step)
+    return raan, anomaly
+
+
+def walker_elements(num_sats, num_planes, phasing, pattern="delta"):
+    """
+    Computes the RAAN, argument of perigee and anomaly of every slot in a Walker constellation. Each slot is
+    evaluated directly from its index and the per-plane angles, so the cost is linear in num_sats.
+    :param num_sats: Total number of satellites in the constellation
+    :param num_planes: Number of orbital planes
+    :param phasing: Walker phasing parameter, in units of 360/num_sats between adjacent planes
+    :param pattern: 'delta' to spread the planes over 360 degrees of RAAN, or 'star' for 180 degrees
+    :return: Tuple of numpy arrays (raan, perigee, anomaly) in degrees, each of length num_sats. Perigees are
+             integers.
+    """
+    spacing = walker_spacing(num_sats, num_planes, phasing, pattern)
+    sats_per_plane, raan_step, perigee_step, perigees_per_cycle, anomaly_step = spacing
+    plane_raan, plane_anomaly = walker_planes(num_sats, spacing)
+    slot = np.arange(num_sats)
+    plane = slot // sats_per_plane
+    return np.array(plane_raan, dtype=np.float64)[plane], (slot % perigees_per_cycle) * perigee_step, \
+        np.array(plane_anomaly, dtype=np.float64)[plane]
+
+
+def walker_slot(slot, spacing, planes):
+    """
+    Computes the elements of a single Walker slot without building the rest of the constellation
+    :param slot: Zero based index of the satellite within its constellation
+    :param spacing: Spacing constants from walker_spacing
+    :param planes: Per-plane angles from walker_planes
+    :return: Tuple of (raan, perigee, anomaly) in degrees
+    """
+    sats_per_plane, raan_step, perigee_step, perigees_per_cycle, anomaly_step = spacing
+    plane = slot // sats_per_plane
+    return planes[0][plane], (slot % perigees_per_cycle) * perigee_step, planes[1][plane]
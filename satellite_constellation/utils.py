@@ -1,6 +1,7 @@
 """
 
 """
+from string import Formatter
 
 
 def mod(x, y):
@@ -13,6 +14,7 @@ def mod(x, y):
     return [a % b for a, b in zip(x, y)]
 
 
+# Mean radii in km
 heavenly_body_radius = {
     "earth": 6371,
     "luna": 1737,
@@ -26,3 +28,72 @@ heavenly_body_radius = {
     "neptune": 24622,
     "pluto": 1188,
 }
+
+# Standard gravitational parameters in km^3/s^2
+heavenly_body_mu = {
+    "earth": 398600.4418,
+    "luna": 4902.800066,
+    "mars": 42828.37,
+    "venus": 324858.592,
+    "mercury": 22031.86855,
+    "sol": 132712440018,
+    "jupiter": 126686534,
+    "saturn": 37931187,
+    "uranus": 5793939,
+    "neptune": 6836529,
+    "pluto": 871,
+}
+
+# Second zonal harmonic (oblateness) coefficients, dimensionless
+heavenly_body_j2 = {
+    "earth": 1.08262668e-3,
+    "luna": 2.0323e-4,
+    "mars": 1.96045e-3,
+    "venus": 4.458e-6,
+    "mercury": 5.03e-5,
+    "sol": 2.2e-7,
+    "jupiter": 1.4736e-2,
+    "saturn": 1.6298e-2,
+    "uranus": 3.34343e-3,
+    "neptune": 3.411e-3,
+    "pluto": 0,
+}
+
+# Sidereal rotation rates in rad/s, negative for retrograde rotation
+heavenly_body_rotation = {
+    "earth": 7.2921150e-5,
+    "luna": 2.6616995e-6,
+    "mars": 7.0882181e-5,
+    "venus": -2.9924e-7,
+    "mercury": 1.2400e-6,
+    "sol": 2.8653e-6,
+    "jupiter": 1.7585e-4,
+    "saturn": 1.6378e-4,
+    "uranus": -1.0124e-4,
+    "neptune": 1.0834e-4,
+    "pluto": -1.1386e-5,
+}
+
+
+class CompiledTemplate(object):
+    """
+    A str.format template with plain positional fields ({0}, {1}, ...), parsed once into a %-style format string so
+    that rendering it for many entities skips re-parsing the template every time.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        pieces = []
+        self.order = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            pieces.append(literal.replace('%', '%%'))
+            if field is None:
+                continue
+            if spec or conversion or not field.isdigit():
+                raise ValueError("Only plain positional fields can be compiled: {" + field + "}")
+            pieces.append('%s')
+            self.order.append(int(field))
+        self.format_string = ''.join(pieces)
+
+    def render(self, *values):
+        return self.format_string % tuple([values[idx] for idx in self.order])
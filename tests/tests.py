@@ -0,0 +1,821 @@
+from datetime import datetime, timedelta, timezone
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import warnings
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from satellite_constellation.Access import AccessWindows, access_windows, elevation, minimum_elevation, \
+    station_positions
+from satellite_constellation.Cache import ResultCache, set_default_cache
+from satellite_constellation.Catalog import omm_epoch, read_catalog, tle_epoch
+from satellite_constellation.Conjunction import conjunctions
+from satellite_constellation.CatalogWriter import iter_omm, iter_tle, write_omm, write_tle
+from satellite_constellation.Constellation import Constellation
+from satellite_constellation.ConstellationArray import ConstellationArray
+from satellite_constellation.ContactScheduler import ContactSchedule
+from satellite_constellation.Coverage import EqualAreaGrid, coverage, footprint_half_angle
+from satellite_constellation.ConstellationExceptions import AltitudeError, ConstellationPlaneMismatchError, \
+    EccentricityError, FocusError, InclinationError
+from satellite_constellation.Eclipse import _umbra_passages, eclipses, shadow_boundary, sun_position
+from satellite_constellation.Ephemeris import write_ephemeris
+from satellite_constellation.GroundStation import GroundStation
+from satellite_constellation.GroundTrack import ground_tracks, sub_satellite_points
+from satellite_constellation.Instrumentation import Profile, count, is_active, register_callback, span, \
+    unregister_callback
+from satellite_constellation.LinkTopology import line_of_sight, link_topology
+from satellite_constellation.Propagator import SymmetricEphemeris, _propagate, orbit_references, propagate, \
+    propagate_pairs, propagate_scene
+from satellite_constellation.Satellite import Satellite
+from satellite_constellation.Scene import Scene
+from satellite_constellation import SceneSerializer
+from satellite_constellation.SceneCreator import constellation_creator, create_scene, scene_xml_generator
+from satellite_constellation.SceneSerializer import scene_columnar_json, scene_json, write_scene_ndjson
+from satellite_constellation.SceneStore import load_scene, save_scene
+from satellite_constellation.SceneWriter import pigi_scene_end, pigi_scene_start, write_scene
+from satellite_constellation.Sweep import design_grid, pareto_front, sweep, validate_design
+from satellite_constellation.utils import heavenly_body_radius
+from satellite_constellation.Walker import walker_elements, walker_planes, walker_slot, walker_spacing
+
+
+def _visible_samples(windows, num_sats, num_stations, times):
+    visible = np.zeros((num_sats, num_stations, len(times)), dtype=bool)
+    for sat, station, start, end in zip(windows.satellite, windows.station, windows.start, windows.end):
+        visible[sat, station] |= (times >= start) & (times <= end)
+    return visible
+
+
+def _legacy_walker(num_sats, num_planes, phasing, spread=360):
+    """
+    The per-satellite recurrences Constellation used before Walker, with the RAAN spread made a parameter
+    """
+    sats_per_plane = int(num_sats / num_planes)
+    perigees = list(range(0, 360, int(360 / sats_per_plane))) * num_sats
+    raan = [0] * num_sats
+    ta = [0] * num_sats
+    for i in range(sats_per_plane, num_sats):
+        raan[i] = raan[i - sats_per_plane] + spread / num_planes
+        ta[i] = ta[i - sats_per_plane] + 360 * phasing / num_sats
+    return raan, perigees[:num_sats], ta
+
+
+class TestWalker(unittest.TestCase):
+
+    def test_matches_legacy_recurrences(self):
+        for num_sats, num_planes, phasing in ((24, 4, 0), (24, 4, 1), (30, 5, 3), (70, 10, 7), (10, 3, 2),
+                                              (154, 7, 5), (66, 11, 4)):
+            for pattern, spread in (("delta", 360), ("star", 180)):
+                expected = _legacy_walker(num_sats, num_planes, phasing, spread)
+                elements = walker_elements(num_sats, num_planes, phasing, pattern)
+                spacing = walker_spacing(num_sats, num_planes, phasing, pattern)
+                planes = walker_planes(num_sats, spacing)
+                # Bit for bit: the angles are written out with str().
+                for column, legacy in zip(elements, expected):
+                    self.assertEqual(column.tolist(), legacy)
+                for slot in range(num_sats):
+                    self.assertEqual(walker_slot(slot, spacing, planes), tuple(column[slot] for column in expected))
+                constellation = Constellation(num_sats, num_planes, phasing, 53, 550, 0, 30, pattern=pattern)
+                lazy = Constellation(num_sats, num_planes, phasing, 53, 550, 0, 30, pattern=pattern, lazy=True)
+                for satellites in (constellation, lazy):
+                    self.assertEqual([list(sat.element_angles[1:]) for sat in satellites],
+                                     [list(angles) for angles in zip(*expected)])
+                array = ConstellationArray.from_walker(num_sats, num_planes, phasing, 53, 550, 0, 30, pattern=pattern)
+                self.assertEqual([array.right_ascension.tolist(), array.perigee.tolist(), array.ta.tolist()],
+                                 list(expected))
+
+
+class TestLazyConstellation(unittest.TestCase):
+
+    def assert_same_satellites(self, lazy, eager):
+        self.assertEqual(len(lazy), len(eager))
+        self.assertEqual([sat.name for sat in lazy], [sat.name for sat in eager])
+        np.testing.assert_array_equal([sat.element_angles for sat in lazy], [sat.element_angles for sat in eager])
+
+    def test_matches_eager_constellation(self):
+        lazy = Constellation(40, 8, 3, 53, 550, 0, 30, starting_number=10, lazy=True)
+        eager = Constellation(40, 8, 3, 53, 550, 0, 30, starting_number=10)
+        self.assertIsNone(lazy.raan)
+        self.assert_same_satellites(lazy, eager)
+        for idx in (0, 7, 39, -1, -40):
+            self.assertEqual(lazy[idx].name, eager[idx].name)
+            self.assertEqual(lazy[idx].element_angles, eager[idx].element_angles)
+        for idx in (slice(5, 20), slice(None, None, 3), slice(-10, None), slice(30, 5, -4)):
+            self.assert_same_satellites(lazy[idx], eager.satellites[idx])
+        self.assert_same_satellites(lazy[5:30][2:20:2], eager.satellites[5:30][2:20:2])
+        with self.assertRaises(IndexError):
+            lazy[40]
+
+        for parameters in ({"num_sats": 48, "num_planes": 8}, {"phasing": 1}, {"num_sats": 16, "num_planes": 4}):
+            changes = [slots.tolist() for slots in lazy.update(**parameters)]
+            self.assertEqual(changes, [slots.tolist() for slots in eager.update(**parameters)])
+            self.assert_same_satellites(lazy, eager)
+        self.assertEqual(lazy.changes(), eager.changes())
+
+
+class TestPropagator(unittest.TestCase):
+
+    def test_matches_pointwise_propagation(self):
+        # A Walker shell shares its rates; the catalog objects each have their own.
+        rng = np.random.RandomState(2)
+        num_objects = 70
+        catalog = ConstellationArray(["C" + str(idx) for idx in range(num_objects)],
+                                     rng.uniform(400, 1200, num_objects), rng.uniform(0, 0.05, num_objects),
+                                     rng.uniform(0, 98, num_objects), rng.uniform(0, 360, num_objects),
+                                     rng.uniform(0, 360, num_objects), rng.uniform(0, 360, num_objects), 30)
+        constellation = ConstellationArray.concatenate([ConstellationArray.from_walker(60, 6, 1, 53, 550, 0.01, 30),
+                                                        catalog])
+        times = np.arange(0., 7200., 90.)
+        sat_idx, step_times = np.meshgrid(np.arange(len(constellation)), times, indexing='ij')
+        for j2 in (False, True):
+            positions, velocities = _propagate(constellation, times, j2, np.float64, 64)
+            expected_positions, expected_velocities = propagate_pairs(constellation, sat_idx, step_times, j2=j2)
+            np.testing.assert_allclose(positions, expected_positions, atol=1e-6)
+            np.testing.assert_allclose(velocities, expected_velocities, atol=1e-6)
+
+
+class TestAccessWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.constellation = Constellation(6, 2, 1, 53, 550, 0, 30)
+        self.stations = [GroundStation("Sydney", -33.9, 151.2, 0, 120), GroundStation("London", 51.5, -0.1, 0, 120)]
+
+    def assert_matches_dense_sampling(self, scene, stations, stop, step=60.):
+        windows = access_windows(scene, 0., stop, step=step)
+        self.assertGreater(len(windows), 0)
+
+        times = np.arange(0., stop + 1, 5.)
+        array = ConstellationArray.from_scene(scene)
+        stations_fixed = station_positions(stations)
+        sat_idx, station_idx = np.meshgrid(np.arange(len(array)), np.arange(len(stations)), indexing='ij')
+        el = elevation(array, stations_fixed, sat_idx.ravel()[:, None], station_idx.ravel()[:, None],
+                       times[None, :]).reshape(len(array), len(stations), len(times))
+        expected = el >= minimum_elevation(stations)[None, :, None]
+        found = _visible_samples(windows, len(array), len(stations), times)
+        # Samples within the root tolerance of a rise or set may fall either way.
+        margin = np.abs(el - minimum_elevation(stations)[None, :, None]) > 1e-3
+        np.testing.assert_array_equal(found[margin], expected[margin])
+
+        # Windows of the same pair never overlap.
+        order = np.lexsort((windows.start, windows.station, windows.satellite))
+        same = (windows.satellite[order][1:] == windows.satellite[order][:-1]) & \
+            (windows.station[order][1:] == windows.station[order][:-1])
+        self.assertTrue(np.all(windows.start[order][1:][same] > windows.end[order][:-1][same]))
+
+    def test_matches_dense_sampling(self):
+        self.assert_matches_dense_sampling([self.constellation] + self.stations, self.stations, 21600.)
+
+    def test_coarse_steps_keep_every_pass(self):
+        # Wide beams and slow, eccentric orbits put several passes, and passes still under way at the end of the
+        # search, into single candidate runs.
+        stations = [GroundStation("Sydney", -33.9, 151.2, 0, 170), GroundStation("London", 51.5, -0.1, 0, 160)]
+        scene = [self.constellation, Constellation(4, 2, 1, 63, 20000, 0.7, 30, name="M")] + stations
+        for step in (60., 600., 1200.):
+            self.assert_matches_dense_sampling(scene, stations, 86400., step)
+
+    def test_no_visibility(self):
+        scene = [Constellation(4, 1, 0, 53, 550, 0, 30), GroundStation("gs", 85, 0, 0, 20)]
+        windows = access_windows(scene, 0., 3600.)
+        self.assertEqual(len(windows), 0)
+        self.assertEqual(windows.as_dict(), [])
+
+
+class TestCoverage(unittest.TestCase):
+
+    def test_matches_brute_force_footprints(self):
+        constellation = ConstellationArray.concatenate([
+            ConstellationArray.from_walker(12, 3, 1, 53, 1200, 0, 60),
+            ConstellationArray.from_walker(4, 2, 1, 98, 800, 0.02, 90, name="P")])
+        times = np.arange(0., 7200. + 150, 300.)
+        result = coverage(constellation, 0., 7200., step=300., resolution=10., chunk_steps=7)
+        grid = EqualAreaGrid(10.)
+        self.assertAlmostEqual(grid.area.sum(), 1)
+
+        radius = heavenly_body_radius["earth"]
+        lat, long, alt = sub_satellite_points(propagate(constellation, times)[0], times)
+        half_angle = footprint_half_angle(alt + radius, constellation.beam[:, None], radius)
+        cell_lat, cell_long = np.radians(grid.lat), np.radians(grid.long)
+        sat_lat, sat_long = np.radians(lat), np.radians(long)
+        # Central angle from every cell centre to every sub-satellite point, shaped (cells, satellites, times).
+        cos_angle = np.sin(cell_lat)[:, None, None] * np.sin(sat_lat)[None] + \
+            np.cos(cell_lat)[:, None, None] * np.cos(sat_lat)[None] * \
+            np.cos(cell_long[:, None, None] - sat_long[None])
+        angle = np.degrees(np.arccos(np.clip(cos_angle, -1, 1)))
+        covered = (angle <= half_angle[None]).any(axis=1)
+        near_edge = (np.abs(angle - half_angle[None]) < 1e-6).any(axis=1).any(axis=1)
+        self.assertTrue(covered.any() and not covered.all())
+
+        clear = ~near_edge
+        np.testing.assert_array_equal(result.covered_steps[clear], covered.sum(axis=1)[clear])
+        for cell in np.flatnonzero(clear).tolist():
+            gap_start, longest = times[0], 0.
+            for time, now in zip(times.tolist(), covered[cell].tolist()):
+                if now and gap_start is not None:
+                    longest, gap_start = max(longest, time - gap_start), None
+                elif not now and gap_start is None:
+                    gap_start = time
+            if gap_start is not None:
+                longest = max(longest, times[-1] - gap_start)
+            self.assertEqual(result.max_gap[cell], longest)
+
+
+class TestSceneWriter(unittest.TestCase):
+
+    def test_matches_legacy_document(self):
+        num_sats, num_planes, phasing = 154, 7, 7
+        raan, perigee, ta = _legacy_walker(num_sats, num_planes, phasing)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            for array_backed in (False, True):
+                scene = create_scene(1, [num_sats], [num_planes], [phasing], [53], [550], [0], [30], 2, [10, -20],
+                                     [30, 40], [0, 0], [20, 20], array_backed=array_backed)
+                # The satellites as the scene was built before the element columns, with the same number types.
+                legacy = [Satellite("Sat " + str(i + 1), 550, 0, 53, raan[i], perigee[i], ta[i], 30)
+                          for i in range(num_sats)]
+                expected = "{0} {1} {2}".format(pigi_scene_start,
+                                                "".join(item.as_xml() for item in legacy + scene[1:]), pigi_scene_end)
+                stream = io.StringIO()
+                write_scene(scene, stream)
+                self.assertEqual(stream.getvalue(), expected)
+                self.assertEqual(scene_xml_generator(scene), expected)
+                self.assertIn('<FloatPropertyValue name="RAAN" value="0"/>', expected)
+                self.assertIn('value="308.5714285714286"', expected)
+            lazy = [Constellation(num_sats, num_planes, phasing, 53, 550, 0, 30, lazy=True)] + scene[1:]
+            self.assertEqual(scene_xml_generator(lazy), expected)
+
+
+class TestSceneSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = create_scene(2, [24, 10], [4, 5], [2, 5], [53, 85], [550, 800], [0, 0.01], [30, 60], 2, [10, -20],
+                                  [30, 40], [0, 5], [20, 20])
+        self.scene += create_scene(1, [12], [3], [1], [53], [550], [0], [30], 2, [1, 2], [2, 3], [3, 4], [4, 5],
+                                   array_backed=True)
+        self.scene.append(Satellite("Lone", 700, 0.1, 45, 10, 20, 30, 40))
+
+    def test_round_trip(self):
+        # Once with orjson, when it is installed, and once with the standard library backend.
+        for backend in (SceneSerializer.orjson, None):
+            with mock.patch.object(SceneSerializer, "orjson", backend):
+                self.assertEqual(json.loads(scene_json(self.scene)), [item.as_dict() for item in self.scene])
+
+                stream = io.StringIO()
+                write_scene_ndjson(self.scene, stream, chunk_size=5)
+                # A constellation's satellites are written as in the constellation's as_dict.
+                entities = []
+                for item in self.scene:
+                    if isinstance(item, (Constellation, ConstellationArray)):
+                        entities.extend(sat for name, sat in item.as_dict().items() if name != "Type")
+                    else:
+                        entities.append(item.as_dict())
+                lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+                self.assertEqual(sorted(lines, key=repr), sorted(entities, key=repr))
+
+                columns = json.loads(scene_columnar_json(self.scene))
+                array = ConstellationArray.from_scene(self.scene)
+                self.assertEqual(columns["Satellites"]["Name"], list(array.names))
+                self.assertEqual(columns["Satellites"]["Right Ascension"], array.right_ascension.tolist())
+                self.assertEqual(columns["Satellites"]["Semi-major Axis"], array.true_alt.tolist())
+                self.assertEqual(columns["Ground Stations"]["Latitude"], [10, -20, 1, 2])
+
+
+class TestSceneStore(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = create_scene(2, [24, 10], [4, 5], [2, 5], [53, 85], [550, 800], [0, 0.01], [30, 60], 2, [10, -20],
+                                  [30, 40], [0, 5], [20, 20])
+        self.scene.append(Satellite("Lone", 700, 0.1, 45, 10, 20, 30, 40, rads=False))
+        self.times = np.arange(0., 3600., 60.)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        array = ConstellationArray.from_scene(self.scene)
+        positions, velocities = propagate_scene(self.scene, self.times)[1:]
+        ephemeris = np.concatenate((positions, velocities), axis=-1)
+        for name, stored_ephemeris in (("given", ephemeris), ("propagated", None)):
+            path = save_scene(os.path.join(self.directory, name), self.scene, self.times, stored_ephemeris,
+                              metadata={"Run": name}, block_size=7)
+            for mmap in (True, False):
+                stored = load_scene(path, mmap=mmap)
+                self.assertEqual(stored.metadata, {"Run": name})
+                self.assertEqual(stored.constellation.names, array.names)
+                for column in ConstellationArray.columns:
+                    np.testing.assert_array_equal(getattr(stored.constellation, column), getattr(array, column))
+                self.assertEqual([len(item) for item in stored.constellations], [24, 10, 1])
+                self.assertEqual([station.as_dict() for station in stored.stations],
+                                 [item.as_dict() for item in self.scene if isinstance(item, GroundStation)])
+
+                times, states = stored.states(600., 1200., slice(3, 9))
+                np.testing.assert_array_equal(times, self.times[10:21])
+                np.testing.assert_allclose(states, ephemeris[3:9, 10:21], atol=1e-9)
+                del stored, states
+
+    def test_parallel_ephemeris_matches_serial(self):
+        serial = write_ephemeris(self.scene, self.times, os.path.join(self.directory, "serial.npy"), processes=1,
+                                 satellite_block=8, time_block=25)
+        parallel = write_ephemeris(self.scene, self.times, os.path.join(self.directory, "parallel.npy"), processes=2,
+                                   satellite_block=8, time_block=25)
+        np.testing.assert_array_equal(parallel, serial)
+        positions, velocities = propagate_scene(self.scene, self.times)[1:]
+        np.testing.assert_allclose(serial[..., :3], positions, atol=1e-9)
+        np.testing.assert_allclose(serial[..., 3:], velocities, atol=1e-12)
+        del serial, parallel
+
+
+def _dominates(first, second, objectives):
+    signs = [1 if sense == 'min' else -1 for key, sense in objectives]
+    first = [sign * first[key] for sign, (key, sense) in zip(signs, objectives)]
+    second = [sign * second[key] for sign, (key, sense) in zip(signs, objectives)]
+    return all(a <= b for a, b in zip(first, second)) and any(a < b for a, b in zip(first, second))
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_pareto_front_keeps_ties(self):
+        objectives = (("num_sats", "min"), ("Percent Coverage", "max"))
+        results = [{"name": "a", "num_sats": 10, "Percent Coverage": 50.},
+                   {"name": "b", "num_sats": 10, "Percent Coverage": 50.},
+                   {"name": "c", "num_sats": 20, "Percent Coverage": 50.},
+                   {"name": "d", "num_sats": 20, "Percent Coverage": 60.},
+                   {"name": "e", "num_sats": 30, "Percent Coverage": None}]
+        self.assertEqual([result["name"] for result in pareto_front(results, objectives)], ["a", "b", "d"])
+        self.assertEqual(pareto_front([], objectives), [])
+
+    def test_sweep(self):
+        designs = design_grid([8, 12, 13], [2, 3, 4], 1, 53, [550, 1200], beam_width=60)
+        settings = {"stop": 3600., "step": 600., "resolution": 10.}
+        stream = io.StringIO()
+        serial = sweep(designs, output=stream, processes=1, **settings)
+        parallel = sweep(designs, processes=2, chunk_size=3, **settings)
+        self.assertEqual(len(serial) + len(serial.rejected), len(designs))
+        self.assertTrue(all(validate_design(result) is None for result in serial.results))
+        self.assertTrue(all(validate_design(rejected) is not None for rejected in serial.rejected))
+        self.assertEqual(sorted(parallel.results, key=repr), sorted(serial.results, key=repr))
+        self.assertEqual([json.loads(line) for line in stream.getvalue().splitlines()], serial.results)
+
+        front = serial.front
+        self.assertEqual(sorted(front, key=repr),
+                         sorted((result for result in serial.results
+                                 if not any(_dominates(other, result, serial.objectives)
+                                            for other in serial.results)), key=repr))
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = [Constellation(12, 3, 1, 53, 550, 0, 30), GroundStation("Sydney", -33.9, 151.2, 0, 120)]
+
+    def tearDown(self):
+        set_default_cache(None)
+
+    def test_cached_results_match(self):
+        times = np.arange(0., 3600., 60.)
+        windows = access_windows(self.scene, 0., 86400.)
+        positions = propagate_scene(self.scene, times)[1]
+        set_default_cache(ResultCache())
+        for _ in range(2):
+            cached_windows = access_windows(self.scene, 0., 86400.)
+            np.testing.assert_array_equal(cached_windows.start, windows.start)
+            np.testing.assert_array_equal(cached_windows.end, windows.end)
+            np.testing.assert_array_equal(propagate_scene(self.scene, times)[1], positions)
+
+    def test_edits_in_place_change_keys(self):
+        cache = ResultCache()
+        scene = Scene(self.scene)
+        constellation = scene[0]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            for edit in (lambda: constellation.update(altitude=700),
+                         lambda: setattr(constellation[3], "altitude", 900), lambda: scene.update(0, phasing=2)):
+                cached = (scene_json(scene, cache=cache), scene_xml_generator(scene, cache=cache))
+                edit()
+                self.assertEqual(scene_json(scene, cache=cache), scene_json(scene))
+                self.assertEqual(scene_xml_generator(scene, cache=cache), scene_xml_generator(scene))
+                self.assertNotEqual((scene_json(scene), scene_xml_generator(scene)), cached)
+
+    def test_propagate_key_includes_symmetric(self):
+        cache = ResultCache()
+        constellation = ConstellationArray.from_walker(12, 3, 1, 53, 550, 0, 30)
+        times = np.arange(0., 3600., 60.)
+        for symmetric in (None, True, False):
+            propagate(constellation, times, cache=cache, symmetric=symmetric)
+        self.assertEqual(len(cache), 3)
+
+    def test_ephemeris_blocks_bypass_cache(self):
+        times = np.arange(0., 3600., 60.)
+        expected = np.concatenate(propagate_scene(self.scene, times)[1:], axis=-1)
+        cache = ResultCache()
+        set_default_cache(cache)
+        handle, path = tempfile.mkstemp(suffix=".npy")
+        os.close(handle)
+        try:
+            ephemeris = write_ephemeris(self.scene, times, path, processes=1, satellite_block=5, time_block=16)
+            np.testing.assert_allclose(ephemeris, expected, atol=1e-9)
+            self.assertEqual(len(cache), 0)
+            del ephemeris
+        finally:
+            os.remove(path)
+
+    def test_cached_constellations_are_not_shared(self):
+        set_default_cache(ResultCache())
+        parameters = (1, [8], [2], [1], [53], [550], [0], [30])
+        first = constellation_creator(*parameters)
+        first[0].update(altitude=2000)
+        second = constellation_creator(*parameters)
+        self.assertIsNot(second[0], first[0])
+        self.assertEqual(second[0].altitude, 550)
+
+        first = constellation_creator(*parameters, array_backed=True)
+        first[0].altitude[:] = 2000
+        second = constellation_creator(*parameters, array_backed=True)
+        np.testing.assert_array_equal(second[0].altitude, 550)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_spans_and_counters_aggregate(self):
+        events = []
+        parameters = (2, [8, 12], [2, 3], [1, 1], [53, 60], [550, 700], [0, 0], [30, 40], 2, [10, -20], [30, 40],
+                      [0, 0], [20, 20])
+        self.assertFalse(is_active())
+        callback = register_callback(lambda kind, name, value: events.append((kind, name, value)))
+        try:
+            with Profile() as outer:
+                create_scene(*parameters)
+                with Profile() as inner:
+                    create_scene(*parameters)
+                    count("requests", 3)
+                    with span("serialize"):
+                        scene_json(create_scene(*parameters))
+        finally:
+            unregister_callback(callback)
+        self.assertFalse(is_active())
+        create_scene(*parameters)
+
+        self.assertEqual(outer.spans["create_scene"]["Calls"], 3)
+        self.assertEqual(inner.spans["create_scene"]["Calls"], 2)
+        self.assertEqual(outer.spans["Constellation.build"]["Calls"], 6)
+        self.assertEqual(outer.counters, {"satellites_built": 60, "requests": 3})
+        self.assertEqual(inner.counters, {"satellites_built": 40, "requests": 3})
+        self.assertTrue(set(inner.spans) <= set(outer.spans))
+        for name, stats in outer.spans.items():
+            durations = [value for kind, event, value in events if kind == 'span' and event == name]
+            self.assertEqual(stats["Calls"], len(durations))
+            self.assertAlmostEqual(stats["Total"], sum(durations))
+            self.assertEqual(stats["Max"], max(durations))
+        self.assertEqual(sum(value for kind, name, value in events if kind == 'counter'), 63)
+        self.assertIn("serialize", str(inner))
+
+
+class TestConstellationUpdate(unittest.TestCase):
+
+    def test_invalid_parameters_raise_before_changing(self):
+        constellation = Constellation(8, 2, 1, 53, 550, 0, 30)
+        names = [sat.name for sat in constellation]
+        for parameters, error in (({"num_sats": 7}, ConstellationPlaneMismatchError),
+                                  ({"altitude": -100}, AltitudeError),
+                                  ({"inclination": 500}, InclinationError),
+                                  ({"eccentricity": 2}, EccentricityError)):
+            with self.assertRaises(error):
+                constellation.update(**parameters)
+        self.assertEqual((constellation.num_sats, constellation.altitude, constellation.inclination,
+                          constellation.e), (8, 550, 53, 0))
+        self.assertEqual([sat.name for sat in constellation], names)
+        self.assertFalse(constellation.has_changes)
+
+    def test_invalid_station_parameters_raise_before_changing(self):
+        station = GroundStation("Sydney", -33.9, 151.2, 0, 120)
+        scene = Scene([station])
+        scene.commit()
+        for parameters in ({"lat": 91}, {"long": -181}, {"elevation": 9000}, {"beam": 200},
+                           {"lat": 10, "long": 200}):
+            with self.assertRaises(ValueError):
+                scene.update(0, **parameters)
+        self.assertEqual((station.lat, station.long, station.elevation, station.beam), (-33.9, 151.2, 0, 120))
+        self.assertFalse(scene.has_changes)
+
+        scene.update(0, lat=10, long=20)
+        self.assertEqual((station.lat, station.long), (10, 20))
+        self.assertEqual(list(scene.diff()["Modified"]), ["Sydney"])
+
+    def test_growing_renumbers_later_constellations(self):
+        scene = Scene(constellation_creator(2, [4, 4], [1, 1], [1, 1], [53, 60], [550, 600], [0, 0], [30, 30]))
+        old_names = [sat.name for sat in scene[1]]
+        scene.update(0, num_sats=6, num_planes=1, phasing=1)
+        names = [sat.name for constellation in scene for sat in constellation]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(names, ["Sat " + str(num) for num in range(1, 11)])
+
+        diff = scene.diff()
+        self.assertEqual(sorted(diff["Removed"]), sorted(old_names))
+        self.assertEqual(sorted(diff["Added"]), sorted(["Sat 5", "Sat 6"] + names[6:]))
+        self.assertEqual(diff["Added"]["Sat 7"]["Orbital Elements"]["Inclination"], 60)
+
+
+class TestSymmetricEphemeris(unittest.TestCase):
+
+    def setUp(self):
+        self.constellation = ConstellationArray.concatenate([
+            ConstellationArray.from_walker(24, 4, 1, 53, 550, 0, 30),
+            ConstellationArray.from_walker(12, 3, 1, 70, 1200, 0.05, 30, name="E")])
+        self.times = np.arange(0., 7200., 120.)
+
+    def test_matches_full_propagation(self):
+        for j2 in (False, True):
+            ephemeris = SymmetricEphemeris(self.constellation, self.times, j2)
+            self.assertLess(ephemeris.num_references, len(self.constellation))
+            positions, velocities = ephemeris.expand(np.float64, 64)
+            expected_positions, expected_velocities = _propagate(self.constellation, self.times, j2, np.float64, 64)
+            np.testing.assert_allclose(positions, expected_positions, atol=1e-6)
+            np.testing.assert_allclose(velocities, expected_velocities, atol=1e-9)
+
+    def test_unshared_orbits_use_full_propagation(self):
+        rng = np.random.RandomState(0)
+        num_sats = 40
+        catalog = ConstellationArray(["S" + str(idx) for idx in range(num_sats)], rng.uniform(400, 1200, num_sats),
+                                     rng.uniform(0, 0.01, num_sats), rng.uniform(0, 98, num_sats),
+                                     rng.uniform(0, 360, num_sats), rng.uniform(0, 360, num_sats),
+                                     rng.uniform(0, 360, num_sats), 30)
+        self.assertEqual(int(orbit_references(catalog)[0].max()) + 1, num_sats)
+        np.testing.assert_array_equal(propagate(catalog, self.times)[0],
+                                      _propagate(catalog, self.times, False, np.float64, 64)[0])
+
+
+class TestConstellationArray(unittest.TestCase):
+
+    def test_angle_units_agree(self):
+        in_radians = Satellite("a", 700, 0.01, *np.radians([53, 40, 30, 20]).tolist(), beam=30, rads=True)
+        in_degrees = Satellite("b", 700, 0.01, 53, 40, 30, 20, 30, rads=False)
+        np.testing.assert_allclose(in_radians.element_angles, in_degrees.element_angles)
+        array = ConstellationArray.from_satellites([in_radians, in_degrees])
+        np.testing.assert_allclose(array.inclination, [53, 53])
+        np.testing.assert_allclose(array.ta, [20, 20])
+        positions = propagate(array, [0., 600.])[0]
+        np.testing.assert_allclose(positions[0], positions[1])
+        np.testing.assert_allclose(in_radians.rotation, in_degrees.rotation)
+        for constellation in (Constellation(8, 2, 1, 53, 550, 0, 30), ConstellationArray.from_walker(8, 2, 1, 53, 550,
+                                                                                                     0, 30)):
+            self.assertEqual(constellation[5].element_angles, (53, 180.0, 90, 45.0))
+            self.assertEqual(constellation[5].right_ascension, 180)
+
+        # At periapsis the satellite lies along the first column of the rotation.
+        at_periapsis = Satellite("c", 700, 0.01, 53, 40, 30, 0, 30, rads=False)
+        position = propagate(ConstellationArray.from_satellites([at_periapsis]), [0.])[0][0, 0]
+        np.testing.assert_allclose(position / np.linalg.norm(position), at_periapsis.rotation[:, 0], atol=1e-12)
+
+    def test_satellite_focus(self):
+        mars = Satellite("m", 400, 0, 30, 0, 0, 0, 30, focus="mars")
+        self.assertEqual(ConstellationArray.from_satellites([mars]).focus, "mars")
+        self.assertEqual(ConstellationArray.from_scene([mars]).focus, "mars")
+        with self.assertRaises(FocusError):
+            ConstellationArray.from_scene([Constellation(4, 1, 1, 53, 550, 0, 30), mars])
+        with self.assertRaises(FocusError):
+            ConstellationArray.from_satellites([mars, Satellite("e", 400, 0, 30, 0, 0, 0, 30)])
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.constellation = ConstellationArray.concatenate([
+            ConstellationArray.from_walker(12, 3, 1, 53, 550, 0.001, 30),
+            ConstellationArray.from_walker(4, 2, 1, 98.5, 1200, 0.02, 30, name="Polar")])
+
+    def test_round_trip(self):
+        for writer, format_name in ((write_tle, "tle"), (write_omm, "omm-kvn"), (write_omm, "omm-xml")):
+            stream = io.StringIO()
+            if writer is write_omm:
+                writer(self.constellation, stream, format_name=format_name)
+            else:
+                writer(self.constellation, stream)
+            stream.seek(0)
+            read = read_catalog(stream)
+            self.assertEqual(read.names, self.constellation.names)
+            np.testing.assert_allclose(read.altitude, self.constellation.altitude, atol=1e-3)
+            np.testing.assert_allclose(read.eccentricity, self.constellation.eccentricity, atol=1e-7)
+            for column in ("inclination", "right_ascension", "perigee", "ta"):
+                np.testing.assert_allclose(getattr(read, column), getattr(self.constellation, column), atol=1e-4)
+
+    def test_elements_advanced_to_reference_epoch(self):
+        shell = ConstellationArray.from_walker(12, 3, 1, 53, 550, 0.001, 30)
+        polar = ConstellationArray.from_walker(4, 2, 1, 98.5, 1200, 0.02, 30, name="Polar")
+        shell_epoch, polar_epoch = datetime(2020, 3, 1, 2, 30), datetime(2020, 3, 1, 8, 15, 30)
+        reference = datetime(2020, 3, 1, 6)
+        times = np.array([0., 600.])
+        expected = np.concatenate([propagate(shell, times + (reference - shell_epoch).total_seconds())[0],
+                                   propagate(polar, times + (reference - polar_epoch).total_seconds())[0]])
+
+        handle, path = tempfile.mkstemp(suffix=".tle")
+        with os.fdopen(handle, 'w') as stream:
+            write_tle(shell, stream, shell_epoch)
+            write_tle(polar, stream, polar_epoch, first_catalog_number=13)
+        try:
+            for processes in (1, 2):
+                read = read_catalog(path, processes=processes, epoch=reference)
+                np.testing.assert_allclose(propagate(read, times)[0], expected, atol=1e-2)
+        finally:
+            os.remove(path)
+
+        for format_name in ("omm-kvn", "omm-xml"):
+            arrays = []
+            for constellation, epoch in ((shell, shell_epoch), (polar, polar_epoch)):
+                stream = io.StringIO()
+                write_omm(constellation, stream, epoch, format_name=format_name)
+                stream.seek(0)
+                arrays.append(read_catalog(stream, epoch=reference))
+            np.testing.assert_allclose(propagate(ConstellationArray.concatenate(arrays), times)[0], expected,
+                                       atol=1e-5)
+
+    def test_epoch_formats(self):
+        self.assertEqual(tle_epoch("1 00001U          98001.50000000"), datetime(1998, 1, 1, 12))
+        self.assertEqual(tle_epoch("1 00001U          20061.10416667")
+                         .replace(microsecond=0), datetime(2020, 3, 1, 2, 30))
+        self.assertEqual(omm_epoch("2020-03-01T02:30:00.123456"), datetime(2020, 3, 1, 2, 30, 0, 123456))
+        self.assertEqual(omm_epoch("2020-061T02:30:00.5Z"), datetime(2020, 3, 1, 2, 30, 0, 500000))
+
+    def test_timezone_aware_epoch(self):
+        naive = datetime(2020, 3, 1, 2, 30)
+        aware = datetime(2020, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=10)))
+        self.assertEqual("".join(iter_tle(self.constellation, aware)), "".join(iter_tle(self.constellation, naive)))
+        self.assertEqual("".join(iter_omm(self.constellation, aware)).count("EPOCH = 2020-03-01T02:30:00"),
+                         len(self.constellation))
+        np.testing.assert_array_equal(sun_position([0., 3600.], aware), sun_position([0., 3600.], naive))
+
+
+class TestGroundTracks(unittest.TestCase):
+
+    def test_lines_stay_within_the_map(self):
+        constellation = ConstellationArray.from_walker(6, 2, 1, 53, 550, 0, 30)
+        for chunk in ground_tracks(constellation, 0., 12000., step=60., chunk_steps=50):
+            lat, long, alt, offsets, satellite = chunk.lines()
+            self.assertEqual(offsets[-1], len(long))
+            for line in range(len(satellite)):
+                points = long[offsets[line]:offsets[line + 1]]
+                self.assertTrue(np.all(np.abs(np.diff(points)) < 180))
+            self.assertTrue(np.all(np.abs(long) <= 180) and np.all(np.abs(lat) <= 90))
+
+
+    def test_polar_tracks_split_only_at_the_antimeridian(self):
+        # Slightly retrograde and sampled coarsely, so tracks pass close enough to the poles for their longitudes to
+        # swing by about 180 degrees in a step, on either side of the pole.
+        constellation = ConstellationArray.from_walker(12, 6, 1, 90.3, 550, 0, 30)
+        step, stop = 600., 43200.
+        dense_times = np.arange(0., stop + 0.5, 1.)
+        long = sub_satellite_points(propagate(constellation, dense_times)[0], dense_times)[1]
+        # At one second steps no track moves far in longitude, even next to a pole.
+        sat, second = np.nonzero(np.abs(np.diff(long, axis=1)) > 180)
+        expected = sorted(zip(sat.tolist(), (second // int(step)).tolist()))
+
+        chunk = next(ground_tracks(constellation, 0., stop, step=step, chunk_steps=1000))
+        self.assertEqual(sorted(zip(*[index.tolist() for index in chunk.crossings()])), expected)
+        lat, long, alt, offsets, satellite = chunk.lines()
+        self.assertEqual(len(satellite), len(constellation) + len(expected))
+        for line in range(len(satellite)):
+            points = long[offsets[line]:offsets[line + 1]]
+            if line + 1 < len(satellite) and satellite[line + 1] == satellite[line]:
+                self.assertEqual(abs(points[-1]), 180)
+                self.assertEqual(long[offsets[line + 1]], -points[-1])
+
+
+class TestConjunctions(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        constellation = ConstellationArray.concatenate([
+            ConstellationArray.from_walker(12, 3, 1, 53, 550, 0, 30),
+            ConstellationArray.from_walker(12, 3, 1, 60, 552, 0.001, 30, name="B")])
+        threshold = 100.
+        found = conjunctions(constellation, 0., 3600., threshold=threshold)
+        times = np.arange(0., 3600., 0.5)
+        positions = propagate(constellation, times)[0]
+        for first in range(len(constellation)):
+            distance = np.linalg.norm(positions[first + 1:] - positions[first], axis=-1).min(axis=1)
+            for offset, closest in enumerate(distance.tolist()):
+                second = first + 1 + offset
+                pair = (found.primary == first) & (found.secondary == second)
+                if closest < threshold - 1:
+                    self.assertTrue(pair.any(), (first, second, closest))
+                    self.assertLessEqual(found.miss_distance[pair].min(), closest + 1e-3)
+                elif closest > threshold + 1:
+                    self.assertFalse(pair.any(), (first, second, closest))
+
+
+class TestLinkTopology(unittest.TestCase):
+
+    def test_matches_all_pairs(self):
+        constellation = ConstellationArray.from_walker(24, 4, 1, 53, 550, 0, 30)
+        times = np.arange(0., 3600. + 30, 300.)
+        positions = propagate(constellation, times)[0]
+        first, second = np.triu_indices(len(constellation), 1)
+        links = set()
+        for idx, snapshot in enumerate(link_topology(constellation, 0., 3600., step=300., max_range=3000.)):
+            step_positions = positions[:, idx]
+            in_range = (np.linalg.norm(step_positions[first] - step_positions[second], axis=-1) <= 3000.) & \
+                line_of_sight(step_positions[first], step_positions[second], heavenly_body_radius["earth"])
+            expected = set(zip(first[in_range].tolist(), second[in_range].tolist()))
+            self.assertEqual(set(zip(*[edge.tolist() for edge in snapshot.edges()])), expected)
+            links -= set(map(tuple, snapshot.dropped.tolist()))
+            links |= set(map(tuple, snapshot.added.tolist()))
+            self.assertEqual(links, expected)
+
+
+class TestEclipses(unittest.TestCase):
+
+    def test_matches_dense_sampling(self):
+        constellation = ConstellationArray.concatenate([
+            ConstellationArray.from_walker(12, 3, 1, 53, 550, 0, 30),
+            ConstellationArray.from_walker(4, 2, 1, 98, 1200, 0.05, 30, name="E")])
+        times = np.arange(0., 21600., 2.)
+        positions = propagate(constellation, times)[0]
+        sun = sun_position(times)[None]
+        for model in ("cylindrical", "conical"):
+            passages = eclipses(constellation, 0., 21600., model=model)
+            for umbra, start, end in ((False, passages.start, passages.end),
+                                      (True, passages.umbra_start, passages.umbra_end)):
+                if model == "cylindrical" and umbra:
+                    continue
+                boundary = shadow_boundary(positions, sun, heavenly_body_radius["earth"], model, umbra)
+                found = np.zeros(boundary.shape, dtype=bool)
+                for sat, low, high in zip(passages.satellite, start, end):
+                    if low == low:
+                        found[sat] |= (times >= low) & (times <= high)
+                clear = np.abs(boundary) > (1e-2 if model == "cylindrical" else 1e-5)
+                np.testing.assert_array_equal(found[clear], (boundary < 0)[clear])
+            shadow = np.bincount(passages.satellite, weights=passages.duration, minlength=len(constellation))
+            np.testing.assert_allclose(passages.sunlit_fraction(), 1 - shadow / 21600)
+            self.assertTrue(np.all((passages.sunlit_fraction() >= 0) & (passages.sunlit_fraction() <= 1)))
+
+
+    def test_umbra_stays_in_its_passage(self):
+        satellite = np.array([0, 0, 2])
+        entry, exit_time = np.array([100., 500., 50.]), np.array([200., 600., 150.])
+        # Inside the first passage, between passages, for a satellite without passages, in two pieces inside the
+        # second passage, and before the third satellite's passage.
+        umbra = (np.array([0, 0, 1, 0, 0, 2]), np.array([120., 300., 60., 510., 550., 10.]),
+                 np.array([180., 350., 70., 540., 590., 20.]))
+        umbra_start, umbra_end = _umbra_passages(satellite, entry, exit_time, umbra, np.arange(0., 1001., 60.), 1e-3)
+        np.testing.assert_array_equal(umbra_start, [120., 510., np.nan])
+        np.testing.assert_array_equal(umbra_end, [180., 590., np.nan])
+
+        passages = eclipses(ConstellationArray.from_walker(12, 3, 1, 53, 550, 0, 30), 0., 21600., model="conical")
+        has_umbra = ~np.isnan(passages.umbra_start)
+        self.assertTrue(has_umbra.any())
+        self.assertTrue(np.all(passages.umbra_start[has_umbra] >= passages.start[has_umbra] - 1e-3))
+        self.assertTrue(np.all(passages.umbra_end[has_umbra] <= passages.end[has_umbra] + 1e-3))
+
+
+class TestContactSchedule(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        num_windows, num_sats, num_stations = 600, 40, 5
+        start = rng.uniform(0, 86400, num_windows)
+        self.windows = AccessWindows(rng.randint(0, num_sats, num_windows), rng.randint(0, num_stations, num_windows),
+                                     start, start + rng.uniform(60, 900, num_windows),
+                                     rng.uniform(10, 90, num_windows), ["S" + str(idx) for idx in range(num_sats)],
+                                     ["G" + str(idx) for idx in range(num_stations)])
+        self.rng = rng
+
+    def assert_feasible(self, schedule):
+        contacts = schedule.contacts()
+        resources = [(contacts.station, schedule.setup_time)]
+        if schedule.satellite_exclusive:
+            resources.append((contacts.satellite, 0.))
+        for group, gap in resources:
+            order = np.lexsort((contacts.start, group))
+            same = group[order][1:] == group[order][:-1]
+            self.assertTrue(np.all(contacts.start[order][1:][same] >= contacts.end[order][:-1][same] + gap))
+
+    def test_incremental_matches_full(self):
+        for method in ("priority", "interval"):
+            schedule = ContactSchedule(self.windows, setup_time=90., min_duration=100., method=method)
+            self.assert_feasible(schedule)
+            for _ in range(40):
+                if self.rng.uniform() < 0.5:
+                    schedule.remove_window(int(self.rng.choice(np.flatnonzero(schedule.active))))
+                else:
+                    start = self.rng.uniform(0, 86400)
+                    schedule.add_window(int(self.rng.randint(0, 40)), "G" + str(self.rng.randint(0, 5)), start,
+                                        start + self.rng.uniform(60, 900))
+                full = ContactSchedule(schedule.windows(), priority=schedule.priority[schedule.active],
+                                       setup_time=90., min_duration=100., method=method)
+                np.testing.assert_array_equal(full.scheduled, schedule.scheduled[schedule.active])
+            self.assert_feasible(schedule)
+
+    def test_interval_method_is_optimal_per_station(self):
+        schedule = ContactSchedule(self.windows, setup_time=60., satellite_exclusive=False, method="interval")
+        greedy = ContactSchedule(self.windows, setup_time=60., satellite_exclusive=False)
+        self.assert_feasible(schedule)
+        self.assertGreaterEqual(schedule.total_priority, greedy.total_priority)
+
+
+if __name__ == '__main__':
+    unittest.main()